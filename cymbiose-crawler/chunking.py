@@ -0,0 +1,283 @@
+"""
+Content chunking for RAG
+Splits markdown into heading-aware chunks sized for embedding. Chunks end
+on heading, line or sentence boundaries, can overlap by whole sentences,
+and are sized by a pluggable token counter. iter_chunks() is a single
+linear pass that yields chunks as they are completed.
+
+Counters provide count() (whole tokens) and measure(), an additive cost
+whose sum over lines joined by newlines bounds count() of the joined text.
+Chunks are packed by measure() so max_tokens holds for the final count.
+"""
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from log import get_logger
+
+log = get_logger(__name__)
+
+# "heuristic" (len // 4), "bpe" (offline BPE-style estimate) or "tiktoken" (exact, if installed)
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "heuristic").lower()
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "500"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+TIKTOKEN_ENCODING = os.getenv("TIKTOKEN_ENCODING", "cl100k_base")
+
+# Sections smaller than this are merged into the next one instead of standing alone
+MIN_SECTION_TOKENS = 100
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=\S)|(?<=[。！？])")
+
+# GPT-2 style pre-tokenization (ASCII classes; everything else falls into the symbol/other run)
+_PRETOKEN = re.compile(r"""'(?:s|t|re|ve|m|ll|d)| ?[A-Za-z]+| ?[0-9]{1,3}| ?[^\sA-Za-z0-9]+|\s+""")
+
+
+class HeuristicCounter:
+    """The original ~4 characters per token estimate"""
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        return len(text) // 4
+
+    def measure(self, text: str) -> float:
+        return len(text) / 4
+
+    def split(self, text: str, max_tokens: int) -> Iterator[str]:
+        """Pieces of at most `max_tokens`, cut at whitespace where possible"""
+        width = max(1, max_tokens * 4)
+        start = 0
+        while start < len(text):
+            end = min(len(text), start + width)
+            if end < len(text):
+                space = text.rfind(" ", start + width // 2, end)
+                if space > start:
+                    end = space
+            yield text[start:end].strip()
+            start = end
+
+
+def _char_tokens(ch: str) -> float:
+    code = ord(ch)
+    if code < 128:
+        return 1 / 3  # ASCII symbols merge about three to a token
+    if 0x3000 <= code <= 0x9FFF or 0xAC00 <= code <= 0xD7AF or 0xF900 <= code <= 0xFAFF:
+        return 1.0  # CJK / kana / hangul: about one token per character
+    if code >= 0x1F000:
+        return 2.0  # emoji and pictographs are several bytes-level tokens
+    return 0.6  # accented Latin, Cyrillic, Greek, Arabic, Devanagari...
+
+
+def _symbol_tokens(piece: str) -> float:
+    """Approximate BPE cost of a run of punctuation / non-ASCII characters"""
+    tokens = 0.0
+    ascii_run = 0
+    for ch in piece:
+        if ord(ch) < 128:
+            ascii_run += 1
+        else:
+            tokens += _char_tokens(ch)
+    return tokens + math.ceil(ascii_run / 3)
+
+
+class BPEStyleCounter:
+    """
+    Offline BPE-style estimate: GPT-2 style pre-tokenization, then a per-piece
+    cost (short English words are one token, long words and digits split,
+    CJK is about one token per character). No vocabulary download needed.
+    """
+
+    name = "bpe"
+
+    def _piece_tokens(self, piece: str) -> float:
+        word = piece.lstrip(" ")
+        if not word:
+            return 1.0
+        if word.isascii() and word.isalpha():
+            return 1.0 if len(word) <= 7 else 1.0 + math.ceil((len(word) - 7) / 4)
+        if word.isdigit() or word[0] == "'" or word.isspace():
+            return 1.0
+        return max(1.0, _symbol_tokens(word))
+
+    def count(self, text: str) -> int:
+        return math.ceil(self.measure(text))
+
+    def measure(self, text: str) -> float:
+        return sum(self._piece_tokens(m.group()) for m in _PRETOKEN.finditer(text))
+
+    def split(self, text: str, max_tokens: int) -> Iterator[str]:
+        piece_start, tokens = 0, 0.0
+        for match in _PRETOKEN.finditer(text):
+            cost = self._piece_tokens(match.group())
+            if cost > max_tokens:
+                # One pre-token over budget (an unspaced CJK run, a table rule): cut it by characters
+                if match.start() > piece_start:
+                    yield text[piece_start:match.start()].strip()
+                yield from self._cut(match.group(), max_tokens)
+                piece_start, tokens = match.end(), 0.0
+                continue
+            if tokens + cost > max_tokens and match.start() > piece_start:
+                yield text[piece_start:match.start()].strip()
+                piece_start, tokens = match.start(), 0.0
+            tokens += cost
+        if piece_start < len(text):
+            yield text[piece_start:].strip()
+
+    def _cut(self, piece: str, max_tokens: int) -> Iterator[str]:
+        """Consecutive parts of one pre-token, each costing at most `max_tokens`"""
+        budget = max_tokens - 1  # headroom for the per-piece rounding in _piece_tokens
+        start, tokens = 0, 0.0
+        for i, ch in enumerate(piece):
+            cost = _char_tokens(ch)
+            if tokens + cost > budget and i > start:
+                yield piece[start:i].strip()
+                start, tokens = i, 0.0
+            tokens += cost
+        if start < len(piece):
+            yield piece[start:].strip()
+
+
+class TiktokenCounter:
+    """Exact counts with a tiktoken encoding (optional dependency)"""
+
+    name = "tiktoken"
+
+    def __init__(self, encoding: str = TIKTOKEN_ENCODING):
+        import tiktoken
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def measure(self, text: str) -> float:
+        return self.count(text)
+
+    def split(self, text: str, max_tokens: int) -> Iterator[str]:
+        ids = self.encoding.encode(text, disallowed_special=())
+        for start in range(0, len(ids), max(1, max_tokens)):
+            yield self.encoding.decode(ids[start:start + max_tokens]).strip()
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(name: Optional[str] = None):
+    """Token counter by name; falls back to "bpe" if tiktoken is unavailable"""
+    name = (name or CHUNK_TOKENIZER).lower()
+    if name == "heuristic":
+        return HeuristicCounter()
+    if name == "tiktoken":
+        try:
+            return TiktokenCounter()
+        except Exception as e:  # not installed, or the encoding can't be loaded offline
+            log.warning(f"⚠️ tiktoken unavailable ({e}), using the BPE-style estimate")
+    return BPEStyleCounter()
+
+
+def _iter_lines(source: Union[str, Iterable[str]]) -> Iterator[str]:
+    """Lines of a string (without splitting it into a list) or of an iterable of text blocks"""
+    if isinstance(source, str):
+        start = 0
+        while start <= len(source):
+            end = source.find("\n", start)
+            if end == -1:
+                end = len(source)
+            yield source[start:end]
+            start = end + 1
+    else:
+        for block in source:
+            yield from _iter_lines(block)
+
+
+def _units(line: str, counter, max_tokens: int) -> Iterator[Tuple[str, float]]:
+    """A line as one unit, or as sentences (hard-split if still too long) when it exceeds max_tokens"""
+    tokens = counter.measure(line)
+    if tokens <= max_tokens:
+        yield line, tokens
+        return
+    for sentence in _SENTENCE_END.split(line):
+        tokens = counter.measure(sentence)
+        if tokens <= max_tokens:
+            yield sentence, tokens
+        else:
+            for piece in counter.split(sentence, max_tokens):
+                if piece:
+                    yield piece, counter.measure(piece)
+
+
+def iter_chunks(
+    markdown: Union[str, Iterable[str]],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    counter=None,
+) -> Iterator[Dict]:
+    """
+    Yield RAG chunks of at most `max_tokens` in one pass over `markdown`
+    (a string or an iterable of text blocks). A new heading starts a new
+    chunk once the current one has MIN_SECTION_TOKENS; consecutive chunks
+    within a section share up to `overlap_tokens` of trailing sentences.
+    """
+    counter = counter or get_token_counter()
+    max_tokens = max(1, max_tokens)
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+    join_tokens = counter.measure("\n")
+
+    current: List[Tuple[str, float]] = []
+    current_tokens = 0
+    current_heading = None
+    fresh = 0  # units in `current` that were not carried over as overlap
+    index = 0
+
+    def emit():
+        content = "\n".join(text for text, _ in current)
+        return {
+            "index": index,
+            "content": content,
+            "token_estimate": counter.count(content),
+            "heading": current_heading,
+        }
+
+    for raw_line in _iter_lines(markdown):
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        if line.startswith("#"):
+            if fresh and current_tokens > MIN_SECTION_TOKENS:
+                yield emit()
+                index += 1
+                current, current_tokens, fresh = [], 0, 0
+            current_heading = line.lstrip("#").strip()
+
+        for text, tokens in _units(line, counter, max_tokens):
+            added = tokens + (join_tokens if current else 0)
+            if current and current_tokens + added > max_tokens:
+                if fresh:
+                    yield emit()
+                    index += 1
+                # Carry whole trailing units (sentences/lines) forward as overlap
+                carried: List[Tuple[str, float]] = []
+                carried_tokens = 0
+                for unit in reversed(current):
+                    cost = unit[1] + (join_tokens if carried else 0)
+                    if carried_tokens + cost > overlap_tokens or carried_tokens + cost + tokens + join_tokens > max_tokens:
+                        break
+                    carried.append(unit)
+                    carried_tokens += cost
+                current = carried[::-1]
+                current_tokens = carried_tokens
+                fresh = 0
+                added = tokens + (join_tokens if current else 0)
+            current.append((text, tokens))
+            current_tokens += added
+            fresh += 1
+
+    if fresh:
+        yield emit()
+
+
+def chunk_content(markdown: str, max_tokens: int = CHUNK_MAX_TOKENS) -> List[Dict]:
+    """Split content into chunks optimized for RAG (targeting ~500 tokens per chunk)"""
+    chunks = list(iter_chunks(markdown, max_tokens))
+    log.info(f"📦 Created {len(chunks)} chunks from content")
+    return chunks
@@ -0,0 +1,730 @@
+"""
+Crawl coordination across processes and nodes
+A shared backend holds crawl jobs, their URL frontier and their results, so
+any number of uvicorn workers or replicas can crawl the same job: each one
+leases a batch of URLs, heartbeats while it works, and acks or releases
+them. Leases go out highest score first (FIFO among equal scores, so
+breadth-first jobs stay breadth-first); released and expired leases go
+back ahead of everything else. Leases that stop heartbeating (a crashed
+worker) expire and are handed out again. Backends: SQLite (one host, any number of processes) and
+Redis (any RESP-compatible server).
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from frontier import REQUEUE_SCORE, SeenSet, canonicalize_url
+from log import get_logger
+
+log = get_logger(__name__)
+
+CRAWL_COORDINATOR = os.getenv("CRAWL_COORDINATOR", "local").lower()  # "local" (in-process), "sqlite" or "redis"
+COORDINATOR_PATH = os.getenv("COORDINATOR_PATH", "cache/coordinator.sqlite3")
+COORDINATOR_REDIS_URL = os.getenv("COORDINATOR_REDIS_URL", "redis://localhost:6379/0")
+COORDINATOR_POLL_SECONDS = float(os.getenv("COORDINATOR_POLL_SECONDS", "2"))
+LEASE_SECONDS = float(os.getenv("CRAWL_LEASE_SECONDS", "60"))
+
+# Per-page counters owned by the backend (urls_found is counted at push time)
+RESULT_COUNTERS = ("urls_scraped", "urls_failed", "urls_duplicate")
+
+# Job fields that live in the frontier / result tables instead of the job state
+_DERIVED_FIELDS = ("scraped_urls", "urls_found", "urls_scraped", "urls_failed", "urls_duplicate", "urls_pending")
+
+QUEUED, LEASED, DONE = 0, 1, 2
+
+# Frontier entries pushed to a coordinator are (url, depth, score)
+FrontierItem = Tuple[str, int, float]
+
+
+def worker_id() -> str:
+    """Identifies this process in leases"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class SQLiteCoordinator:
+    """Coordination through one SQLite file (WAL; each write is an IMMEDIATE transaction)"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = COORDINATOR_PATH):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS coord_jobs (id TEXT PRIMARY KEY, state TEXT NOT NULL, created_at REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS coord_counters ("
+                " job_id TEXT NOT NULL, name TEXT NOT NULL, value INTEGER NOT NULL, PRIMARY KEY (job_id, name));"
+                "CREATE TABLE IF NOT EXISTS coord_frontier ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, url TEXT NOT NULL, depth INTEGER NOT NULL,"
+                " state INTEGER NOT NULL DEFAULT 0, retry INTEGER NOT NULL DEFAULT 0, owner TEXT, expires REAL,"
+                " score REAL NOT NULL DEFAULT 0, UNIQUE (job_id, url));"
+                "CREATE TABLE IF NOT EXISTS coord_results ("
+                " job_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (job_id, seq));"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(coord_frontier)")}
+            if "score" not in columns:  # created before best-first leasing
+                self._db.execute("ALTER TABLE coord_frontier ADD COLUMN score REAL NOT NULL DEFAULT 0")
+            self._db.executescript(
+                "DROP INDEX IF EXISTS coord_frontier_queue;"
+                "CREATE INDEX IF NOT EXISTS coord_frontier_ranked ON coord_frontier (job_id, state, retry DESC, score DESC, seq);"
+            )
+        return self._db
+
+    @contextmanager
+    def _tx(self):
+        with self._db_lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _incr(db: sqlite3.Connection, job_id: str, name: str, amount: int):
+        db.execute(
+            "INSERT INTO coord_counters (job_id, name, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (job_id, name) DO UPDATE SET value = value + excluded.value",
+            (job_id, name, amount),
+        )
+
+    @staticmethod
+    def _state(db: sqlite3.Connection, job_id: str) -> Optional[Dict[str, Any]]:
+        row = db.execute("SELECT state FROM coord_jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _counts(db: sqlite3.Connection, job_id: str) -> Dict[str, int]:
+        counts = dict(db.execute("SELECT name, value FROM coord_counters WHERE job_id = ?", (job_id,)).fetchall())
+        for state, name in ((QUEUED, "queued"), (LEASED, "leased")):
+            counts[name] = db.execute(
+                "SELECT COUNT(*) FROM coord_frontier WHERE job_id = ? AND state = ?", (job_id, state)
+            ).fetchone()[0]
+        return counts
+
+    # ---- sync (run via asyncio.to_thread) ----
+
+    def _create_job(self, job: Dict[str, Any]):
+        state = {k: v for k, v in job.items() if k not in _DERIVED_FIELDS}
+        with self._tx() as db:
+            db.execute("INSERT INTO coord_jobs (id, state, created_at) VALUES (?, ?, ?)", (job["id"], json.dumps(state), time.time()))
+        self._push(job["id"], [(canonicalize_url(job["seed_url"]), 0, 0.0)])
+
+    def _update_job(self, job_id: str, fields: Dict[str, Any]) -> bool:
+        with self._tx() as db:
+            state = self._state(db, job_id)
+            if state is None:
+                return False
+            state.update(fields)
+            db.execute("UPDATE coord_jobs SET state = ? WHERE id = ?", (json.dumps(state), job_id))
+            return True
+
+    def _get_job(self, job_id: str, with_results: bool) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            db = self._connect()
+            state = self._state(db, job_id)
+            if state is None:
+                return None
+            counts = self._counts(db, job_id)
+            results = None
+            if with_results:
+                results = [json.loads(row[0]) for row in db.execute(
+                    "SELECT data FROM coord_results WHERE job_id = ? ORDER BY seq", (job_id,)
+                )]
+        return _job_view(state, counts, results)
+
+    def _job_ids(self) -> List[str]:
+        with self._db_lock:
+            return [row[0] for row in self._connect().execute("SELECT id FROM coord_jobs ORDER BY created_at")]
+
+    def _delete_job(self, job_id: str):
+        with self._tx() as db:
+            for table, column in (("coord_jobs", "id"), ("coord_counters", "job_id"), ("coord_frontier", "job_id"), ("coord_results", "job_id")):
+                db.execute(f"DELETE FROM {table} WHERE {column} = ?", (job_id,))
+
+    def _push(self, job_id: str, items: List[FrontierItem]) -> int:
+        if not items:
+            return 0
+        with self._tx() as db:
+            if self._state(db, job_id) is None:
+                return 0  # deleted while a worker was still crawling it
+            before = db.total_changes
+            db.executemany("INSERT OR IGNORE INTO coord_frontier (job_id, url, depth, score) VALUES (?, ?, ?, ?)",
+                           [(job_id, url, depth, score) for url, depth, score in items])
+            new = db.total_changes - before
+            self._incr(db, job_id, "urls_found", new)
+            return new
+
+    def _lease(self, job_id: str, owner: str, limit: int, ttl: float) -> List[Tuple[str, int]]:
+        now = time.time()
+        with self._tx() as db:
+            state = self._state(db, job_id)
+            if state is None or state.get("status") != "running":
+                return []
+            # Reclaim leases whose holder stopped heartbeating
+            reclaimed = db.execute(
+                "UPDATE coord_frontier SET state = ?, retry = 1, owner = NULL, expires = NULL "
+                "WHERE job_id = ? AND state = ? AND expires < ?",
+                (QUEUED, job_id, LEASED, now),
+            ).rowcount
+            if reclaimed:
+                self._incr(db, job_id, "dispatched", -reclaimed)
+            row = db.execute("SELECT value FROM coord_counters WHERE job_id = ? AND name = 'dispatched'", (job_id,)).fetchone()
+            budget = state["max_urls"] - (row[0] if row else 0)
+            rows = db.execute(
+                "SELECT seq, url, depth FROM coord_frontier WHERE job_id = ? AND state = ? "
+                "ORDER BY retry DESC, score DESC, seq LIMIT ?",
+                (job_id, QUEUED, max(0, min(limit, budget))),
+            ).fetchall()
+            if rows:
+                db.executemany(
+                    "UPDATE coord_frontier SET state = ?, owner = ?, expires = ? WHERE seq = ?",
+                    [(LEASED, owner, now + ttl, seq) for seq, _, _ in rows],
+                )
+                self._incr(db, job_id, "dispatched", len(rows))
+            return [(url, depth) for _, url, depth in rows]
+
+    def _heartbeat(self, job_id: str, owner: str, leased: List[Tuple[str, int]], ttl: float) -> int:
+        with self._tx() as db:
+            return db.execute(
+                "UPDATE coord_frontier SET expires = ? WHERE job_id = ? AND owner = ? AND state = ?",
+                (time.time() + ttl, job_id, owner, LEASED),
+            ).rowcount
+
+    def _complete(self, job_id: str, owner: str, items: List[Tuple[str, int]]):
+        with self._tx() as db:
+            db.executemany(
+                "UPDATE coord_frontier SET state = ?, owner = NULL, expires = NULL "
+                "WHERE job_id = ? AND url = ? AND owner = ? AND state = ?",
+                [(DONE, job_id, url, owner, LEASED) for url, _ in items],
+            )
+
+    def _release(self, job_id: str, owner: str, items: List[Tuple[str, int]]):
+        with self._tx() as db:
+            before = db.total_changes
+            db.executemany(
+                "UPDATE coord_frontier SET state = ?, retry = 1, owner = NULL, expires = NULL "
+                "WHERE job_id = ? AND url = ? AND owner = ? AND state = ?",
+                [(QUEUED, job_id, url, owner, LEASED) for url, _ in items],
+            )
+            released = db.total_changes - before
+            if released:
+                self._incr(db, job_id, "dispatched", -released)
+
+    def _add_results(self, job_id: str, entries: List[Dict[str, Any]], delta: Dict[str, int]):
+        with self._tx() as db:
+            if self._state(db, job_id) is None:
+                return
+            row = db.execute("SELECT value FROM coord_counters WHERE job_id = ? AND name = 'results'", (job_id,)).fetchone()
+            start = row[0] if row else 0
+            db.executemany("INSERT INTO coord_results (job_id, seq, data) VALUES (?, ?, ?)",
+                           [(job_id, start + i, json.dumps(entry)) for i, entry in enumerate(entries)])
+            for name, amount in {**delta, "results": len(entries)}.items():
+                if amount:
+                    self._incr(db, job_id, name, amount)
+
+    def _results(self, job_id: str, after: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+        with self._db_lock:
+            db = self._connect()
+            rows = db.execute(
+                "SELECT seq, data FROM coord_results WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after, limit),
+            ).fetchall()
+            row = db.execute("SELECT value FROM coord_counters WHERE job_id = ? AND name = 'results'", (job_id,)).fetchone()
+        return [{"seq": seq, **json.loads(data)} for seq, data in rows], (row[0] if row else 0)
+
+    def _frontier_counts(self, job_id: str) -> Dict[str, Any]:
+        with self._db_lock:
+            db = self._connect()
+            state = self._state(db, job_id) or {}
+            counts = self._counts(db, job_id)
+        return {
+            "status": state.get("status"),
+            "queued": counts["queued"],
+            "leased": counts["leased"],
+            "budget": state.get("max_urls", 0) - counts.get("dispatched", 0),
+        }
+
+    def _finish(self, job_id: str) -> bool:
+        with self._tx() as db:
+            state = self._state(db, job_id)
+            if state is None or state.get("status") != "running":
+                return False
+            counts = self._counts(db, job_id)
+            if counts["leased"] or (counts["queued"] and counts.get("dispatched", 0) < state["max_urls"]):
+                return False
+            state.update(status="completed", completed_at=datetime.now().isoformat(), current_url=None)
+            db.execute("UPDATE coord_jobs SET state = ? WHERE id = ?", (json.dumps(state), job_id))
+            return True
+
+    # ---- async API ----
+
+    async def create_job(self, job: Dict[str, Any]):
+        await asyncio.to_thread(self._create_job, job)
+
+    async def update_job(self, job_id: str, fields: Dict[str, Any]) -> bool:
+        return await asyncio.to_thread(self._update_job, job_id, fields)
+
+    async def get_job(self, job_id: str, with_results: bool = False) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get_job, job_id, with_results)
+
+    async def list_jobs(self, with_results: bool = False) -> List[Dict[str, Any]]:
+        jobs = [await self.get_job(job_id, with_results) for job_id in await asyncio.to_thread(self._job_ids)]
+        return [job for job in jobs if job is not None]
+
+    async def delete_job(self, job_id: str):
+        await asyncio.to_thread(self._delete_job, job_id)
+
+    async def push(self, job_id: str, items: List[FrontierItem]) -> int:
+        return await asyncio.to_thread(self._push, job_id, items)
+
+    async def lease(self, job_id: str, owner: str, limit: int, ttl: float = LEASE_SECONDS) -> List[Tuple[str, int]]:
+        return await asyncio.to_thread(self._lease, job_id, owner, limit, ttl)
+
+    async def heartbeat(self, job_id: str, owner: str, leased: List[Tuple[str, int]], ttl: float = LEASE_SECONDS) -> int:
+        return await asyncio.to_thread(self._heartbeat, job_id, owner, leased, ttl)
+
+    async def complete(self, job_id: str, owner: str, items: List[Tuple[str, int]]):
+        await asyncio.to_thread(self._complete, job_id, owner, items)
+
+    async def release(self, job_id: str, owner: str, items: List[Tuple[str, int]]):
+        await asyncio.to_thread(self._release, job_id, owner, items)
+
+    async def add_results(self, job_id: str, entries: List[Dict[str, Any]], delta: Dict[str, int]):
+        await asyncio.to_thread(self._add_results, job_id, entries, delta)
+
+    async def results(self, job_id: str, after: int = -1, limit: int = 100) -> Tuple[List[Dict[str, Any]], int]:
+        return await asyncio.to_thread(self._results, job_id, after, limit)
+
+    async def frontier_counts(self, job_id: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._frontier_counts, job_id)
+
+    async def finish(self, job_id: str) -> bool:
+        """Mark the job completed once nothing is leased and nothing leasable is left"""
+        return await asyncio.to_thread(self._finish, job_id)
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "path": self.path}
+
+
+# Lease/ack/release are scripts so each runs atomically on the server.
+# The frontier is a sorted set of "<depth> <url>" members, popped highest
+# score first; each push ranks a hair lower than the last (FIFO among ties).
+_PUSH_SCRIPT = """
+local new = 0
+for i = 1, #ARGV, 3 do
+  if redis.call('SADD', KEYS[1], ARGV[i]) == 1 then
+    local seq = redis.call('HINCRBY', KEYS[3], 'pushed', 1)
+    local rank = string.format('%.17g', tonumber(ARGV[i + 2]) - seq * 1e-9)
+    redis.call('ZADD', KEYS[2], rank, ARGV[i + 1] .. ' ' .. ARGV[i])
+    new = new + 1
+  end
+end
+if new > 0 then redis.call('HINCRBY', KEYS[3], 'urls_found', new) end
+return new
+"""
+
+_LEASE_SCRIPT = """
+if redis.call('HGET', KEYS[5], 'status') ~= '"running"' then return {} end
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, member in ipairs(expired) do
+  redis.call('ZREM', KEYS[2], member)
+  redis.call('HDEL', KEYS[3], member)
+  redis.call('ZADD', KEYS[1], ARGV[5], member)
+end
+if #expired > 0 then redis.call('HINCRBY', KEYS[4], 'dispatched', -#expired) end
+local budget = tonumber(redis.call('HGET', KEYS[5], 'max_urls')) - tonumber(redis.call('HGET', KEYS[4], 'dispatched') or '0')
+local count = math.min(tonumber(ARGV[3]), budget)
+local leased = {}
+if count > 0 then
+  local popped = redis.call('ZPOPMAX', KEYS[1], count)
+  for i = 1, #popped, 2 do
+    local member = popped[i]
+    redis.call('ZADD', KEYS[2], ARGV[2], member)
+    redis.call('HSET', KEYS[3], member, ARGV[4])
+    leased[#leased + 1] = member
+  end
+end
+if #leased > 0 then redis.call('HINCRBY', KEYS[4], 'dispatched', #leased) end
+return leased
+"""
+
+_HEARTBEAT_SCRIPT = """
+local extended = 0
+for i = 3, #ARGV do
+  if redis.call('HGET', KEYS[2], ARGV[i]) == ARGV[1] then
+    redis.call('ZADD', KEYS[1], 'XX', ARGV[2], ARGV[i])
+    extended = extended + 1
+  end
+end
+return extended
+"""
+
+# ARGV[2] == "1" releases back to the front of the frontier (score ARGV[3]) instead of acking
+_FINISH_LEASES_SCRIPT = """
+local released = 0
+for i = 4, #ARGV do
+  if redis.call('HGET', KEYS[2], ARGV[i]) == ARGV[1] then
+    redis.call('ZREM', KEYS[1], ARGV[i])
+    redis.call('HDEL', KEYS[2], ARGV[i])
+    if ARGV[2] == '1' then
+      redis.call('ZADD', KEYS[3], ARGV[3], ARGV[i])
+      released = released + 1
+    end
+  end
+end
+if released > 0 then redis.call('HINCRBY', KEYS[4], 'dispatched', -released) end
+return released
+"""
+
+_FINISH_JOB_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') ~= '"running"' then return 0 end
+if redis.call('ZCARD', KEYS[3]) > 0 then return 0 end
+local budget = tonumber(redis.call('HGET', KEYS[1], 'max_urls')) - tonumber(redis.call('HGET', KEYS[4], 'dispatched') or '0')
+if redis.call('ZCARD', KEYS[2]) > 0 and budget > 0 then return 0 end
+redis.call('HSET', KEYS[1], 'status', '"completed"', 'completed_at', ARGV[1], 'current_url', 'null')
+return 1
+"""
+
+
+class RedisCoordinator:
+    """Coordination through a Redis (or RESP-compatible) server; needs the `redis` package"""
+
+    name = "redis"
+
+    def __init__(self, url: str = COORDINATOR_REDIS_URL, prefix: str = "crawl:"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            # Falling back to local coordination would silently split jobs across workers
+            raise RuntimeError(
+                "CRAWL_COORDINATOR=redis needs the redis package: pip install -r requirements-redis.txt"
+            ) from e
+
+        self.url = url
+        self.prefix = prefix
+        self.redis = aioredis.from_url(url, decode_responses=True)
+        self._push_script = self.redis.register_script(_PUSH_SCRIPT)
+        self._lease_script = self.redis.register_script(_LEASE_SCRIPT)
+        self._heartbeat_script = self.redis.register_script(_HEARTBEAT_SCRIPT)
+        self._finish_leases_script = self.redis.register_script(_FINISH_LEASES_SCRIPT)
+        self._finish_job_script = self.redis.register_script(_FINISH_JOB_SCRIPT)
+
+    def _key(self, job_id: str, part: str = "") -> str:
+        return f"{self.prefix}job:{job_id}{':' + part if part else ''}"
+
+    @staticmethod
+    def _member(url: str, depth: int) -> str:
+        return f"{depth} {url}"
+
+    @staticmethod
+    def _item(member: str) -> Tuple[str, int]:
+        depth, url = member.split(" ", 1)
+        return url, int(depth)
+
+    async def create_job(self, job: Dict[str, Any]):
+        state = {k: json.dumps(v) for k, v in job.items() if k not in _DERIVED_FIELDS}
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(job["id"]), mapping=state)
+            pipe.zadd(f"{self.prefix}jobs", {job["id"]: time.time()})
+            await pipe.execute()
+        await self.push(job["id"], [(canonicalize_url(job["seed_url"]), 0, 0.0)])
+
+    async def update_job(self, job_id: str, fields: Dict[str, Any]) -> bool:
+        if not await self.redis.exists(self._key(job_id)):
+            return False
+        await self.redis.hset(self._key(job_id), mapping={k: json.dumps(v) for k, v in fields.items()})
+        return True
+
+    async def get_job(self, job_id: str, with_results: bool = False) -> Optional[Dict[str, Any]]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._key(job_id))
+            pipe.hgetall(self._key(job_id, "counters"))
+            pipe.zcard(self._key(job_id, "frontier"))
+            pipe.zcard(self._key(job_id, "leases"))
+            if with_results:
+                pipe.lrange(self._key(job_id, "results"), 0, -1)
+            replies = await pipe.execute()
+        if not replies[0]:
+            return None
+        state = {k: json.loads(v) for k, v in replies[0].items()}
+        counts = {k: int(v) for k, v in replies[1].items()}
+        counts.update(queued=replies[2], leased=replies[3])
+        results = [json.loads(entry) for entry in replies[4]] if with_results else None
+        return _job_view(state, counts, results)
+
+    async def list_jobs(self, with_results: bool = False) -> List[Dict[str, Any]]:
+        jobs = [await self.get_job(job_id, with_results) for job_id in await self.redis.zrange(f"{self.prefix}jobs", 0, -1)]
+        return [job for job in jobs if job is not None]
+
+    async def delete_job(self, job_id: str):
+        parts = ("", "counters", "seen", "frontier", "leases", "owners", "results")
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(*(self._key(job_id, part) for part in parts))
+            pipe.zrem(f"{self.prefix}jobs", job_id)
+            await pipe.execute()
+
+    async def push(self, job_id: str, items: List[FrontierItem]) -> int:
+        if not items or not await self.redis.exists(self._key(job_id)):
+            return 0
+        args = [value for url, depth, score in items for value in (url, depth, score)]
+        return int(await self._push_script(
+            keys=[self._key(job_id, "seen"), self._key(job_id, "frontier"), self._key(job_id, "counters")], args=args
+        ))
+
+    async def lease(self, job_id: str, owner: str, limit: int, ttl: float = LEASE_SECONDS) -> List[Tuple[str, int]]:
+        now = time.time()
+        members = await self._lease_script(
+            keys=[self._key(job_id, "frontier"), self._key(job_id, "leases"), self._key(job_id, "owners"),
+                  self._key(job_id, "counters"), self._key(job_id)],
+            args=[now, now + ttl, limit, owner, REQUEUE_SCORE],
+        )
+        return [self._item(member) for member in members]
+
+    async def heartbeat(self, job_id: str, owner: str, leased: List[Tuple[str, int]], ttl: float = LEASE_SECONDS) -> int:
+        if not leased:
+            return 0
+        return int(await self._heartbeat_script(
+            keys=[self._key(job_id, "leases"), self._key(job_id, "owners")],
+            args=[owner, time.time() + ttl, *(self._member(url, depth) for url, depth in leased)],
+        ))
+
+    async def _finish_leases(self, job_id: str, owner: str, items: List[Tuple[str, int]], release: bool):
+        if items:
+            await self._finish_leases_script(
+                keys=[self._key(job_id, "leases"), self._key(job_id, "owners"), self._key(job_id, "frontier"), self._key(job_id, "counters")],
+                args=[owner, "1" if release else "0", REQUEUE_SCORE, *(self._member(url, depth) for url, depth in items)],
+            )
+
+    async def complete(self, job_id: str, owner: str, items: List[Tuple[str, int]]):
+        await self._finish_leases(job_id, owner, items, release=False)
+
+    async def release(self, job_id: str, owner: str, items: List[Tuple[str, int]]):
+        await self._finish_leases(job_id, owner, items, release=True)
+
+    async def add_results(self, job_id: str, entries: List[Dict[str, Any]], delta: Dict[str, int]):
+        if not await self.redis.exists(self._key(job_id)):
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if entries:
+                pipe.rpush(self._key(job_id, "results"), *(json.dumps(entry) for entry in entries))
+            for name, amount in delta.items():
+                if amount:
+                    pipe.hincrby(self._key(job_id, "counters"), name, amount)
+            await pipe.execute()
+
+    async def results(self, job_id: str, after: int = -1, limit: int = 100) -> Tuple[List[Dict[str, Any]], int]:
+        start = max(after + 1, 0)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lrange(self._key(job_id, "results"), start, start + limit - 1)
+            pipe.llen(self._key(job_id, "results"))
+            entries, total = await pipe.execute()
+        return [{"seq": start + i, **json.loads(entry)} for i, entry in enumerate(entries)], total
+
+    async def frontier_counts(self, job_id: str) -> Dict[str, Any]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(self._key(job_id), "status", "max_urls")
+            pipe.hget(self._key(job_id, "counters"), "dispatched")
+            pipe.zcard(self._key(job_id, "frontier"))
+            pipe.zcard(self._key(job_id, "leases"))
+            (status, max_urls), dispatched, queued, leased = await pipe.execute()
+        return {
+            "status": json.loads(status) if status else None,
+            "queued": queued,
+            "leased": leased,
+            "budget": (json.loads(max_urls) if max_urls else 0) - int(dispatched or 0),
+        }
+
+    async def finish(self, job_id: str) -> bool:
+        return bool(await self._finish_job_script(
+            keys=[self._key(job_id), self._key(job_id, "frontier"), self._key(job_id, "leases"), self._key(job_id, "counters")],
+            args=[json.dumps(datetime.now().isoformat())],
+        ))
+
+    def close(self):
+        pass  # connections are closed with the event loop
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "url": self.url}
+
+
+def _job_view(state: Dict[str, Any], counts: Dict[str, int], results: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Job dict in the same shape as a local job"""
+    job = dict(state)
+    for name in ("urls_found",) + RESULT_COUNTERS:
+        job[name] = counts.get(name, 0)
+    job["urls_pending"] = counts.get("queued", 0) if job.get("status") != "completed" else 0
+    job["urls_leased"] = counts.get("leased", 0)
+    if results is None:
+        job["result_count"] = counts.get("results", 0)
+    else:
+        job["scraped_urls"] = results
+    return job
+
+
+def create_coordinator(backend: str = CRAWL_COORDINATOR):
+    """Shared coordination backend, or None for in-process ("local") crawling"""
+    if backend == "sqlite":
+        return SQLiteCoordinator()
+    if backend == "redis":
+        return RedisCoordinator()
+    return None
+
+
+class LeasedFrontier:
+    """
+    CrawlEngine frontier backed by a coordinator: pop() serves a locally
+    leased batch, refill() leases the next one, and discovered links, acks
+    and releases are buffered and sent in batches by flush().
+    """
+
+    def __init__(
+        self,
+        coordinator,
+        job_id: str,
+        owner: str,
+        batch: int = 4,
+        stop_event: Optional[threading.Event] = None,
+        lease_seconds: float = LEASE_SECONDS,
+        poll_seconds: float = COORDINATOR_POLL_SECONDS,
+    ):
+        self.coordinator = coordinator
+        self.job_id = job_id
+        self.owner = owner
+        self.batch = max(1, batch)
+        self.stop_event = stop_event
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.seen = SeenSet()  # links this worker already sent; the backend dedups globally
+        self._queue = deque()
+        self._leased: Dict[str, int] = {}
+        self._discovered: List[FrontierItem] = []
+        self._done: List[Tuple[str, int]] = []
+        self._released: List[Tuple[str, int]] = []
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.counters = {"leased": 0, "completed": 0, "released": 0, "pushed": 0}
+
+    def push(self, url: str, depth: int, score: float = 0.0) -> bool:
+        """Buffer a discovered link; the shared frontier leases by score like PriorityFrontier"""
+        try:
+            url = canonicalize_url(url)
+        except ValueError:
+            return False
+        if not self.seen.add(url):
+            return False
+        self._discovered.append((url, depth, score))
+        return True
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        return self._queue.popleft() if self._queue else None
+
+    def requeue(self, url: str, depth: int):
+        """Abandoned page: give its lease back so any worker can retry it"""
+        if self._leased.pop(url, None) is not None:
+            self._released.append((url, depth))
+
+    def complete(self, url: str):
+        depth = self._leased.pop(url, None)
+        if depth is not None:
+            self._done.append((url, depth))
+
+    def __contains__(self, url: str) -> bool:
+        try:
+            return canonicalize_url(url) in self.seen
+        except ValueError:
+            return False
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    async def flush(self):
+        """Send discovered links, acks and releases"""
+        discovered, self._discovered = self._discovered, []
+        done, self._done = self._done, []
+        released, self._released = self._released, []
+        if discovered:
+            self.counters["pushed"] += await self.coordinator.push(self.job_id, discovered)
+        if done:
+            await self.coordinator.complete(self.job_id, self.owner, done)
+            self.counters["completed"] += len(done)
+        if released:
+            await self.coordinator.release(self.job_id, self.owner, released)
+            self.counters["released"] += len(released)
+
+    async def refill(self, wait: bool) -> bool:
+        """
+        Lease the next batch. With `wait`, keep polling while other workers
+        still hold leases (their pages may add links); False once the job is
+        exhausted, stopped or no longer running.
+        """
+        await self.flush()
+        while True:
+            items = await self.coordinator.lease(self.job_id, self.owner, self.batch, self.lease_seconds)
+            if items:
+                for url, depth in items:
+                    self._leased[url] = depth
+                    self._queue.append((url, depth))
+                self.counters["leased"] += len(items)
+                return True
+            if not wait or (self.stop_event is not None and self.stop_event.is_set()):
+                return False
+            counts = await self.coordinator.frontier_counts(self.job_id)
+            if counts["status"] != "running":
+                return False
+            if not counts["leased"] and (not counts["queued"] or counts["budget"] <= 0):
+                return False
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.coordinator.heartbeat(self.job_id, self.owner, list(self._leased.items()), self.lease_seconds)
+                counts = await self.coordinator.frontier_counts(self.job_id)
+                if counts["status"] != "running" and self.stop_event is not None:
+                    self.stop_event.set()  # stopped, deleted or finished elsewhere
+            except Exception as e:
+                log.warning(f"⚠️ Lease heartbeat failed for job {self.job_id}: {e}")
+
+    def start(self):
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def close(self):
+        """Stop heartbeating and hand back anything leased but not crawled"""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        for url, depth in self._queue:
+            self.requeue(url, depth)
+        self._queue.clear()
+        await self.flush()
+
+    def snapshot(self, in_flight=()) -> Dict[str, Any]:
+        return {"queue": [list(item) for item in in_flight] + [list(item) for item in self._queue]}
+
+    def stats(self) -> dict:
+        return {**self.counters, "queued": len(self._queue), "leased_now": len(self._leased)}
@@ -0,0 +1,205 @@
+"""
+Concurrent crawl engine
+Runs a pool of async workers over a crawl frontier while a per-host
+scheduler keeps each site within its concurrency and delay budget
+"""
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from frontier import CrawlFrontier
+from log import get_logger
+
+log = get_logger(__name__)
+
+# Max simultaneous requests to a single host (politeness)
+PER_HOST_CONCURRENCY = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", "1"))
+
+
+def host_of(url: str) -> str:
+    """Lower-cased network location used as the politeness key"""
+    return urlparse(url).netloc.lower()
+
+
+class _HostState:
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
+
+
+class HostScheduler:
+    """
+    Per-host concurrency and minimum delay between request starts for one job.
+    An optional shared limiter (see rate_limiter.py) paces hosts across all jobs.
+    """
+
+    def __init__(
+        self,
+        per_host_delay: float = 0.0,
+        per_host_concurrency: int = PER_HOST_CONCURRENCY,
+        limiter=None,
+    ):
+        self.per_host_delay = max(0.0, per_host_delay)
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.limiter = limiter
+        self._hosts: Dict[str, _HostState] = {}
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.per_host_concurrency)
+        return state
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Hold a fetch slot for the URL's host; waits out the host delay first"""
+        state = self._state(host_of(url))
+        loop = asyncio.get_running_loop()
+        async with state.semaphore:
+            async with state.lock:
+                wait = state.next_start - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                state.next_start = loop.time() + self.per_host_delay
+            if self.limiter is not None:
+                await self.limiter.acquire(url)
+            yield
+
+
+class CrawlEngine:
+    """
+    Drives `process(url, depth)` over the frontier with `concurrency` workers.
+    The callback discovers new links and feeds them back through `enqueue`;
+    the frontier deduplicates, so every popped URL is new.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[str, int], Awaitable[None]],
+        frontier=None,
+        concurrency: int = 4,
+        max_urls: int = 50,
+        stop_event: Optional[threading.Event] = None,
+        on_page_done: Optional[Callable[[], Awaitable[None]]] = None,
+        pages_done: int = 0,
+    ):
+        self.process = process
+        self.frontier = frontier if frontier is not None else CrawlFrontier(capacity=max_urls, expected_urls=max_urls)
+        self.concurrency = max(1, concurrency)
+        self.max_urls = max_urls
+        self.stop_event = stop_event
+        self.on_page_done = on_page_done
+        self.dispatched = pages_done
+        self.active: Dict[str, int] = {}
+        self.stopped = False
+        self._changed: Optional[asyncio.Condition] = None
+        self._refilling = False  # one worker at a time leases more work, outside the condition
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.active)
+
+    @property
+    def pages_done(self) -> int:
+        return self.dispatched - len(self.active)
+
+    def snapshot(self) -> dict:
+        """Frontier state including in-flight URLs; taken synchronously so it is consistent"""
+        return self.frontier.snapshot(in_flight=self.active.items())
+
+    def enqueue(self, url: str, depth: int, score: float = 0.0) -> bool:
+        """Add a discovered URL to the frontier (best-first frontiers order by score); False if it was already seen"""
+        if not self.frontier.push(url, depth, score):
+            return False
+        if self._changed is not None:
+            asyncio.ensure_future(self._notify())
+        return True
+
+    def requeue(self, url: str, depth: int):
+        """Return a URL whose processing was abandoned; it no longer counts against max_urls"""
+        self.frontier.requeue(url, depth)
+        self.dispatched -= 1
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    def _can_refill(self) -> bool:
+        """Shared frontiers (see coordination.py) fetch more work when the local queue runs dry"""
+        return hasattr(self.frontier, "refill") and self.dispatched < self.max_urls
+
+    def _next(self) -> Optional[Tuple[str, int]]:
+        if self.dispatched >= self.max_urls:
+            return None
+        return self.frontier.pop()
+
+    async def _worker(self):
+        while True:
+            if self.stop_event and self.stop_event.is_set():
+                self.stopped = True
+                return
+
+            refill_wait = None
+            async with self._changed:
+                item = self._next()
+                if item is None:
+                    if self._refilling:
+                        await self._changed.wait()  # another worker is leasing; its items arrive with a notify
+                        continue
+                    if self._can_refill():
+                        self._refilling = True
+                        refill_wait = self.in_flight == 0
+                    elif self.in_flight == 0:
+                        # Nothing queued and nothing that could queue more
+                        self._changed.notify_all()
+                        return
+                    else:
+                        await self._changed.wait()
+                        continue
+                else:
+                    self.dispatched += 1
+                    self.active[item[0]] = item[1]
+
+            if refill_wait is not None:
+                # Lease round-trips (and polling, with wait) happen without holding the condition,
+                # so other workers can still finish pages meanwhile
+                try:
+                    refilled = await self.frontier.refill(refill_wait)
+                except BaseException:
+                    self._refilling = False
+                    raise
+                async with self._changed:
+                    self._refilling = False
+                    self._changed.notify_all()
+                    if refilled:
+                        continue
+                    if self.in_flight == 0:
+                        if refill_wait:
+                            return  # the shared frontier is exhausted
+                        continue  # the last pages finished meanwhile; lease again, waiting this time
+                    await self._changed.wait()
+                continue
+
+            try:
+                await self.process(*item)
+            except Exception as e:
+                log.error(f"❌ Crawl worker error on {item[0]}: {e}")
+            finally:
+                async with self._changed:
+                    self.active.pop(item[0], None)
+                    self._changed.notify_all()
+                if self.on_page_done is not None:
+                    try:
+                        await self.on_page_done()
+                    except Exception as e:
+                        log.warning(f"⚠️ Crawl progress hook failed: {e}")
+
+    async def run(self) -> bool:
+        """Crawl until the frontier is exhausted, max_urls is hit or a stop is requested"""
+        self._changed = asyncio.Condition()
+        await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+        return not self.stopped
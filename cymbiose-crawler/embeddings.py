@@ -0,0 +1,166 @@
+"""
+Chunk embeddings
+Embeds RAG chunks in multi-input batches through a pluggable backend
+(Gemini batchEmbedContents, or a deterministic local hashing embedder for
+offline use). Vectors are cached by content hash, so re-scraped and
+duplicated chunks are never embedded twice.
+"""
+import array
+import asyncio
+import base64
+import hashlib
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from llm_cache import LLMCache, cache_key
+from log import get_logger
+from metrics import stage_timer
+
+log = get_logger(__name__)
+
+# "gemini" (needs GEMINI_API_KEY) or "local" (deterministic feature hashing, no network)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "768"))  # local backend only
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))  # Gemini accepts up to 100 per call
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite3")
+EMBEDDING_CACHE_ITEMS = int(os.getenv("EMBEDDING_CACHE_ITEMS", "1000000"))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def pack_vector(vector: List[float]) -> str:
+    """float32 bytes, base64-encoded (about a quarter of the size of a JSON float list)"""
+    return base64.b64encode(array.array("f", vector).tobytes()).decode("ascii")
+
+
+def unpack_vector(data: str) -> List[float]:
+    vector = array.array("f")
+    vector.frombytes(base64.b64decode(data))
+    return vector.tolist()
+
+
+class LocalEmbedder:
+    """
+    Signed feature hashing of word unigrams and bigrams (sublinear tf),
+    L2-normalized. Deterministic and offline; similar texts get similar vectors.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = max(8, dim)
+        self.model = f"local-hash-v1-{self.dim}"
+
+    def _embed_one(self, text: str) -> List[float]:
+        words = _WORD.findall(text.lower())
+        counts: Dict[str, int] = {}
+        for i, word in enumerate(words):
+            counts[word] = counts.get(word, 0) + 1
+            if i:
+                bigram = f"{words[i - 1]} {word}"
+                counts[bigram] = counts.get(bigram, 0) + 1
+
+        vector = [0.0] * self.dim
+        for feature, count in counts.items():
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+            weight = 1.0 + math.log(count)
+            vector[h % self.dim] += weight if h >> 63 else -weight
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(lambda: [self._embed_one(text) for text in texts])
+
+
+class GeminiEmbedder:
+    """batchEmbedContents through the shared GeminiClient (budget, retries, circuit breaker)"""
+
+    def __init__(self, gemini, api_key: Optional[str], model: str = EMBEDDING_MODEL):
+        self.gemini = gemini
+        self.api_key = api_key
+        self.model = model
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:batchEmbedContents?key={self.api_key}"
+        body = {"requests": [
+            {"model": f"models/{self.model}", "content": {"parts": [{"text": text}]}, "taskType": "RETRIEVAL_DOCUMENT"}
+            for text in texts
+        ]}
+        data = await self.gemini.request(url, body, sum(len(text) // 4 for text in texts))
+        embeddings = data.get("embeddings", [])
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+        return [entry["values"] for entry in embeddings]
+
+
+def create_embedder(gemini, api_key: Optional[str], backend: str = EMBEDDING_BACKEND):
+    """Embedding backend by name; "gemini" without an API key falls back to "local" """
+    if backend == "gemini" and api_key:
+        return GeminiEmbedder(gemini, api_key)
+    if backend == "gemini":
+        log.warning("⚠️ No GEMINI_API_KEY, using the local embedder")
+    return LocalEmbedder()
+
+
+class EmbeddingService:
+    """Batches embedding requests and skips texts whose vector is already cached"""
+
+    def __init__(self, embedder, batch_size: int = EMBEDDING_BATCH_SIZE, cache: Optional[LLMCache] = None):
+        self.embedder = embedder
+        self.batch_size = max(1, batch_size)
+        self.cache = cache if cache is not None else LLMCache(path=EMBEDDING_CACHE_PATH, disk_items=EMBEDDING_CACHE_ITEMS)
+        self.counters = {"texts": 0, "cached": 0, "embedded": 0, "batches": 0}
+
+    @property
+    def model(self) -> str:
+        return self.embedder.model
+
+    def _key(self, text: str) -> str:
+        return cache_key("embedding", text, "v1", self.model)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """One vector per text; identical texts within the call are embedded once"""
+        self.counters["texts"] += len(texts)
+        keys = [self._key(text) for text in texts]
+        vectors: Dict[str, List[float]] = {}
+
+        unique = list(dict.fromkeys(keys))
+        for key, packed in zip(unique, await asyncio.gather(*(self.cache.get(key) for key in unique))):
+            if packed is not None:
+                vectors[key] = unpack_vector(packed)
+        self.counters["cached"] += sum(1 for key in keys if key in vectors)
+
+        first_text = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                first_text.setdefault(key, text)
+        missing = list(first_text.items())
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        for batch, embedded in zip(batches, await asyncio.gather(*(self._embed_batch(batch) for batch in batches))):
+            for (key, _), vector in zip(batch, embedded):
+                vectors[key] = vector
+
+        return [vectors[key] for key in keys]
+
+    async def _embed_batch(self, batch: List[tuple]) -> List[List[float]]:
+        texts = [text for _, text in batch]
+        with stage_timer("embed", sum(len(text) for text in texts)):
+            embedded = await self.embedder.embed(texts)
+        self.counters["batches"] += 1
+        self.counters["embedded"] += len(batch)
+        packed = [pack_vector(vector) for vector in embedded]
+        await asyncio.gather(*(self.cache.set(key, data) for (key, _), data in zip(batch, packed)))
+        # Same float32 precision whether a vector was just embedded or read back from the cache
+        return [unpack_vector(data) for data in packed]
+
+    async def embed_chunks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copies of the chunks with an "embedding" vector each"""
+        vectors = await self.embed([chunk["content"] for chunk in chunks])
+        return [{**chunk, "embedding": vector} for chunk, vector in zip(chunks, vectors)]
+
+    def close(self):
+        self.cache.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "model": self.model, "batch_size": self.batch_size, "cache": self.cache.stats()}
@@ -0,0 +1,192 @@
+"""
+CPU offload for page processing
+Parsing, markdown conversion, link extraction and chunking run in a
+process pool (thread-pool fallback) so large pages never block the event
+loop. Tasks take raw bytes and return compact, picklable results.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from chunking import chunk_content
+from html_document import parse_html
+from log import get_logger
+from metrics import IN_FLIGHT, observe_stage
+from near_dup import simhash
+
+log = get_logger(__name__)
+
+# "process" (default), "thread" or "inline" (run on the event loop; debugging only)
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "process").lower()
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0")) or (os.cpu_count() or 2)
+
+# Screening only ever reads this much text, so don't ship more back to the loop
+SCREENING_TEXT_CHARS = 8000
+
+# Tasks report per-stage timings under this key; run() records and removes them
+STAGES_KEY = "_stages"
+
+
+@contextmanager
+def _stage(stages: list, name: str, size: Optional[int] = None):
+    started = time.perf_counter()
+    yield
+    stages.append((name, time.perf_counter() - started, size))
+
+
+# ---- tasks (module-level so they pickle) ----
+
+def parse_for_scrape(body: bytes, encoding: Optional[str], markdown_limit: int = 20000, chunk: bool = True) -> Dict[str, Any]:
+    """
+    Title, markdown (capped at `markdown_limit` chars) and RAG chunks for /scrape.
+    With chunk=False the uncapped markdown comes back as "full_markdown"
+    instead of "chunks", for /scrape/stream to chunk while it sends.
+    """
+    stages = []
+    with _stage(stages, "parse", len(body)):
+        doc = parse_html(body, encoding=encoding)
+        title = doc.title() or doc.heading() or "No Title"
+    with _stage(stages, "markdown", len(body)):
+        markdown = doc.markdown()
+    parsed = {
+        "title": title,
+        "markdown": markdown[:markdown_limit],
+        "content_length": len(markdown),
+        STAGES_KEY: stages,
+    }
+    if not chunk:
+        parsed["full_markdown"] = markdown
+        return parsed
+    with _stage(stages, "chunk", len(markdown)):
+        parsed["chunks"] = chunk_content(markdown)
+    return parsed
+
+
+def parse_for_scrape_stream(body: bytes, encoding: Optional[str]) -> Dict[str, Any]:
+    """parse_for_scrape without the chunking (see chunk=False)"""
+    return parse_for_scrape(body, encoding, chunk=False)
+
+
+def parse_for_crawl(body: bytes, encoding: Optional[str], url: str, same_domain: bool, with_links: bool) -> Dict[str, Any]:
+    """
+    Title, screening text sample, near-duplicate fingerprint and (optionally)
+    outgoing links for a crawl job. The fingerprint covers the main content
+    (markdown, without nav/header/footer), so pages that only share a site
+    template don't count as duplicates.
+    """
+    stages = []
+    with _stage(stages, "parse", len(body)):
+        doc = parse_html(body, encoding=encoding)
+        text_content = doc.text()
+    with _stage(stages, "markdown", len(body)):
+        markdown = doc.markdown()
+    with _stage(stages, "fingerprint", len(markdown)):
+        fingerprint = simhash(markdown)
+    with _stage(stages, "links", len(body)):
+        links = _crawl_links(doc, url, same_domain) if with_links else {"links": None, "anchors": None}
+    return {
+        "title": doc.title() or url,
+        "text": text_content[:SCREENING_TEXT_CHARS],
+        "text_length": len(text_content),
+        "content_fingerprint": fingerprint,
+        **links,
+        STAGES_KEY: stages,
+    }
+
+
+def _crawl_links(doc, url: str, same_domain: bool) -> Dict[str, Any]:
+    """Outgoing links plus their anchor texts (same order), for scoring the frontier"""
+    anchored = doc.anchored_links(url, same_domain)
+    return {"links": list(anchored), "anchors": list(anchored.values())}
+
+
+def parse_crawl_links(body: bytes, encoding: Optional[str], url: str, same_domain: bool) -> Dict[str, Any]:
+    return _crawl_links(parse_html(body, encoding=encoding), url, same_domain)
+
+
+def parse_links(body: bytes, encoding: Optional[str], url: str, same_domain: bool) -> List[str]:
+    return parse_html(body, encoding=encoding).links(url, same_domain)
+
+
+def _warm_up():
+    """Import parser modules in each worker before real work arrives"""
+    return os.getpid()
+
+
+class ParseExecutor:
+    """Runs CPU-bound page tasks off the event loop"""
+
+    def __init__(self, mode: str = PARSE_EXECUTOR, workers: int = PARSE_WORKERS):
+        self.mode = mode
+        self.workers = max(1, workers)
+        self._pool: Optional[Executor] = None
+        self.submitted = 0
+        self.in_flight = 0
+
+    def start(self):
+        if self._pool is not None or self.mode == "inline":
+            return
+        if self.mode == "process":
+            try:
+                # spawn: workers must not inherit the event loop, sockets or SQLite handles
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                for _ in range(self.workers):
+                    self._pool.submit(_warm_up)
+                return
+            except (OSError, NotImplementedError, ImportError) as e:
+                log.warning(f"⚠️ Process pool unavailable ({e}), falling back to threads")
+                self.mode = "thread"
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="parse")
+
+    def shutdown(self, wait: bool = True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run `fn(*args)` in the pool and await its result"""
+        return _record_stages(await self._run(fn, *args))
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        if self.mode == "inline":
+            return fn(*args)
+        if self._pool is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        self.submitted += 1
+        self.in_flight += 1
+        IN_FLIGHT.inc(kind="parse")
+        try:
+            return await loop.run_in_executor(self._pool, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge page); keep serving from threads
+            log.warning("⚠️ Parse process pool broke, switching to threads")
+            self.shutdown(wait=False)
+            self.mode = "thread"
+            self.start()
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self.in_flight -= 1
+            IN_FLIGHT.dec(kind="parse")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "workers": self.workers, "submitted": self.submitted, "in_flight": self.in_flight}
+
+
+def _record_stages(result: Any) -> Any:
+    """Stage timings measured inside the worker are recorded here, in the serving process"""
+    if isinstance(result, dict) and STAGES_KEY in result:
+        # The stages ran back to back just before the result arrived; work back from now for trace spans
+        ended = time.perf_counter()
+        for name, seconds, size in reversed(result.pop(STAGES_KEY)):
+            observe_stage(name, seconds, size, ended=ended)
+            ended -= seconds
+    return result
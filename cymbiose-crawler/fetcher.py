@@ -0,0 +1,98 @@
+"""
+Streaming page fetches
+Checks status and content-type from the headers before any body is read,
+stops reading once the byte budget is spent, and returns the raw bytes
+for the parser (no text decode step).
+"""
+import os
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from log import get_logger
+from metrics import ERRORS, IN_FLIGHT, observe_stage
+
+log = get_logger(__name__)
+
+MAX_PAGE_BYTES = int(os.getenv("MAX_PAGE_BYTES", str(3 * 1024 * 1024)))
+HTML_CONTENT_TYPES: Tuple[str, ...] = ("text/html", "application/xhtml+xml")
+TEXT_CONTENT_TYPES: Tuple[str, ...] = HTML_CONTENT_TYPES + ("text/plain", "application/xml", "text/xml")
+
+# Headers that describe the wire encoding rather than the decoded body we keep
+WIRE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def content_type_allowed(content_type: str, accept: Optional[Tuple[str, ...]]) -> bool:
+    if not accept:
+        return True
+    mime = content_type.split(";")[0].strip().lower()
+    # Servers that omit Content-Type usually serve HTML
+    return not mime or mime in accept
+
+
+async def stream_fetch(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 30.0,
+    max_bytes: int = MAX_PAGE_BYTES,
+    accept: Optional[Tuple[str, ...]] = HTML_CONTENT_TYPES,
+    metrics_host: Optional[str] = None,
+) -> httpx.Response:
+    """
+    GET `url`, reading at most `max_bytes` of decoded body.
+    Non-200 responses and unaccepted content types come back with an empty body.
+    response.extensions carries "truncated" and "body_skipped" flags.
+    `metrics_host` overrides the host label on fetch errors ("" for ad-hoc URLs).
+    """
+    host = urlparse(url).netloc if metrics_host is None else metrics_host
+    started = time.perf_counter()
+    IN_FLIGHT.inc(kind="fetch")
+    try:
+        response = await _stream_fetch(client, url, headers, timeout, max_bytes, accept)
+    except httpx.HTTPError:
+        ERRORS.inc(stage="fetch", host=host)
+        raise
+    finally:
+        IN_FLIGHT.dec(kind="fetch")
+    observe_stage("fetch", time.perf_counter() - started, len(response.content))
+    if response.status_code >= 400:
+        ERRORS.inc(stage="fetch", host=host)
+    return response
+
+
+async def _stream_fetch(client, url, headers, timeout, max_bytes, accept) -> httpx.Response:
+    async with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+        content_type = response.headers.get("content-type", "")
+        skip = response.status_code != 200 or not content_type_allowed(content_type, accept)
+
+        chunks = []
+        size = 0
+        truncated = False
+        if not skip:
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > max_bytes:
+                    truncated = True
+                    break
+        body = b"".join(chunks)[:max_bytes]
+
+        if truncated:
+            log.info(f"✂️ Truncated {url} at {max_bytes} bytes")
+        elif skip and response.status_code == 200:
+            log.info(f"⏭️ Skipped body of {url} ({content_type or 'unknown type'})")
+
+        return httpx.Response(
+            response.status_code,
+            headers=[(k, v) for k, v in response.headers.multi_items() if k.lower() not in WIRE_HEADERS],
+            content=body,
+            request=response.request,
+            extensions={
+                "http_version": response.extensions.get("http_version", b"HTTP/1.1"),
+                "truncated": truncated,
+                "body_skipped": skip,
+            },
+        )
@@ -0,0 +1,311 @@
+"""
+Crawl frontier
+URL canonicalization plus a FIFO (or best-first) queue that deduplicates
+at enqueue time through a compact seen-set (64-bit hashes) or, for very
+large crawls, a Bloom filter. Memory grows with unique URLs, not with
+link edges.
+"""
+import hashlib
+import heapq
+import math
+import os
+from array import array
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+
+# Query parameters that only track campaigns/sessions and never change content
+TRACKING_PARAMS = {
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid", "_ga", "_gl",
+    "igshid", "ref_src", "spm", "sessionid", "phpsessid", "jsessionid",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "hsa_")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# "strip": /a/ -> /a (matches the crawler's historical normalization), "keep": leave as-is
+TRAILING_SLASH_POLICY = os.getenv("TRAILING_SLASH_POLICY", "strip")
+
+# Crawls at least this large default to the Bloom-filter seen-set
+BLOOM_THRESHOLD = int(os.getenv("BLOOM_THRESHOLD", "100000"))
+
+# Requeued and in-flight URLs go back ahead of anything a scorer can produce
+REQUEUE_SCORE = 1e9
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(url: str, trailing_slash: str = TRAILING_SLASH_POLICY) -> str:
+    """
+    Canonical form used for dedup: lower-cased scheme/host, default port and
+    fragment dropped, tracking parameters removed, query sorted, trailing
+    slash handled per policy. Query pieces keep their original encoding
+    (this is also the URL that gets fetched). Raises ValueError for a malformed netloc
+    (bad port, unbalanced IPv6 brackets).
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower().rstrip(".")
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 literal; hostname drops the brackets
+    netloc = host
+    port = parts.port  # ValueError if not a valid port number
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+    if parts.username:
+        netloc = f"{parts.username}{':' + parts.password if parts.password else ''}@{netloc}"
+
+    path = parts.path or "/"
+    if trailing_slash == "strip":
+        path = path.rstrip("/")
+
+    query = "&".join(sorted(
+        piece for piece in parts.query.split("&")
+        if piece and not _is_tracking_param(unquote_plus(piece.split("=", 1)[0]))
+    ))
+
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def _hash64(url: str) -> int:
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class SeenSet:
+    """Exact seen-set storing 64-bit URL hashes instead of URL strings"""
+
+    def __init__(self):
+        self._hashes = set()
+
+    def add(self, url: str) -> bool:
+        """Add `url`; returns False if it was already present"""
+        h = _hash64(url)
+        if h in self._hashes:
+            return False
+        self._hashes.add(h)
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        return _hash64(url) in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def to_bytes(self) -> bytes:
+        return array("Q", self._hashes).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SeenSet":
+        seen = cls()
+        hashes = array("Q")
+        hashes.frombytes(data)
+        seen._hashes = set(hashes)
+        return seen
+
+
+class BloomFilter:
+    """Fixed-memory probabilistic seen-set; false positives skip a URL, never recrawl one"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+
+    def _positions(self, url: str):
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, url: str) -> bool:
+        """Add `url`; returns False if it was (probably) already present"""
+        new = False
+        for pos in self._positions(url):
+            byte, bit = divmod(pos, 8)
+            if not self._bits[byte] & (1 << bit):
+                self._bits[byte] |= 1 << bit
+                new = True
+        if new:
+            self._count += 1
+        return new
+
+    def __contains__(self, url: str) -> bool:
+        return all(self._bits[pos // 8] & (1 << (pos % 8)) for pos in self._positions(url))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def to_bytes(self) -> bytes:
+        header = array("Q", [self.size, self.hashes, self._count]).tobytes()
+        return header + bytes(self._bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BloomFilter":
+        bloom = cls.__new__(cls)
+        header = array("Q")
+        header.frombytes(data[:24])
+        bloom.size, bloom.hashes, bloom._count = header
+        bloom._bits = bytearray(data[24:])
+        return bloom
+
+
+class CrawlFrontier:
+    """
+    FIFO (breadth-first) frontier of (url, depth) with enqueue-time dedup.
+    `capacity` bounds the queue: in FIFO order, URLs beyond the crawl budget
+    would never be popped, so they are only recorded as seen.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, dedup_mode: str = "auto", expected_urls: int = 0):
+        if dedup_mode == "auto":
+            dedup_mode = "bloom" if expected_urls >= BLOOM_THRESHOLD else "exact"
+        self.dedup_mode = dedup_mode
+        # Pages link to many more URLs than get crawled; size the filter for ~20 per crawled page
+        self.seen = BloomFilter(max(expected_urls, 1) * 20) if dedup_mode == "bloom" else SeenSet()
+        self.capacity = capacity
+        self.dropped = 0
+        self._queue = deque()
+
+    strategy = "bfs"
+
+    def push(self, url: str, depth: int, score: float = 0.0) -> bool:
+        """Canonicalize and enqueue; returns True if the URL had not been seen before (score is ignored)"""
+        try:
+            url = canonicalize_url(url)
+        except ValueError:
+            return False  # malformed URL: rejected like a duplicate
+        if not self.seen.add(url):
+            return False
+        if self.capacity is not None and len(self._queue) >= self.capacity:
+            self.dropped += 1
+        else:
+            self._queue.append((url, depth))
+        return True
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        return self._queue.popleft() if self._queue else None
+
+    def requeue(self, url: str, depth: int):
+        """Put an already-seen URL back at the head of the queue (its processing was abandoned)"""
+        self._queue.appendleft((url, depth))
+
+    def __contains__(self, url: str) -> bool:
+        try:
+            return canonicalize_url(url) in self.seen
+        except ValueError:
+            return False
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def snapshot(self, in_flight: Iterable[Tuple[str, int]] = ()) -> Dict[str, Any]:
+        """
+        Checkpointable state. URLs still being processed go back to the head
+        of the queue so a resumed crawl retries them.
+        """
+        return {
+            "strategy": self.strategy,
+            "dedup_mode": self.dedup_mode,
+            "capacity": self.capacity,
+            "dropped": self.dropped,
+            "queue": [list(item) for item in in_flight] + [list(item) for item in self._queue],
+            "seen": self.seen.to_bytes(),
+        }
+
+    @classmethod
+    def restore(cls, state: Dict[str, Any]) -> "CrawlFrontier":
+        frontier = cls(capacity=state["capacity"], dedup_mode=state["dedup_mode"])
+        seen_cls = BloomFilter if state["dedup_mode"] == "bloom" else SeenSet
+        frontier.seen = seen_cls.from_bytes(state["seen"])
+        frontier.dropped = state["dropped"]
+        frontier._queue = deque((url, depth) for url, depth in state["queue"])
+        return frontier
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self), "seen": len(self.seen), "dropped": self.dropped,
+            "dedup_mode": self.dedup_mode, "strategy": self.strategy,
+        }
+
+
+class PriorityFrontier(CrawlFrontier):
+    """
+    Best-first frontier: pops the highest-scoring URL, FIFO among equal
+    scores. With a `capacity`, only the best `capacity` URLs are kept; the
+    heap is trimmed whenever it doubles, so memory stays bounded.
+    """
+
+    strategy = "best_first"
+
+    def __init__(self, capacity: Optional[int] = None, dedup_mode: str = "auto", expected_urls: int = 0):
+        super().__init__(capacity=capacity, dedup_mode=dedup_mode, expected_urls=expected_urls)
+        self._heap: List[Tuple[float, int, str, int]] = []  # (-score, seq, url, depth)
+        self._seq = 0
+
+    def _add(self, url: str, depth: int, score: float):
+        self._seq += 1
+        heapq.heappush(self._heap, (-score, self._seq, url, depth))
+
+    def push(self, url: str, depth: int, score: float = 0.0) -> bool:
+        """Canonicalize and enqueue by score; returns True if the URL had not been seen before"""
+        try:
+            url = canonicalize_url(url)
+        except ValueError:
+            return False
+        if not self.seen.add(url):
+            return False
+        self._add(url, depth, score)
+        if self.capacity is not None and len(self._heap) >= 2 * max(self.capacity, 1):
+            # A sorted list is a valid heap
+            self.dropped += len(self._heap) - self.capacity
+            self._heap = heapq.nsmallest(self.capacity, self._heap)
+        return True
+
+    def pop(self) -> Optional[Tuple[str, int]]:
+        if not self._heap:
+            return None
+        _, _, url, depth = heapq.heappop(self._heap)
+        return url, depth
+
+    def requeue(self, url: str, depth: int):
+        self._add(url, depth, REQUEUE_SCORE)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def snapshot(self, in_flight: Iterable[Tuple[str, int]] = ()) -> Dict[str, Any]:
+        state = super().snapshot()
+        state["queue"] = [[url, depth, REQUEUE_SCORE] for url, depth in in_flight] + [
+            [url, depth, -key] for key, _, url, depth in sorted(self._heap)
+        ]
+        return state
+
+    @classmethod
+    def restore(cls, state: Dict[str, Any]) -> "PriorityFrontier":
+        frontier = super().restore({**state, "queue": []})
+        for url, depth, score in state["queue"]:
+            frontier._add(url, depth, score)
+        return frontier
+
+
+def create_frontier(strategy: str = "bfs", **kwargs) -> CrawlFrontier:
+    """FIFO ("bfs") or scored ("best_first") frontier"""
+    return (PriorityFrontier if strategy == "best_first" else CrawlFrontier)(**kwargs)
+
+
+def restore_frontier(state: Dict[str, Any], skip: Iterable[str] = ()) -> CrawlFrontier:
+    """
+    Rebuild a frontier from snapshot(); checkpoints without a strategy are FIFO.
+    Queued URLs in `skip` are dropped: a page still in flight at the checkpoint
+    may already have recorded its result, and must not be fetched again.
+    """
+    skip = set(skip)
+    if skip:
+        state = {**state, "queue": [item for item in state["queue"] if item[0] not in skip]}
+    cls = PriorityFrontier if state.get("strategy") == "best_first" else CrawlFrontier
+    return cls.restore(state)
@@ -0,0 +1,257 @@
+"""
+Resilient Gemini client
+Every Gemini call goes through one component that enforces a global
+concurrency limit and a requests/tokens-per-minute budget, retries
+transient failures with jittered exponential backoff (honoring
+Retry-After), and trips a circuit breaker when the API stays unhealthy so
+callers can pause work instead of falling back to unscreened defaults.
+"""
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from log import get_logger
+from metrics import ERRORS, IN_FLIGHT, LLM_TOKENS, observe_stage
+from rate_limiter import TokenBucket, parse_retry_after
+
+log = get_logger(__name__)
+
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "0"))  # 0 = no client-side request budget
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "0"))  # 0 = no client-side token budget
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+GEMINI_BREAKER_COOLDOWN = float(os.getenv("GEMINI_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Bad or expired key, no permission, unknown model: every call will fail until the config is fixed
+CONFIG_ERROR_STATUS = {401, 403, 404}
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+class GeminiError(Exception):
+    """Non-retryable Gemini failure (bad request, bad key, unexpected payload)"""
+
+
+class GeminiResponseError(GeminiError):
+    """The API answered but the response has no usable text (e.g. a blocked candidate)"""
+
+
+class GeminiUnavailable(GeminiError):
+    """Gemini is unhealthy: retries exhausted or the circuit breaker is open"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _estimate_tokens(prompt: str, generation_config: Dict[str, Any]) -> int:
+    return len(prompt) // 4 + int(generation_config.get("maxOutputTokens", 512))
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failed calls; open fails fast
+    for `cooldown` seconds (doubling while probes keep failing), then lets one
+    half-open probe through; a success closes it again.
+    """
+
+    def __init__(self, threshold: int = GEMINI_BREAKER_THRESHOLD, cooldown: float = GEMINI_BREAKER_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def retry_in(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.probing = False
+        if self.opened_at is not None:
+            log.info("✅ Gemini circuit closed")
+        self.opened_at = None
+        self.cooldown = self.base_cooldown
+
+    def failure(self, trip: bool = False):
+        """`trip` opens the circuit at once (a failure every call will repeat)"""
+        self.failures += 1
+        if self.probing:
+            # Failed probe: stay open, back off further
+            self.probing = False
+            self.cooldown = min(self.cooldown * 2, 600.0)
+            self.opened_at = time.monotonic()
+        elif self.opened_at is None and (trip or self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+            self.trips += 1
+            log.warning(f"🔌 Gemini circuit open for {self.cooldown:.0f}s after {self.failures} failures")
+
+
+class GeminiClient:
+    """Shared, budgeted, retrying front door for Gemini API calls"""
+
+    def __init__(
+        self,
+        clients,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        rpm: float = GEMINI_RPM,
+        tpm: float = GEMINI_TPM,
+        max_retries: int = GEMINI_MAX_RETRIES,
+    ):
+        self.clients = clients
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._requests = TokenBucket(rpm / 60.0, capacity=max(1.0, rpm / 60.0)) if rpm > 0 else None
+        self._tokens = TokenBucket(tpm / 60.0, capacity=tpm) if tpm > 0 else None
+        self.breaker = CircuitBreaker()
+        self.in_flight = 0
+        self.counters = {"calls": 0, "attempts": 0, "retries": 0, "throttled": 0, "failures": 0, "rejected_open": 0, "tokens": 0}
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def wait_until_retryable(self):
+        """Sleep out the open-circuit cooldown; the next call is the half-open probe"""
+        while self.breaker.state == "open":
+            await asyncio.sleep(max(0.5, self.breaker.retry_in()))
+
+    async def generate(self, url: str, prompt: str, generation_config: Dict[str, Any]) -> str:
+        """
+        POST a single-prompt generateContent request and return the first
+        candidate's text. Raises GeminiUnavailable when the API is unhealthy
+        and GeminiError for non-retryable failures.
+        """
+        body = {"contents": [{"parts": [{"text": prompt}]}], "generationConfig": generation_config}
+        data = await self.request(url, body, _estimate_tokens(prompt, generation_config))
+        try:
+            return data["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError):
+            raise GeminiResponseError(f"Unexpected Gemini response: {str(data)[:200]}")
+
+    async def request(self, url: str, body: Dict[str, Any], estimated_tokens: int) -> Dict[str, Any]:
+        """POST any Gemini API body under the shared budget, retries and breaker; returns the JSON response"""
+        self.counters["calls"] += 1
+        if not self.breaker.allow():
+            self.counters["rejected_open"] += 1
+            raise GeminiUnavailable("Gemini circuit breaker is open", retry_after=self.breaker.retry_in())
+
+        # Only one call can pass allow() while half-open, so `probing` here means it is ours
+        is_probe = self.breaker.probing
+        try:
+            return await self._post(url, body, estimated_tokens)
+        finally:
+            if is_probe and self.breaker.probing:
+                self.breaker.probing = False  # cancelled mid-probe; let the next call probe
+
+    async def _post(self, url: str, body: Dict[str, Any], estimate: int) -> Dict[str, Any]:
+        last_error = "unknown error"
+
+        for attempt in range(self.max_retries + 1):
+            if self._requests is not None:
+                await self._requests.acquire()
+            if self._tokens is not None:
+                await self._tokens.acquire(estimate)
+
+            self.counters["attempts"] += 1
+            retry_after = None
+            async with self.semaphore:
+                self.in_flight += 1
+                IN_FLIGHT.inc(kind="llm")
+                started = time.perf_counter()
+                try:
+                    response = await self.clients.llm.post(url, json=body, headers={"Content-Type": "application/json"})
+                except httpx.TransportError as e:
+                    response, last_error = None, f"{type(e).__name__}: {e}"
+                    ERRORS.inc(stage="llm", host="gemini")
+                finally:
+                    self.in_flight -= 1
+                    IN_FLIGHT.dec(kind="llm")
+                    observe_stage("llm", time.perf_counter() - started)
+
+            if response is not None:
+                if response.status_code == 200:
+                    self.breaker.success()
+                    data = response.json()
+                    usage = data.get("usageMetadata", {})
+                    LLM_TOKENS.inc(usage.get("promptTokenCount", 0), kind="prompt")
+                    LLM_TOKENS.inc(usage.get("candidatesTokenCount", 0), kind="completion")
+                    used = usage.get("totalTokenCount")
+                    if used:
+                        self.counters["tokens"] += used
+                        if self._tokens is not None:
+                            self._tokens.debit(used - estimate)
+                    return data
+                ERRORS.inc(stage="llm", host="gemini")
+                if response.status_code in CONFIG_ERROR_STATUS:
+                    # Not the document's fault, and retrying won't help: fail like an outage
+                    self.counters["failures"] += 1
+                    self.breaker.failure(trip=True)
+                    log.error(f"❌ Gemini rejected the request ({response.status_code}), check GEMINI_API_KEY / GEMINI_MODEL")
+                    raise GeminiUnavailable(
+                        f"Gemini API error: {response.status_code} - {response.text[:200]}",
+                        retry_after=self.breaker.retry_in(),
+                    )
+                if response.status_code not in RETRYABLE_STATUS:
+                    self.breaker.success()  # the API answered; the request itself is wrong
+                    raise GeminiError(f"Gemini API error: {response.status_code} - {response.text[:200]}")
+                last_error = f"HTTP {response.status_code}"
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+                if response.status_code == 429:
+                    self.counters["throttled"] += 1
+                    if self._requests is not None and retry_after:
+                        self._requests.blocked_until = max(self._requests.blocked_until, time.monotonic() + retry_after)
+
+            if attempt == self.max_retries:
+                break
+            # Full jitter; Retry-After is a floor when the server sends one
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            if retry_after:
+                delay = max(delay, min(retry_after, BACKOFF_MAX))
+            self.counters["retries"] += 1
+            log.warning(f"🔁 Gemini {last_error}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        self.counters["failures"] += 1
+        self.breaker.failure()
+        raise GeminiUnavailable(f"Gemini unavailable after {self.max_retries + 1} attempts ({last_error})",
+                                retry_after=self.breaker.retry_in())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "circuit": self.breaker.state,
+            "circuit_trips": self.breaker.trips,
+            "consecutive_failures": self.breaker.failures,
+        }
@@ -0,0 +1,327 @@
+"""
+Parse-once HTML documents for the crawler
+A ParsedDocument is built once per page and shared by title extraction,
+text extraction, markdown conversion and link extraction.
+Backends: "html.parser" (stdlib), "lxml" (via BeautifulSoup) and
+"selectolax" (Lexbor, C) - all produce equivalent output.
+"""
+import codecs
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+from frontier import canonicalize_url
+from log import get_logger
+
+log = get_logger(__name__)
+
+# "auto" picks the fastest installed backend
+HTML_PARSER = os.getenv("HTML_PARSER", "auto").lower()
+
+MARKDOWN_DROP_TAGS = ['script', 'style', 'nav', 'footer', 'header', 'aside', 'form', 'noscript', 'iframe', 'button', 'svg']
+MARKDOWN_BLOCK_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li']
+ANCHOR_TEXT_CHARS = 200  # per link target, for crawl prioritization
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_\-:.]+)""", re.IGNORECASE)
+
+
+def _installed(module: str) -> bool:
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def available_backends() -> List[str]:
+    backends = ["html.parser"]
+    if _installed("lxml"):
+        backends.append("lxml")
+    if _installed("selectolax.lexbor"):
+        backends.append("selectolax")
+    return backends
+
+
+@lru_cache(maxsize=None)
+def resolve_backend(name: Optional[str] = None) -> str:
+    """Map a configured backend name to one that is installed"""
+    name = (name or HTML_PARSER).lower()
+    installed = available_backends()
+    if name == "auto":
+        return installed[-1]
+    if name not in installed:
+        log.warning(f"⚠️ HTML parser '{name}' not available, using html.parser")
+        return "html.parser"
+    return name
+
+
+def filter_links(hrefs: List[str], base_url: str, same_domain: bool = True) -> List[str]:
+    """Resolve, filter and normalize raw hrefs into crawlable absolute URLs"""
+    return list(dict.fromkeys(url for _, url in _resolve_links(hrefs, base_url, same_domain)))
+
+
+def filter_anchors(anchors: List[Tuple[str, str]], base_url: str, same_domain: bool = True) -> Dict[str, str]:
+    """Like filter_links, keyed by URL with the anchor text of every link to it"""
+    links: Dict[str, List[str]] = {}
+    for i, url in _resolve_links([href for href, _ in anchors], base_url, same_domain):
+        texts = links.setdefault(url, [])
+        text = " ".join(anchors[i][1].split())
+        if text and text not in texts:
+            texts.append(text)
+    return {url: " | ".join(texts)[:ANCHOR_TEXT_CHARS] for url, texts in links.items()}
+
+
+def _resolve_links(hrefs: List[str], base_url: str, same_domain: bool) -> Iterator[Tuple[int, str]]:
+    """(index, normalized URL) for each crawlable href"""
+    base_domain = urlparse(canonicalize_url(base_url)).netloc
+
+    for i, href in enumerate(hrefs):
+        # Skip empty, javascript, mailto, tel links
+        if not href or href.startswith(("#", "javascript:", "mailto:", "tel:")):
+            continue
+
+        # Convert relative URLs to absolute
+        full_url = urljoin(base_url, href.strip())
+        parsed = urlparse(full_url)
+
+        # Only HTTP/HTTPS
+        if parsed.scheme.lower() not in ("http", "https"):
+            continue
+
+        # Normalize URL (case, default port, fragment, tracking params, trailing slash)
+        try:
+            normalized = canonicalize_url(full_url)
+        except ValueError:  # malformed port / IPv6 literal
+            continue
+
+        # Same domain check
+        if same_domain and urlparse(normalized).netloc != base_domain:
+            continue
+
+        yield i, normalized
+
+
+def _blocks_to_markdown(blocks, fallback_text) -> str:
+    """Shared markdown assembly over (tag_name, text) pairs in document order"""
+    lines = []
+    seen_texts = set()  # Avoid duplicates
+
+    for name, text in blocks:
+        # Skip empty, too short, or duplicate text
+        if not text or len(text) < 15 or text in seen_texts:
+            continue
+
+        seen_texts.add(text)
+
+        if name.startswith('h'):
+            level = int(name[1])
+            lines.append(f"\n{'#' * level} {text}\n")
+        elif name == 'li':
+            lines.append(f"- {text}")
+        else:  # paragraph
+            lines.append(f"\n{text}\n")
+
+    # Fallback: get plain text if nothing found
+    if not lines:
+        for line in fallback_text().split('\n'):
+            line = line.strip()
+            if line and len(line) > 20 and line not in seen_texts:
+                lines.append(line)
+                seen_texts.add(line)
+
+    return "\n".join(lines)
+
+
+def html_to_markdown(soup: BeautifulSoup) -> str:
+    """Convert HTML to readable markdown - preserves document order"""
+    # Remove unwanted elements
+    for tag in soup(MARKDOWN_DROP_TAGS):
+        tag.decompose()
+
+    # Get main content area
+    main_content = soup.find('main') or soup.find('article') or soup.find('[role="main"]') or soup.find('body') or soup
+
+    blocks = ((element.name, element.get_text(strip=True)) for element in main_content.find_all(MARKDOWN_BLOCK_TAGS))
+    return _blocks_to_markdown(blocks, lambda: main_content.get_text(separator='\n', strip=True))
+
+
+class ParsedDocument:
+    """
+    One parse of a page with cached accessors.
+    markdown() prunes the tree, so it snapshots everything else first.
+    """
+
+    backend = "html.parser"
+
+    def __init__(self):
+        self._title = self._heading = self._text = self._anchors = self._markdown = None
+
+    def title(self) -> Optional[str]:
+        """Stripped <title> text, or None"""
+        if self._title is None:
+            self._title = self._extract_title() or ""
+        return self._title or None
+
+    def heading(self) -> Optional[str]:
+        """Text of the first <h1>, or None"""
+        if self._heading is None:
+            self._heading = self._extract_heading() or ""
+        return self._heading or None
+
+    def text(self) -> str:
+        """All visible text (script/style excluded), like BeautifulSoup.get_text()"""
+        if self._text is None:
+            self._text = self._extract_text()
+        return self._text
+
+    def anchors(self) -> List[Tuple[str, str]]:
+        """(raw href, link text) of every <a href>"""
+        if self._anchors is None:
+            self._anchors = self._extract_anchors()
+        return self._anchors
+
+    def hrefs(self) -> List[str]:
+        """Raw href values of every <a href>"""
+        return [href for href, _ in self.anchors()]
+
+    def links(self, base_url: str, same_domain: bool = True) -> List[str]:
+        return filter_links(self.hrefs(), base_url, same_domain)
+
+    def anchored_links(self, base_url: str, same_domain: bool = True) -> Dict[str, str]:
+        """links(), each mapped to its anchor text"""
+        return filter_anchors(self.anchors(), base_url, same_domain)
+
+    def markdown(self) -> str:
+        if self._markdown is None:
+            self.title(), self.heading(), self.text(), self.anchors()
+            self._markdown = self._extract_markdown()
+        return self._markdown
+
+    def _extract_title(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def _extract_heading(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def _extract_text(self) -> str:
+        raise NotImplementedError
+
+    def _extract_anchors(self) -> List[Tuple[str, str]]:
+        raise NotImplementedError
+
+    def _extract_markdown(self) -> str:
+        raise NotImplementedError
+
+
+class SoupDocument(ParsedDocument):
+    """BeautifulSoup tree (html.parser or lxml builder)"""
+
+    def __init__(self, html: Union[str, bytes], parser: str = "html.parser", encoding: Optional[str] = None):
+        super().__init__()
+        self.backend = parser
+        if isinstance(html, bytes) and encoding:
+            self.soup = BeautifulSoup(html, parser, from_encoding=encoding)
+        else:
+            self.soup = BeautifulSoup(html, parser)
+
+    def _extract_title(self):
+        if self.soup.title and self.soup.title.string:
+            return self.soup.title.string.strip()
+        return None
+
+    def _extract_heading(self):
+        h1 = self.soup.find('h1')
+        return h1.get_text(strip=True) if h1 else None
+
+    def _extract_text(self):
+        return self.soup.get_text()
+
+    def _extract_anchors(self):
+        return [(a_tag["href"], a_tag.get_text(" ", strip=True)) for a_tag in self.soup.find_all("a", href=True)]
+
+    def _extract_markdown(self):
+        return html_to_markdown(self.soup)
+
+
+class LexborDocument(ParsedDocument):
+    """selectolax Lexbor tree"""
+
+    backend = "selectolax"
+
+    def __init__(self, html: Union[str, bytes], encoding: Optional[str] = None):
+        super().__init__()
+        from selectolax.lexbor import LexborHTMLParser
+        if isinstance(html, bytes):
+            # Lexbor assumes UTF-8; honor the HTTP or <meta> charset like BeautifulSoup does
+            encoding = encoding or _sniff_charset(html) or "utf-8"
+            if encoding.lower().replace("_", "-") not in ("utf-8", "utf8"):
+                html = html.decode(encoding, errors="replace")
+        self.tree = LexborHTMLParser(html)
+        # BeautifulSoup never reports script/style contents as text; match that
+        for node in self.tree.css("script, style, template"):
+            node.decompose()
+
+    def _extract_title(self):
+        node = self.tree.css_first("title")
+        title = node.text(deep=True).strip() if node else ""
+        return title or None
+
+    def _extract_heading(self):
+        node = self.tree.css_first("h1")
+        return node.text(deep=True, separator='', strip=True) if node else None
+
+    def _extract_text(self):
+        return self.tree.root.text(deep=True) if self.tree.root else ""
+
+    def _extract_anchors(self):
+        return [
+            (node.attributes.get("href") or "", node.text(deep=True, separator=" ", strip=True))
+            for node in self.tree.css("a[href]")
+        ]
+
+    def _extract_markdown(self):
+        for node in self.tree.css(", ".join(MARKDOWN_DROP_TAGS)):
+            node.decompose()
+        main_content = (
+            self.tree.css_first("main") or self.tree.css_first("article") or self.tree.body or self.tree.root
+        )
+        if main_content is None:
+            return ""
+        blocks = (
+            (node.tag, node.text(deep=True, separator='', strip=True))
+            for node in main_content.css(", ".join(MARKDOWN_BLOCK_TAGS))
+        )
+        return _blocks_to_markdown(blocks, lambda: main_content.text(deep=True, separator='\n', strip=True))
+
+
+def _sniff_charset(html: bytes) -> Optional[str]:
+    """Charset declared in a <meta> tag near the top of the document"""
+    match = _META_CHARSET.search(html[:4096])
+    if not match:
+        return None
+    charset = match.group(1).decode("ascii", errors="ignore")
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        return None
+    return charset
+
+
+def parse_html(html: Union[str, bytes], backend: Optional[str] = None, encoding: Optional[str] = None) -> ParsedDocument:
+    """
+    Parse a page once with the configured (or given) backend.
+    Raw bytes are decoded by the parser; `encoding` is the HTTP charset if known.
+    """
+    backend = resolve_backend(backend)
+    if backend == "selectolax":
+        return LexborDocument(html, encoding)
+    return SoupDocument(html, backend, encoding)
+
+
+def extract_links(html: Union[str, bytes], base_url: str, same_domain: bool = True, encoding: Optional[str] = None) -> List[str]:
+    """Extract all valid links from HTML content"""
+    return parse_html(html, encoding=encoding).links(base_url, same_domain)
@@ -0,0 +1,131 @@
+"""
+Shared HTTP client registry for the crawler
+Keeps one pooled httpx.AsyncClient per upstream (Gemini API, target sites)
+so keep-alive connections and TLS sessions are reused across requests
+"""
+import os
+import httpx
+from typing import Dict, Optional
+
+# Connection pool tuning (overridable via environment)
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+WEB_MAX_CONNECTIONS = int(os.getenv("WEB_MAX_CONNECTIONS", "100"))
+WEB_MAX_KEEPALIVE = int(os.getenv("WEB_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("KEEPALIVE_EXPIRY", "30"))
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (installed via httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ClientRegistry:
+    """App-scoped registry of pooled HTTP clients, opened and closed by the FastAPI lifespan"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._limits: Dict[str, httpx.Limits] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.http2 = HTTP2_ENABLED and http2_available()
+
+    def _build(self, name: str, limits: httpx.Limits, **kwargs) -> httpx.AsyncClient:
+        counters = self._counters.setdefault(name, {"requests": 0, "responses": 0, "errors": 0})
+
+        async def on_request(request: httpx.Request):
+            counters["requests"] += 1
+
+        async def on_response(response: httpx.Response):
+            counters["responses"] += 1
+            if response.status_code >= 400:
+                counters["errors"] += 1
+
+        self._limits[name] = limits
+        return httpx.AsyncClient(
+            limits=limits,
+            http2=self.http2,
+            event_hooks={"request": [on_request], "response": [on_response]},
+            **kwargs,
+        )
+
+    def start(self):
+        """Create the pools (idempotent)"""
+        if "llm" not in self._clients:
+            # Gemini API: a single host, so a small pool of long-lived connections
+            self._clients["llm"] = self._build(
+                "llm",
+                httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                    keepalive_expiry=max(KEEPALIVE_EXPIRY, 60.0),
+                ),
+                timeout=30.0,
+            )
+        if "web" not in self._clients:
+            # Target sites: many hosts, wider pool with shorter keep-alive
+            self._clients["web"] = self._build(
+                "web",
+                httpx.Limits(
+                    max_connections=WEB_MAX_CONNECTIONS,
+                    max_keepalive_connections=WEB_MAX_KEEPALIVE,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                timeout=30.0,
+                follow_redirects=True,
+            )
+
+    async def close(self):
+        """Close every pool and drop its connections"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    @property
+    def llm(self) -> httpx.AsyncClient:
+        """Pooled client for the Gemini API"""
+        if "llm" not in self._clients:
+            self.start()
+        return self._clients["llm"]
+
+    @property
+    def web(self) -> httpx.AsyncClient:
+        """Pooled client for page fetches"""
+        if "web" not in self._clients:
+            self.start()
+        return self._clients["web"]
+
+    def stats(self) -> Dict[str, dict]:
+        """Snapshot of pool occupancy and request counters per client"""
+        result = {}
+        for name, client in self._clients.items():
+            limits = self._limits[name]
+            result[name] = {
+                "http2": self.http2,
+                "max_connections": limits.max_connections,
+                "max_keepalive_connections": limits.max_keepalive_connections,
+                **_pool_snapshot(client),
+                **self._counters.get(name, {}),
+            }
+        return result
+
+
+def _pool_snapshot(client: httpx.AsyncClient) -> Dict[str, Optional[int]]:
+    """Read connection counts from the underlying httpcore pool"""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", None) or [])
+    snapshot = {"connections": len(connections), "idle": 0, "http2_connections": 0}
+    for connection in connections:
+        try:
+            if connection.is_idle():
+                snapshot["idle"] += 1
+            if "HTTP/2" in connection.info():
+                snapshot["http2_connections"] += 1
+        except Exception:
+            continue
+    return snapshot
@@ -0,0 +1,68 @@
+"""
+Live crawl job events
+In-process pub/sub behind the job event stream: per-page results, counter
+deltas and status changes. Each subscriber gets a bounded queue; one that
+falls behind is cut off with a "lagged" event and reconnects with ?after=.
+"""
+import asyncio
+from typing import Any, Dict, List
+
+JOB_COUNTERS = ("urls_found", "urls_scraped", "urls_failed", "urls_duplicate", "urls_pending")
+TERMINAL_STATUSES = ("completed", "paused", "failed")
+
+
+def job_summary(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job without its result list (cheap to serialize and poll)"""
+    summary = {k: v for k, v in job.items() if k != "scraped_urls"}
+    summary["result_count"] = len(job["scraped_urls"])
+    return summary
+
+
+class JobEventBroker:
+    """Fan-out of job events to stream subscribers"""
+
+    def __init__(self, queue_size: int = 1000):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._last_counters: Dict[str, Dict[str, int]] = {}
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(job_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(job_id, [])
+        if queue in queues:
+            queues.remove(queue)
+        if not queues:
+            self._subscribers.pop(job_id, None)
+
+    def publish(self, job_id: str, event: Dict[str, Any]):
+        for queue in list(self._subscribers.get(job_id, [])):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Make room for the lag marker and stop feeding this subscriber
+                queue.get_nowait()
+                queue.put_nowait({"type": "lagged"})
+                self.unsubscribe(job_id, queue)
+
+    def result(self, job: Dict[str, Any], seq: int, entry: Dict[str, Any]):
+        self.publish(job["id"], {"type": "result", "seq": seq, "result": entry})
+
+    def progress(self, job: Dict[str, Any]):
+        """Publish counter changes since the last progress event"""
+        counters = {name: job[name] for name in JOB_COUNTERS}
+        last = self._last_counters.get(job["id"], {})
+        delta = {name: value - last.get(name, 0) for name, value in counters.items() if value != last.get(name, 0)}
+        self._last_counters[job["id"]] = counters
+        if delta:
+            self.publish(job["id"], {"type": "progress", "delta": delta, "counters": counters, "current_url": job["current_url"]})
+
+    def status(self, job: Dict[str, Any]):
+        self.progress(job)
+        self.publish(job["id"], {"type": "status", "status": job["status"]})
+
+    def forget(self, job_id: str):
+        self._last_counters.pop(job_id, None)
@@ -0,0 +1,194 @@
+"""
+Durable crawl job store
+Persists job state, per-page results and frontier checkpoints in SQLite so
+jobs survive restarts and paused crawls can resume where they stopped.
+Results are append-only rows; the frontier is replaced at each checkpoint.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "cache/crawl_jobs.sqlite3")  # "" keeps jobs in memory only
+CHECKPOINT_PAGES = int(os.getenv("CHECKPOINT_PAGES", "25"))
+CHECKPOINT_SECONDS = float(os.getenv("CHECKPOINT_SECONDS", "10"))
+
+# Kept in their own table rather than in the job row
+RESULT_KEY = "scraped_urls"
+
+
+class JobStore:
+    """SQLite-backed crawl jobs: state row, result rows and one frontier checkpoint per job"""
+
+    def __init__(self, path: str = JOB_STORE_PATH):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._saved_results: Dict[str, int] = {}
+        self._last_checkpoint: Dict[str, tuple] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.counters = {"checkpoints": 0, "results_written": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "job_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (job_id, seq))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS frontiers ("
+                "job_id TEXT PRIMARY KEY, state TEXT NOT NULL, seen BLOB NOT NULL, pages_done INTEGER NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    # ---- sync (run via asyncio.to_thread) ----
+
+    def _write(
+        self,
+        job_id: str,
+        state: Dict[str, Any],
+        results: List[tuple],
+        frontier: Optional[Dict[str, Any]],
+        pages_done: int,
+        completed: bool,
+    ):
+        with self._db_lock:
+            db = self._connect()
+            with db:  # one transaction: state, results and frontier always agree
+                db.execute(
+                    "INSERT OR REPLACE INTO jobs (id, state, updated_at) VALUES (?, ?, ?)",
+                    (job_id, json.dumps(state), time.time()),
+                )
+                db.executemany(
+                    "INSERT OR REPLACE INTO results (job_id, seq, data) VALUES (?, ?, ?)",
+                    [(job_id, seq, json.dumps(data)) for seq, data in results],
+                )
+                if frontier is not None:
+                    frontier = dict(frontier)
+                    seen = zlib.compress(frontier.pop("seen"))
+                    db.execute(
+                        "INSERT OR REPLACE INTO frontiers (job_id, state, seen, pages_done) VALUES (?, ?, ?, ?)",
+                        (job_id, json.dumps(frontier), seen, pages_done),
+                    )
+                elif completed:
+                    db.execute("DELETE FROM frontiers WHERE job_id = ?", (job_id,))
+
+    def _load_jobs(self) -> List[Dict[str, Any]]:
+        with self._db_lock:
+            db = self._connect()
+            rows = db.execute("SELECT id, state FROM jobs ORDER BY updated_at").fetchall()
+            jobs = []
+            for job_id, state in rows:
+                job = json.loads(state)
+                job[RESULT_KEY] = [
+                    json.loads(data) for (data,) in db.execute(
+                        "SELECT data FROM results WHERE job_id = ? ORDER BY seq", (job_id,)
+                    )
+                ]
+                self._saved_results[job_id] = len(job[RESULT_KEY])
+                jobs.append(job)
+        return jobs
+
+    def _load_frontier(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT state, seen, pages_done FROM frontiers WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        state = json.loads(row[0])
+        state["seen"] = zlib.decompress(row[1])
+        state["pages_done"] = row[2]
+        return state
+
+    def _delete(self, job_id: str):
+        with self._db_lock:
+            db = self._connect()
+            with db:
+                for table, column in (("jobs", "id"), ("results", "job_id"), ("frontiers", "job_id")):
+                    db.execute(f"DELETE FROM {table} WHERE {column} = ?", (job_id,))
+
+    # ---- async API ----
+
+    def _pending_results(self, job: Dict[str, Any]) -> List[tuple]:
+        results = job[RESULT_KEY]
+        return [(seq, results[seq]) for seq in range(self._saved_results.get(job["id"], 0), len(results))]
+
+    def due(self, job_id: str, pages_done: int) -> bool:
+        """True once CHECKPOINT_PAGES pages or CHECKPOINT_SECONDS have passed since the last checkpoint"""
+        if not self.enabled or self._lock(job_id).locked():
+            return False
+        last_pages, last_time = self._last_checkpoint.get(job_id, (0, 0.0))
+        return pages_done - last_pages >= CHECKPOINT_PAGES or time.monotonic() - last_time >= CHECKPOINT_SECONDS
+
+    def _lock(self, job_id: str) -> asyncio.Lock:
+        lock = self._locks.get(job_id)
+        if lock is None:
+            lock = self._locks[job_id] = asyncio.Lock()
+        return lock
+
+    async def checkpoint(self, job: Dict[str, Any], engine=None, completed: bool = False):
+        """
+        Persist job state, any new results and (if `engine` is given) its frontier.
+        A completed job's frontier checkpoint is dropped.
+        Checkpoints of one job are serialized and each is captured in full before
+        its write starts, so state, results and frontier always agree.
+        """
+        if not self.enabled:
+            return
+        job_id = job["id"]
+        async with self._lock(job_id):
+            state = {k: v for k, v in job.items() if k != RESULT_KEY}
+            results = self._pending_results(job)
+            frontier = engine.snapshot() if engine is not None else None
+            pages_done = engine.pages_done if engine is not None else 0
+            await asyncio.to_thread(self._write, job_id, state, results, frontier, pages_done, completed)
+            self._saved_results[job_id] = self._saved_results.get(job_id, 0) + len(results)
+            self._last_checkpoint[job_id] = (pages_done, time.monotonic())
+        self.counters["checkpoints"] += 1
+        self.counters["results_written"] += len(results)
+
+    async def load_jobs(self) -> List[Dict[str, Any]]:
+        if not self.enabled:
+            return []
+        return await asyncio.to_thread(self._load_jobs)
+
+    async def load_frontier(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Last frontier checkpoint (with "pages_done"), or None"""
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self._load_frontier, job_id)
+
+    async def delete(self, job_id: str):
+        self._saved_results.pop(job_id, None)
+        self._last_checkpoint.pop(job_id, None)
+        self._locks.pop(job_id, None)
+        if self.enabled:
+            await asyncio.to_thread(self._delete, job_id)
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "enabled": self.enabled}
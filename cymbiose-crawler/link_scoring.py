@@ -0,0 +1,119 @@
+"""
+Link scoring for best-first crawling
+Predicts how likely a discovered link leads to clinical content before
+it is fetched, from its anchor text, URL path tokens, the screening score
+of the page that linked to it and its depth. Scorers are pluggable: any
+object with a `score(url, depth, anchor, parent_quality)` method works.
+"""
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from log import get_logger
+
+log = get_logger(__name__)
+
+LINK_SCORER = os.getenv("LINK_SCORER", "clinical")
+
+# Word-prefix stems, so "therapist", "therapies" and "counselling" all match
+CLINICAL_TERMS = (
+    "therap", "counsel", "psych", "mental", "clinic", "treat", "interven", "guideline", "disorder",
+    "diagnos", "symptom", "depress", "anxi", "trauma", "ptsd", "suicid", "self-harm", "addict",
+    "substance", "alcohol", "bipolar", "schizo", "psychos", "eating", "adhd", "autis", "ocd",
+    "grief", "stress", "mindful", "cbt", "dbt", "emdr", "wellbeing", "well-being", "resilien",
+    "cultur", "divers", "lgbt", "refugee", "immigra", "minorit", "indigenous", "equity",
+    "evidence", "research", "toolkit", "factsheet", "fact-sheet", "condition", "patient",
+)
+OFF_TOPIC_TERMS = (
+    "about", "career", "job", "vacanc", "press", "news", "media", "contact", "donat", "fundrais",
+    "privacy", "terms", "cookie", "login", "signin", "sign-in", "signup", "register", "account",
+    "cart", "shop", "store", "event", "board", "staff", "team", "leadership", "governance",
+    "sponsor", "partner", "advertis", "volunteer", "accessibility", "legal", "sitemap", "tag",
+    "author", "feed", "rss", "search", "calendar", "webinar", "member",
+)
+
+
+def _stem_pattern(stems) -> re.Pattern:
+    return re.compile(r"(?<![a-z0-9])(?:" + "|".join(re.escape(stem) for stem in stems) + ")")
+
+
+class LinkScorer:
+    """Scorer interface: higher scores are crawled first. Called for every discovered link, so keep it cheap."""
+
+    name = "base"
+
+    def score(self, url: str, depth: int, anchor: str = "", parent_quality: Optional[int] = None) -> float:
+        raise NotImplementedError
+
+
+class BreadthFirstScorer(LinkScorer):
+    """Shallowest first; with the frontier's FIFO tie-break this is plain BFS"""
+
+    name = "bfs"
+
+    def score(self, url: str, depth: int, anchor: str = "", parent_quality: Optional[int] = None) -> float:
+        return -float(depth)
+
+
+class ClinicalLinkScorer(LinkScorer):
+    """
+    Keyword scorer. Each distinct clinical stem in the anchor text or URL
+    path adds to the score and each off-topic stem subtracts (capped at
+    three of each); the parent page's quality_score (1-5, 3 neutral) and
+    depth shift the result.
+    """
+
+    name = "clinical"
+
+    def __init__(
+        self,
+        anchor_weight: float = 1.0,
+        path_weight: float = 0.6,
+        quality_weight: float = 0.5,
+        depth_weight: float = 0.25,
+    ):
+        self.anchor_weight = anchor_weight
+        self.path_weight = path_weight
+        self.quality_weight = quality_weight
+        self.depth_weight = depth_weight
+        self._clinical = _stem_pattern(CLINICAL_TERMS)
+        self._off_topic = _stem_pattern(OFF_TOPIC_TERMS)
+
+    def _terms(self, text: str) -> float:
+        if not text:
+            return 0.0
+        text = text.lower().replace("_", " ")
+        hits = len(set(self._clinical.findall(text)))
+        misses = len(set(self._off_topic.findall(text)))
+        return min(hits, 3) - min(misses, 3)
+
+    def score(self, url: str, depth: int, anchor: str = "", parent_quality: Optional[int] = None) -> float:
+        score = self.anchor_weight * self._terms(anchor) + self.path_weight * self._terms(urlsplit(url).path)
+        if parent_quality:
+            score += self.quality_weight * (parent_quality - 3)
+        return score - self.depth_weight * depth
+
+
+LINK_SCORERS: Dict[str, type] = {
+    ClinicalLinkScorer.name: ClinicalLinkScorer,
+    BreadthFirstScorer.name: BreadthFirstScorer,
+}
+
+
+def register_link_scorer(name: str, scorer_cls: type):
+    """Make a LinkScorer subclass selectable through LINK_SCORER"""
+    LINK_SCORERS[name] = scorer_cls
+    get_link_scorer.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def get_link_scorer(name: Optional[str] = None) -> LinkScorer:
+    """Link scorer by name; unknown names fall back to "clinical" """
+    name = (name or LINK_SCORER).lower()
+    scorer_cls = LINK_SCORERS.get(name)
+    if scorer_cls is None:
+        log.warning(f"⚠️ Unknown link scorer '{name}', using clinical")
+        scorer_cls = ClinicalLinkScorer
+    return scorer_cls()
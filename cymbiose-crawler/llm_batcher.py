@@ -0,0 +1,155 @@
+"""
+Adaptive micro-batching for LLM calls
+Collects concurrent requests (from any number of crawl jobs) into one
+multi-document call, flushing when the batch is full or the oldest item
+has waited max_wait seconds. Items the batch call fails to answer fall
+back to single calls. Batch size grows while batches are fast and clean
+and shrinks on errors or slow responses (AIMD); after errors it holds
+until the recent error rate has decayed.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from log import get_logger
+from tracing import span
+
+log = get_logger(__name__)
+
+GEMINI_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", "8"))  # 1 disables batching
+GEMINI_BATCH_WAIT = float(os.getenv("GEMINI_BATCH_WAIT", "0.5"))
+GEMINI_BATCH_TARGET_LATENCY = float(os.getenv("GEMINI_BATCH_TARGET_LATENCY", "20"))
+GEMINI_BATCH_MAX_ERROR_RATE = float(os.getenv("GEMINI_BATCH_MAX_ERROR_RATE", "0.1"))
+
+
+class AdaptiveBatcher:
+    """
+    `run_batch(items)` returns one result per item (None where the response
+    had no usable answer); `run_single(item)` handles one item on its own.
+    Exceptions in `passthrough` are delivered to every caller without fallback.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], Awaitable[List[Optional[Any]]]],
+        run_single: Callable[[Any], Awaitable[Any]],
+        max_size: int = GEMINI_BATCH_SIZE,
+        max_wait: float = GEMINI_BATCH_WAIT,
+        target_latency: float = GEMINI_BATCH_TARGET_LATENCY,
+        max_error_rate: float = GEMINI_BATCH_MAX_ERROR_RATE,
+        passthrough: Tuple[type, ...] = (),
+    ):
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate  # no growth above this recent error rate
+        self.passthrough = passthrough  # errors that fail the whole batch instead of falling back
+        self.size = min(self.max_size, 4)  # start modest, grow on success
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.latency_ewma = 0.0
+        self.error_rate = 0.0
+        self.counters = {"batches": 0, "batched_items": 0, "single_calls": 0, "fallbacks": 0, "batch_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 1
+
+    async def submit(self, item: Any) -> Any:
+        """Queue `item` for the next batch and wait for its result"""
+        if not self.enabled:
+            self.counters["single_calls"] += 1
+            return await self.run_single(item)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = contextvars.Context().run(loop.call_later, self.max_wait, self._flush)
+        with span("llm_batch"):
+            return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.size], self._pending[self.size:]
+            # A batch serves many callers, so it runs outside any one caller's trace
+            contextvars.Context().run(asyncio.ensure_future, self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        results: List[Optional[Any]] = [None] * len(items)
+        started = time.monotonic()
+        failed = False
+
+        if len(items) == 1:
+            single = True
+        else:
+            single = False
+            try:
+                answered = await self.run_batch(items)
+                if len(answered) == len(items):
+                    results = list(answered)
+                else:
+                    failed = True
+            except self.passthrough as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            except Exception as e:
+                log.warning(f"⚠️ Batch of {len(items)} failed ({e}), falling back to single requests")
+                failed = True
+            self.counters["batches"] += 1
+            self.counters["batched_items"] += len(items)
+            self._adapt(len(items), time.monotonic() - started, failed or any(r is None for r in results))
+
+        missing = [index for index, result in enumerate(results) if result is None]
+        self.counters["single_calls" if single else "fallbacks"] += len(missing)
+        retried = await asyncio.gather(*(self.run_single(items[index]) for index in missing), return_exceptions=True)
+        for index, result in zip(missing, retried):
+            results[index] = result
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # caller went away (e.g. crawl stopped)
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        if single:
+            # Probe upwards again once singles are quick
+            self._adapt(1, time.monotonic() - started, False)
+
+    def _adapt(self, batch_size: int, latency: float, error: bool):
+        self.latency_ewma = latency if not self.latency_ewma else 0.8 * self.latency_ewma + 0.2 * latency
+        self.error_rate = 0.8 * self.error_rate + 0.2 * (1.0 if error else 0.0)
+        if error:
+            self.counters["batch_errors"] += 1
+            self.size = max(1, self.size // 2)
+        elif latency > self.target_latency:
+            self.size = max(1, int(self.size * 0.75))
+        elif batch_size >= self.size and self.error_rate <= self.max_error_rate:
+            # Only full batches say anything about whether a bigger one would fit,
+            # and only once the last failures are a few clean batches behind us
+            self.size = min(self.max_size, self.size + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "batch_size": self.size,
+            "max_batch_size": self.max_size,
+            "pending": len(self._pending),
+            "latency_ewma": round(self.latency_ewma, 3),
+            "error_rate": round(self.error_rate, 3),
+        }
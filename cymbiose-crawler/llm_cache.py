@@ -0,0 +1,168 @@
+"""
+Content-addressed cache for Gemini analysis results
+Keyed by a hash of the normalized input text, prompt version and model so
+re-scrapes and the same article at a different URL skip the API call.
+Two tiers: an in-memory LRU and an on-disk SQLite table, both with TTL.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite3")  # "" disables the disk tier
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "2048"))
+LLM_CACHE_DISK_ITEMS = int(os.getenv("LLM_CACHE_DISK_ITEMS", "200000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+
+
+def prompt_version(prompt: str) -> str:
+    """Short fingerprint of a prompt template; editing the prompt invalidates its entries"""
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def normalize_text(text: str) -> str:
+    """Unicode- and whitespace-normalize text so trivial formatting differences share a key"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(kind: str, text: str, version: str, model: str) -> str:
+    digest = hashlib.sha256()
+    for part in (kind, version, model, normalize_text(text)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """Two-tier (memory LRU + SQLite) cache of JSON-serializable LLM results"""
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        memory_items: int = LLM_CACHE_MEMORY_ITEMS,
+        disk_items: int = LLM_CACHE_DISK_ITEMS,
+        ttl: float = LLM_CACHE_TTL,
+    ):
+        self.path = path
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache(created_at)")
+            self._db.commit()
+        return self._db
+
+    # ---- memory tier ----
+
+    def _memory_get(self, key: str) -> Optional[Any]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        created_at, value = entry
+        if time.time() - created_at > self.ttl:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: Any, created_at: float):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    # ---- disk tier (runs in a worker thread) ----
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._db_lock:
+            db = self._connect()
+            if db is None:
+                return None
+            row = db.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return row[1], json.loads(row[0])
+
+    def _disk_put(self, key: str, value: Any, created_at: float):
+        with self._db_lock:
+            db = self._connect()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), created_at),
+            )
+            self._writes += 1
+            # Periodic TTL + size eviction
+            if self._writes % 500 == 1:
+                db.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+                db.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_items,),
+                )
+            db.commit()
+
+    # ---- public API ----
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self._memory_get(key)
+        if value is not None:
+            self.counters["memory_hits"] += 1
+            return value
+        entry = await asyncio.to_thread(self._disk_get, key) if self.path else None
+        if entry is not None:
+            self.counters["disk_hits"] += 1
+            self._memory_put(key, entry[1], entry[0])
+            return entry[1]
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Any):
+        created_at = time.time()
+        self._memory_put(key, value, created_at)
+        self.counters["stores"] += 1
+        if self.path:
+            await asyncio.to_thread(self._disk_put, key, value, created_at)
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_enabled": bool(self.path),
+        }
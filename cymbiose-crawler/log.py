@@ -0,0 +1,50 @@
+"""
+Structured logging
+Every module logs through get_logger() instead of print(). LOG_FORMAT=text
+writes the message alone (the familiar emoji lines); LOG_FORMAT=json
+writes one JSON object per line with the time, level, logger, message and
+any `extra` fields (job, url, host, ...) for a log pipeline to index.
+"""
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # "text" or "json"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+ROOT_LOGGER = "crawler"
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_FIELDS)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def _configure() -> logging.Logger:
+    root = logging.getLogger(ROOT_LOGGER)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter("%(message)s"))
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False  # uvicorn's root handlers would print everything twice
+    return root
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a module, e.g. get_logger(__name__)"""
+    _configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
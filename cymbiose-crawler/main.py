@@ -1,25 +1,98 @@
 """
 Cymbiose KB Crawler - Windows Compatible Version
-Uses httpx + BeautifulSoup for web scraping
+Uses httpx + a pluggable HTML parser (BeautifulSoup / selectolax) for web scraping
 Gemini API for AI-powered clinical tag extraction
 """
 import os
 import json
+import asyncio
 import httpx
-from bs4 import BeautifulSoup
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator, model_validator
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from http_pool import ClientRegistry
+from llm_cache import LLMCache, cache_key, prompt_version
+from page_cache import PageCache
+from fetcher import TEXT_CONTENT_TYPES, stream_fetch
+from html_document import resolve_backend
+from chunking import iter_chunks
+from executor import ParseExecutor, parse_crawl_links, parse_for_crawl, parse_for_scrape, parse_for_scrape_stream, parse_links
+from job_store import JobStore
+from llm_batcher import AdaptiveBatcher
+from gemini_client import GeminiClient, GeminiResponseError, GeminiUnavailable
+from embeddings import EmbeddingService, create_embedder
+from vector_index import FILTER_VALUE_TYPES, VECTOR_INDEX_DIR, VectorIndex
+from log import get_logger
+from metrics import ERRORS, PAGES, REGISTRY, counters_family, observe_stage
+from tracing import TRACES, annotate_trace
+
+log = get_logger(__name__)
+
 # Gemini API Configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
+
+# Shared connection pools for Gemini calls and page fetches
+http_clients = ClientRegistry()
+
+# Every Gemini call: concurrency cap, RPM/token budget, retries, circuit breaker
+gemini = GeminiClient(http_clients)
+
+# Gemini results keyed by content hash + prompt version + model
+llm_cache = LLMCache()
+
+# Stored pages + validators for conditional refetches
+page_cache = PageCache()
+
+# Parsing and chunking run here instead of on the event loop
+parse_executor = ParseExecutor()
+
+# Crawl jobs, results and frontier checkpoints (survive restarts)
+job_store = JobStore()
+
+# Batched chunk embeddings, cached by content hash
+embeddings = EmbeddingService(create_embedder(gemini, GEMINI_API_KEY))
+
+# Embedded chunks for /search (one index per embedding model)
+vector_index = VectorIndex(os.path.join(VECTOR_INDEX_DIR, embeddings.model.replace("/", "_")))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    http_clients.start()
+    parse_executor.start()
+    log.info(f"🔌 HTTP pools ready (HTTP/2: {'on' if http_clients.http2 else 'off'})")
+    await restore_crawl_jobs()
+    coordination = asyncio.create_task(coordination_loop()) if crawl_coordinator is not None else None
+    yield
+    if coordination is not None:
+        coordination.cancel()
+    await checkpoint_running_jobs()
+    await http_clients.close()
+    llm_cache.close()
+    page_cache.close()
+    job_store.close()
+    embeddings.close()
+    if crawl_coordinator is not None:
+        crawl_coordinator.close()
+    parse_executor.shutdown()
 
-app = FastAPI(title="Cymbiose KB Crawler")
+app = FastAPI(title="Cymbiose KB Crawler", lifespan=lifespan)
+
+# Per-document failures (malformed JSON, blocked or empty answers) fall back to defaults;
+# anything else (API unavailable, bad key, bad request) propagates so pages aren't admitted unscreened
+UNUSABLE_RESPONSE_ERRORS = (GeminiResponseError, ValueError, KeyError, TypeError)
+
+async def gemini_generate(prompt: str, generation_config: Dict) -> str:
+    """Text of the first candidate for `prompt` (raises GeminiUnavailable when the API is unhealthy)"""
+    return await gemini.generate(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", prompt, generation_config)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,12 +105,15 @@ app.add_middleware(
 class ScrapeRequest(BaseModel):
     url: str
     tags: List[str] = []
+    bypass_cache: bool = False  # force fresh Gemini calls
+    embed: bool = False  # attach an embedding vector to each chunk
 
 class ContentChunk(BaseModel):
     index: int
     content: str
     token_estimate: int
     heading: Optional[str] = None
+    embedding: Optional[List[float]] = None
 
 class ScrapeResponse(BaseModel):
     url: str
@@ -69,11 +145,11 @@ Content to analyze:
 
 JSON Response:"""
 
-async def extract_tags_with_gemini(content: str) -> Dict[str, List[str]]:
+async def extract_tags_with_gemini(content: str, use_cache: bool = True) -> Dict[str, List[str]]:
     """Use Gemini API to extract clinical tags from content"""
     
     if not GEMINI_API_KEY:
-        print("⚠️ No Gemini API key configured")
+        log.warning("⚠️ No Gemini API key configured")
         return {
             "modality": [],
             "population": [],
@@ -86,63 +162,52 @@ async def extract_tags_with_gemini(content: str) -> Dict[str, List[str]]:
         # Truncate content to fit in context window
         truncated_content = content[:8000]
         
+        key = cache_key("tags", truncated_content, prompt_version(CLINICAL_TAG_PROMPT), GEMINI_MODEL)
+        cached = await llm_cache.get(key) if use_cache else None
+        if cached is not None:
+            log.info("💾 Cached clinical tags")
+            return cached
+        
         prompt = CLINICAL_TAG_PROMPT.format(content=truncated_content)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
-                json={
-                    "contents": [{
-                        "parts": [{"text": prompt}]
-                    }],
-                    "generationConfig": {
-                        "temperature": 0.3,
-                        "maxOutputTokens": 1024
-                    }
-                },
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code != 200:
-                print(f"❌ Gemini API error: {response.status_code} - {response.text}")
-                return {"modality": [], "population": [], "risk_factors": []}
-            
-            data = response.json()
-            
-            # Extract text from Gemini response
-            text = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-            
-            # Clean up response - remove markdown code blocks if present
-            text = text.strip()
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            text = text.strip()
-            
-            # Parse JSON
-            tags = json.loads(text)
-            
-            print(f"🏷️ Gemini extracted tags: {tags}")
-            
-            # Ensure all expected keys exist
-            return {
-                "modality": tags.get("modality", [])[:5],
-                "population": tags.get("population", [])[:5],
-                "risk_factors": tags.get("risk_factors", [])[:5],
-                "cultural_context": tags.get("cultural_context", [])[:5],
-                "intervention_type": tags.get("intervention_type", [])[:5]
-            }
-            
+        text = await gemini_generate(prompt, {
+            "temperature": 0.3,
+            "maxOutputTokens": 1024
+        })
+        
+        # Clean up response - remove markdown code blocks if present
+        text = text.strip()
+        if text.startswith("```json"):
+            text = text[7:]
+        if text.startswith("```"):
+            text = text[3:]
+        if text.endswith("```"):
+            text = text[:-3]
+        text = text.strip()
+        
+        # Parse JSON
+        tags = json.loads(text)
+        
+        log.info(f"🏷️ Gemini extracted tags: {tags}")
+        
+        # Ensure all expected keys exist
+        result = {
+            "modality": tags.get("modality", [])[:5],
+            "population": tags.get("population", [])[:5],
+            "risk_factors": tags.get("risk_factors", [])[:5],
+            "cultural_context": tags.get("cultural_context", [])[:5],
+            "intervention_type": tags.get("intervention_type", [])[:5]
+        }
+        await llm_cache.set(key, result)
+        return result
+        
+    except GeminiUnavailable:
+        raise
     except json.JSONDecodeError as e:
-        print(f"❌ Failed to parse Gemini response as JSON: {e}")
+        log.error(f"❌ Failed to parse Gemini response as JSON: {e}")
         return {"modality": [], "population": [], "risk_factors": [], "cultural_context": [], "intervention_type": []}
-    except Exception as e:
-        print(f"❌ Gemini extraction error: {e}")
-        import traceback
-        traceback.print_exc()
+    except UNUSABLE_RESPONSE_ERRORS as e:
+        log.exception(f"❌ Gemini extraction error: {e}")
         return {"modality": [], "population": [], "risk_factors": [], "cultural_context": [], "intervention_type": []}
 
 
@@ -171,7 +236,7 @@ Content to screen:
 
 JSON Response:"""
 
-async def screen_content_with_gemini(title: str, content: str, url: str) -> Dict:
+async def screen_content_with_gemini(title: str, content: str, url: str, use_cache: bool = True) -> Dict:
     """Use Gemini to screen content for clinical appropriateness and quality"""
     
     if not GEMINI_API_KEY:
@@ -186,133 +251,56 @@ async def screen_content_with_gemini(title: str, content: str, url: str) -> Dict
         }
     
     try:
+        key = cache_key("screening", content[:6000], prompt_version(CONTENT_SCREENING_PROMPT), GEMINI_MODEL)
+        cached = await llm_cache.get(key) if use_cache else None
+        if cached is not None:
+            log.info(f"💾 Cached screening for {url}")
+            return cached
+        
         # Prepare content for screening
         content_sample = f"Title: {title}\nURL: {url}\n\nContent:\n{content[:6000]}"
         
         prompt = CONTENT_SCREENING_PROMPT.format(content=content_sample)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
-                json={
-                    "contents": [{"parts": [{"text": prompt}]}],
-                    "generationConfig": {
-                        "temperature": 0.2,
-                        "maxOutputTokens": 512
-                    }
-                },
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code != 200:
-                print(f"❌ Gemini screening error: {response.status_code}")
-                return {"approved": True, "quality_score": 3, "reason": "Screening failed", "flags": []}
-            
-            data = response.json()
-            text = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-            
-            # Clean up response
-            text = text.strip()
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            text = text.strip()
-            
-            result = json.loads(text)
-            
-            print(f"🔍 AI Screening: {'✅ Approved' if result.get('approved') else '❌ Rejected'} | Score: {result.get('quality_score')}/5 | {result.get('reason', '')}")
-            
-            return {
-                "approved": result.get("approved", True),
-                "quality_score": result.get("quality_score", 3),
-                "reason": result.get("reason", "")[:200],
-                "flags": result.get("flags", []),
-                "cultural_diversity_score": result.get("cultural_diversity_score", 3),
-                "demographics_covered": result.get("demographics_covered", [])
-            }
-            
-    except Exception as e:
-        print(f"❌ Content screening error: {e}")
+        text = await gemini_generate(prompt, {
+            "temperature": 0.2,
+            "maxOutputTokens": 512
+        })
+        
+        # Clean up response
+        text = text.strip()
+        if text.startswith("```json"):
+            text = text[7:]
+        if text.startswith("```"):
+            text = text[3:]
+        if text.endswith("```"):
+            text = text[:-3]
+        text = text.strip()
+        
+        result = json.loads(text)
+        
+        log.info(f"🔍 AI Screening: {'✅ Approved' if result.get('approved') else '❌ Rejected'} | Score: {result.get('quality_score')}/5 | {result.get('reason', '')}")
+        
+        screening = {
+            "approved": result.get("approved", True),
+            "quality_score": result.get("quality_score", 3),
+            "reason": result.get("reason", "")[:200],
+            "flags": result.get("flags", []),
+            "cultural_diversity_score": result.get("cultural_diversity_score", 3),
+            "demographics_covered": result.get("demographics_covered", [])
+        }
+        await llm_cache.set(key, screening)
+        return screening
+        
+    except GeminiUnavailable:
+        raise
+    except UNUSABLE_RESPONSE_ERRORS as e:
+        log.error(f"❌ Content screening error: {e}")
         # On error, approve with caution score
         return {"approved": True, "quality_score": 2, "reason": f"Screening error: {str(e)[:50]}", "flags": ["screening_failed"]}
 
 
-def chunk_content(markdown: str, max_tokens: int = 500) -> List[Dict]:
-    """Split content into chunks optimized for RAG (targeting ~500 tokens per chunk)"""
-    chunks = []
-    current_chunk = []
-    current_tokens = 0
-    current_heading = None
-    
-    # Rough token estimate: ~4 chars per token
-    def estimate_tokens(text: str) -> int:
-        return len(text) // 4
-    
-    lines = markdown.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Check if this is a heading
-        if line.startswith('#'):
-            # If we have content, save the current chunk
-            if current_chunk and current_tokens > 100:
-                chunks.append({
-                    "index": len(chunks),
-                    "content": '\n'.join(current_chunk),
-                    "token_estimate": current_tokens,
-                    "heading": current_heading
-                })
-                current_chunk = []
-                current_tokens = 0
-            
-            # Extract heading text
-            current_heading = line.lstrip('#').strip()
-            current_chunk.append(line)
-            current_tokens += estimate_tokens(line)
-        else:
-            line_tokens = estimate_tokens(line)
-            
-            # If adding this line exceeds max, save current chunk
-            if current_tokens + line_tokens > max_tokens and current_chunk:
-                chunks.append({
-                    "index": len(chunks),
-                    "content": '\n'.join(current_chunk),
-                    "token_estimate": current_tokens,
-                    "heading": current_heading
-                })
-                current_chunk = []
-                current_tokens = 0
-            
-            current_chunk.append(line)
-            current_tokens += line_tokens
-    
-    # Don't forget the last chunk
-    if current_chunk:
-        chunks.append({
-            "index": len(chunks),
-            "content": '\n'.join(current_chunk),
-            "token_estimate": current_tokens,
-            "heading": current_heading
-        })
-    
-    print(f"📦 Created {len(chunks)} chunks from content")
-    return chunks
-
-
-async def score_content_quality(content: str, url: str) -> tuple:
-    """Use Gemini to score content quality 1-5"""
-    
-    if not GEMINI_API_KEY:
-        return 3, "No AI scoring available"
-    
-    try:
-        prompt = f"""Rate the quality of this clinical/mental health content on a scale of 1-5:
+QUALITY_SCORE_PROMPT = """Rate the quality of this clinical/mental health content on a scale of 1-5:
 
 5 = Peer-reviewed, clinical guidelines, authoritative medical source
 4 = Professional medical content from reputable organization
@@ -321,184 +309,727 @@ async def score_content_quality(content: str, url: str) -> tuple:
 1 = Low quality, unverified, or off-topic content
 
 URL: {url}
-Content preview: {content[:2000]}
+Content preview: {content}
 
 Respond with JSON only: {{"score": <1-5>, "reason": "<brief explanation>"}}"""
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
-                json={
-                    "contents": [{"parts": [{"text": prompt}]}],
-                    "generationConfig": {"temperature": 0.2, "maxOutputTokens": 256}
-                },
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code != 200:
-                return 3, "Scoring unavailable"
-            
-            data = response.json()
-            text = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-            
-            # Clean and parse
-            text = text.strip()
-            if text.startswith("```"):
-                text = text.split("```")[1]
-                if text.startswith("json"):
-                    text = text[4:]
-            text = text.strip()
-            
-            result = json.loads(text)
-            score = max(1, min(5, int(result.get("score", 3))))
-            reason = result.get("reason", "Quality assessed")[:200]
-            
-            print(f"⭐ Quality score: {score}/5 - {reason}")
-            return score, reason
-            
-    except Exception as e:
-        print(f"❌ Quality scoring error: {e}")
+async def score_content_quality(content: str, url: str, use_cache: bool = True) -> tuple:
+    """Use Gemini to score content quality 1-5"""
+    
+    if not GEMINI_API_KEY:
+        return 3, "No AI scoring available"
+    
+    try:
+        key = cache_key("quality", content[:2000], prompt_version(QUALITY_SCORE_PROMPT), GEMINI_MODEL)
+        cached = await llm_cache.get(key) if use_cache else None
+        if cached is not None:
+            log.info("💾 Cached quality score")
+            return tuple(cached)
+        
+        prompt = QUALITY_SCORE_PROMPT.format(url=url, content=content[:2000])
+
+        text = await gemini_generate(prompt, {"temperature": 0.2, "maxOutputTokens": 256})
+        
+        # Clean and parse
+        text = text.strip()
+        if text.startswith("```"):
+            text = text.split("```")[1]
+            if text.startswith("json"):
+                text = text[4:]
+        text = text.strip()
+        
+        result = json.loads(text)
+        score = max(1, min(5, int(result.get("score", 3))))
+        reason = result.get("reason", "Quality assessed")[:200]
+        
+        log.info(f"⭐ Quality score: {score}/5 - {reason}")
+        await llm_cache.set(key, [score, reason])
+        return score, reason
+        
+    except GeminiUnavailable:
+        raise
+    except UNUSABLE_RESPONSE_ERRORS as e:
+        log.error(f"❌ Quality scoring error: {e}")
         return 3, "Scoring error"
 
 
-def html_to_markdown(soup: BeautifulSoup) -> str:
-    """Convert HTML to readable markdown - preserves document order"""
-    # Remove unwanted elements
-    for tag in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'form', 'noscript', 'iframe', 'button', 'svg']):
-        tag.decompose()
-    
-    # Get main content area
-    main_content = soup.find('main') or soup.find('article') or soup.find('[role="main"]') or soup.find('body') or soup
+# Combined prompt: tagging, screening and quality scoring in one round-trip
+PAGE_ANALYSIS_PROMPT = """You are a clinical psychology expert screening web content for a clinical mental health knowledge base.
+
+Analyze the content below and return ONE JSON object with these keys:
+- "tags": object with arrays (2-5 items max, empty if not relevant) for
+    - "modality": Treatment approaches (e.g., CBT, DBT, ACT, EMDR, Psychodynamic, Mindfulness, Family Therapy, Group Therapy)
+    - "population": Target demographics (e.g., Adults, Adolescents, Children, Elderly, Veterans, LGBTQ+, Couples, Families)
+    - "risk_factors": Risk indicators or concerns (e.g., Suicidal Ideation, Self-Harm, Substance Use, Trauma, Anxiety, Depression, PTSD)
+    - "cultural_context": Cultural considerations (e.g., Multicultural, Indigenous, Latino/Hispanic, Asian American, African American, Immigrant)
+    - "intervention_type": Type of intervention (e.g., Assessment, Treatment, Prevention, Crisis, Psychoeducation)
+- "approved": true/false (clinically relevant, reputable, evidence-based, culturally sensitive, not harmful?)
+- "flags": Array of any concerns ["misinformation", "bias", "low_quality", "off_topic", "stigmatizing"]
+- "reason": Short explanation of the screening decision (max 100 chars)
+- "quality_score": 1-5 (5=peer-reviewed/clinical guidelines, 4=reputable professional organization, 3=general health information, 2=blog/opinion with some clinical value, 1=low quality or off-topic)
+- "quality_reason": Brief explanation of the quality score
+- "cultural_diversity_score": 1-5 (1=narrow perspective, 5=diverse/inclusive)
+- "demographics_covered": Array like ["Adults", "Adolescents", "LGBTQ+", "Multicultural", etc.]
+
+IMPORTANT: Return ONLY valid JSON, no markdown formatting or explanation.
+
+Content to analyze:
+{content}
+
+JSON Response:"""
+
+# "combined" = one PAGE_ANALYSIS_PROMPT call per page, "separate" = legacy prompts run concurrently
+GEMINI_ANALYSIS_MODE = os.getenv("GEMINI_ANALYSIS_MODE", "combined").lower()
+
+EMPTY_TAGS = {"modality": [], "population": [], "risk_factors": [], "cultural_context": [], "intervention_type": []}
+
+
+def _default_analysis(reason: str, approved: bool = True, quality_score: int = 3, flags: Optional[List[str]] = None) -> Dict:
+    return {
+        "suggested_tags": {key: [] for key in EMPTY_TAGS},
+        "approved": approved,
+        "flags": flags or [],
+        "reason": reason,
+        "quality_score": quality_score,
+        "quality_reason": reason,
+        "cultural_diversity_score": 3,
+        "demographics_covered": []
+    }
+
+
+def _analysis_from_result(result: Dict) -> Dict:
+    """Normalize one PAGE_ANALYSIS_PROMPT-shaped JSON object"""
+    tags = result.get("tags") or {}
+    return {
+        "suggested_tags": {category: list(tags.get(category, []))[:5] for category in EMPTY_TAGS},
+        "approved": result.get("approved", True),
+        "flags": result.get("flags", []),
+        "reason": result.get("reason", "")[:200],
+        "quality_score": max(1, min(5, int(result.get("quality_score", 3)))),
+        "quality_reason": result.get("quality_reason", result.get("reason", "Quality assessed"))[:200],
+        "cultural_diversity_score": result.get("cultural_diversity_score", 3),
+        "demographics_covered": result.get("demographics_covered", [])
+    }
+
+
+async def analyze_page_with_gemini(title: str, content: str, url: str, use_cache: bool = True) -> Dict:
+    """Tag, screen and score a page with a single Gemini call"""
     
-    lines = []
-    seen_texts = set()  # Avoid duplicates
+    if not GEMINI_API_KEY:
+        return _default_analysis("No AI analysis available")
     
-    # Process elements in document order
-    for element in main_content.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li']):
-        text = element.get_text(strip=True)
+    try:
+        key = cache_key("analysis", content[:8000], prompt_version(PAGE_ANALYSIS_PROMPT), GEMINI_MODEL)
+        cached = await llm_cache.get(key) if use_cache else None
+        if cached is not None:
+            log.info(f"💾 Cached analysis for {url}")
+            return cached
+        
+        content_sample = f"Title: {title}\nURL: {url}\n\nContent:\n{content[:8000]}"
+        prompt = PAGE_ANALYSIS_PROMPT.format(content=content_sample)
+        
+        text = await gemini_generate(prompt, {
+            "temperature": 0.2,
+            "maxOutputTokens": 1024,
+            "responseMimeType": "application/json"
+        })
         
-        # Skip empty, too short, or duplicate text
-        if not text or len(text) < 15 or text in seen_texts:
-            continue
+        # Clean up response
+        text = text.strip()
+        if text.startswith("```json"):
+            text = text[7:]
+        if text.startswith("```"):
+            text = text[3:]
+        if text.endswith("```"):
+            text = text[:-3]
+        text = text.strip()
         
-        seen_texts.add(text)
+        analysis = _analysis_from_result(json.loads(text))
+        log.info(f"🧠 AI Analysis: {'✅ Approved' if analysis['approved'] else '❌ Rejected'} | Score: {analysis['quality_score']}/5 | {analysis['reason']}")
+        await llm_cache.set(key, analysis)
+        return analysis
         
-        if element.name.startswith('h'):
-            level = int(element.name[1])
-            lines.append(f"\n{'#' * level} {text}\n")
-        elif element.name == 'li':
-            lines.append(f"- {text}")
-        else:  # paragraph
-            lines.append(f"\n{text}\n")
+    except GeminiUnavailable:
+        raise
+    except UNUSABLE_RESPONSE_ERRORS as e:
+        log.error(f"❌ Page analysis error: {e}")
+        return _default_analysis(f"Analysis error: {str(e)[:50]}", quality_score=2, flags=["screening_failed"])
+
+
+# Multi-document variant of PAGE_ANALYSIS_PROMPT (same fields, so results share its cache entries)
+PAGE_BATCH_ANALYSIS_PROMPT = """You are a clinical psychology expert screening web content for a clinical mental health knowledge base.
+
+Analyze EACH of the documents below independently. Return ONE JSON object {{"results": [...]}} with exactly one entry per document, each with these keys:
+- "id": the document id exactly as given in its === DOCUMENT <id> === header
+- "tags": object with arrays (2-5 items max, empty if not relevant) for "modality", "population", "risk_factors", "cultural_context", "intervention_type"
+- "approved": true/false (clinically relevant, reputable, evidence-based, culturally sensitive, not harmful?)
+- "flags": Array of any concerns ["misinformation", "bias", "low_quality", "off_topic", "stigmatizing"]
+- "reason": Short explanation of the screening decision (max 100 chars)
+- "quality_score": 1-5 (5=peer-reviewed/clinical guidelines, 4=reputable professional organization, 3=general health information, 2=blog/opinion with some clinical value, 1=low quality or off-topic)
+- "quality_reason": Brief explanation of the quality score
+- "cultural_diversity_score": 1-5 (1=narrow perspective, 5=diverse/inclusive)
+- "demographics_covered": Array like ["Adults", "Adolescents", "LGBTQ+", "Multicultural", etc.]
+
+IMPORTANT: Return ONLY valid JSON, no markdown formatting or explanation.
+
+{documents}
+
+JSON Response:"""
+
+
+async def _analyze_batch_with_gemini(pages: List[tuple]) -> List[Optional[Dict]]:
+    """
+    Analyze several (title, content, url) pages in one Gemini call.
+    Returns one analysis per page, None where the response had no valid entry;
+    raises if the whole response is unusable.
+    """
+    documents = "\n\n".join(
+        f"=== DOCUMENT d{i} ===\nTitle: {title}\nURL: {url}\n\nContent:\n{content[:8000]}"
+        for i, (title, content, url) in enumerate(pages)
+    )
+    text = await gemini_generate(
+        PAGE_BATCH_ANALYSIS_PROMPT.format(documents=documents),
+        {"temperature": 0.2, "maxOutputTokens": 512 * len(pages) + 256, "responseMimeType": "application/json"}
+    )
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    text = text.strip("`").strip()
     
-    # Fallback: get plain text if nothing found
-    if not lines:
-        text = main_content.get_text(separator='\n', strip=True)
-        for line in text.split('\n'):
-            line = line.strip()
-            if line and len(line) > 20 and line not in seen_texts:
-                lines.append(line)
-                seen_texts.add(line)
+    by_id = {}
+    for entry in json.loads(text).get("results", []):
+        if isinstance(entry, dict) and "approved" in entry:
+            by_id[str(entry.get("id", ""))] = entry
+    
+    analyses = []
+    version = prompt_version(PAGE_ANALYSIS_PROMPT)
+    for i, (title, content, url) in enumerate(pages):
+        entry = by_id.get(f"d{i}")
+        try:
+            analysis = _analysis_from_result(entry) if entry is not None else None
+        except (TypeError, ValueError):
+            analysis = None
+        if analysis is not None:
+            log.info(f"🧠 AI Analysis (batch): {'✅ Approved' if analysis['approved'] else '❌ Rejected'} | Score: {analysis['quality_score']}/5 | {url}")
+            await llm_cache.set(cache_key("analysis", content[:8000], version, GEMINI_MODEL), analysis)
+        analyses.append(analysis)
+    return analyses
+
+
+# Crawl screening from all running jobs shares multi-document requests
+page_batcher = AdaptiveBatcher(
+    _analyze_batch_with_gemini,
+    lambda page: analyze_page_with_gemini(*page),
+    passthrough=(GeminiUnavailable,),
+)
+
+
+async def analyze_page_batched(title: str, content: str, url: str) -> Dict:
+    """analyze_page_with_gemini, but cache misses are screened in batches"""
+    if not GEMINI_API_KEY:
+        return _default_analysis("No AI analysis available")
     
-    return "\n".join(lines)
+    key = cache_key("analysis", content[:8000], prompt_version(PAGE_ANALYSIS_PROMPT), GEMINI_MODEL)
+    cached = await llm_cache.get(key)
+    if cached is not None:
+        log.info(f"💾 Cached analysis for {url}")
+        return cached
+    return await page_batcher.submit((title, content, url))
+
 
 @app.get("/health")
 async def health():
     return {
         "status": "ok", 
         "service": "cymbiose-crawler",
-        "gemini_configured": bool(GEMINI_API_KEY)
+        "gemini_configured": bool(GEMINI_API_KEY),
+        "html_parser": resolve_backend(),
+        "parse_executor": parse_executor.stats(),
+        "screening_batcher": page_batcher.stats(),
+        "gemini": gemini.stats(),
+        "embeddings": embeddings.stats(),
+        "vector_index": vector_index.stats(),
+        "crawl_coordinator": crawl_coordinator.stats() if crawl_coordinator is not None else {"backend": "local"}
+    }
+
+@app.get("/health/pools")
+async def pool_stats():
+    """Connection pool occupancy and request counters"""
+    return http_clients.stats()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the result caches"""
+    return {"llm": llm_cache.stats(), "pages": page_cache.stats(), "jobs": job_store.stats()}
+
+def runtime_metrics():
+    """Counters the components already keep, read at scrape time"""
+    yield counters_family("crawler_llm_cache_total", "Gemini result cache lookups and stores", "event", llm_cache.counters)
+    yield counters_family("crawler_page_cache_total", "Conditional page fetches and derived-result reuse", "event", page_cache.counters)
+    yield counters_family("crawler_embedding_cache_total", "Embedding cache lookups and stores", "event", embeddings.cache.counters)
+    yield counters_family("crawler_embeddings_total", "Texts embedded, served from cache, and batches sent", "event", embeddings.counters)
+    yield counters_family("crawler_gemini_total", "Gemini calls, attempts, retries, throttles, failures and tokens", "event", gemini.counters)
+    yield counters_family("crawler_screening_batcher_total", "Batched screening calls and fallbacks", "event", page_batcher.counters)
+    engines = list(crawl_engines.items())
+    yield "crawler_frontier_size", "gauge", "URLs queued per crawl job", [
+        ({"job": job_id}, len(engine.frontier)) for job_id, engine in engines
+    ]
+    yield "crawler_job_pages_in_flight", "gauge", "Pages being processed per crawl job", [
+        ({"job": job_id}, engine.in_flight) for job_id, engine in engines
+    ]
+
+REGISTRY.add_collector(runtime_metrics)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: stage latencies and sizes, page outcomes, errors, cache and Gemini counters"""
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+SCRAPE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate, br",
+    "DNT": "1",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "none",
+    "Sec-Fetch-User": "?1",
+    "Cache-Control": "max-age=0",
+}
+
+def scrape_error(e: Exception) -> HTTPException:
+    """Map a scrape pipeline failure to the HTTP error /scrape responds with"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, GeminiUnavailable):
+        # Better to fail than to return an unscreened, untagged page
+        log.error(f"❌ {e}")
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, int(e.retry_after)))})
+    if isinstance(e, httpx.HTTPStatusError):
+        log.error(f"❌ HTTP Error: {e}")
+        return HTTPException(status_code=e.response.status_code, detail=str(e))
+    log.error(f"❌ Error: {e}", exc_info=e)
+    return HTTPException(status_code=500, detail=str(e))
+
+async def fetch_for_scrape(url: str):
+    """Fetch a page for /scrape (conditional if cached); raises 415 for non-text content"""
+    # Streamed: binary content types are rejected before their body is downloaded
+    response, cached_page = await page_cache.fetch(
+        http_clients.web, url, headers=SCRAPE_HEADERS, timeout=30.0, accept=TEXT_CONTENT_TYPES, metrics_host=""
+    )
+    response.raise_for_status()
+    if response.extensions.get("body_skipped"):
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported content type: {response.headers.get('content-type', 'unknown')}"
+        )
+    log.info(f"📄 Response: {response.status_code}, {len(response.content)} bytes")
+    return response, cached_page
+
+async def parse_scraped_page(request: ScrapeRequest, response: httpx.Response, cached_page) -> Dict:
+    """Title, markdown and chunks, reused from the page cache when the page is unchanged"""
+    parsed = None if request.bypass_cache else page_cache.derived(cached_page, "scrape")
+    if parsed:
+        log.info(f"♻️ Reusing parsed content: {parsed['title'][:50]}...")
+        return parsed
+    # Title, markdown (capped) and RAG chunks are computed off the event loop
+    parsed = await parse_executor.run(parse_for_scrape, response.content, response.charset_encoding)
+    log.info(f"✅ Scraped: {parsed['title'][:50]}... ({parsed['content_length']} chars, {len(parsed['chunks'])} chunks)")
+    await page_cache.set_derived(request.url, "scrape", parsed)
+    return parsed
+
+async def analyze_scraped_page(title: str, markdown: str, url: str, use_cache: bool = True, batched: bool = False) -> Dict:
+    """Suggested tags, quality score/reason and screening summary for a scraped page"""
+    if GEMINI_ANALYSIS_MODE == "combined":
+        # Tags, screening and quality score from one Gemini call
+        log.info("🤖 Analyzing page with Gemini AI...")
+        if batched and use_cache:
+            analysis = await analyze_page_batched(title, markdown, url)
+        else:
+            analysis = await analyze_page_with_gemini(title, markdown, url, use_cache=use_cache)
+        return {
+            "suggested_tags": analysis["suggested_tags"],
+            "quality_score": analysis["quality_score"],
+            "quality_reason": analysis["quality_reason"],
+            "screening": {
+                key: analysis[key]
+                for key in ("approved", "flags", "reason", "cultural_diversity_score", "demographics_covered")
+            },
+        }
+    # Extract tags and score content quality concurrently
+    log.info("🤖 Extracting clinical tags and scoring quality with Gemini AI...")
+    suggested_tags, (quality_score, quality_reason) = await asyncio.gather(
+        extract_tags_with_gemini(markdown, use_cache=use_cache),
+        score_content_quality(markdown, url, use_cache=use_cache)
+    )
+    return {"suggested_tags": suggested_tags, "quality_score": quality_score, "quality_reason": quality_reason, "screening": None}
+
+async def embed_scraped_chunks(request: ScrapeRequest, chunks: List[Dict]) -> List[Dict]:
+    """Chunks with embedding vectors if the request asked for them"""
+    if not request.embed:
+        return chunks
+    return await embeddings.embed_chunks(chunks)
+
+async def index_scraped_chunks(url: str, title: str, chunks: List[Dict], analysis: Dict):
+    """Add embedded chunks to the vector index (re-scraping unchanged content is a no-op)"""
+    tags = sorted({tag for values in analysis["suggested_tags"].values() for tag in values})
+    items = [(
+        f"{url}#{cache_key('chunk', chunk['content'], '', embeddings.model)[:32]}",
+        chunk["embedding"],
+        {
+            "url": url,
+            "host": urlparse(url).netloc.lower(),
+            "title": title,
+            "heading": chunk.get("heading"),
+            "chunk_index": chunk["index"],
+            "content": chunk["content"][:1000],
+            "quality_score": analysis["quality_score"],
+            "tags": tags,
+            "source": "scrape",
+        },
+    ) for chunk in chunks]
+    added = await asyncio.to_thread(vector_index.add, items)
+    if added:
+        log.info(f"🧭 Indexed {added} chunks from {url}")
+
+def scrape_metadata(parsed: Dict, response: httpx.Response, cached_page) -> dict:
+    return {
+        "content_length": parsed.get("content_length", len(parsed["markdown"])),
+        "status_code": response.status_code,
+        "raw_html_size": len(response.content),
+        "truncated": response.extensions.get("truncated", False),
+        "chunk_count": len(parsed["chunks"]) if "chunks" in parsed else None,  # None while still streaming
+        "ai_tagged": bool(GEMINI_API_KEY),
+        "not_modified": cached_page is not None,
+        "analysis_mode": GEMINI_ANALYSIS_MODE,
     }
 
+def count_scrape(outcome: str):
+    """
+    /scrape pages share one "scrape" job label in crawler_pages_total, with an
+    empty host: callers send arbitrary URLs, so a host label would be unbounded
+    """
+    PAGES.inc(job="scrape", host="", outcome=outcome)
+
+def encode_event(event: dict, ndjson: bool) -> str:
+    """One NDJSON line or SSE frame"""
+    data = json.dumps(event)
+    return f"{data}\n" if ndjson else f"event: {event['type']}\ndata: {data}\n\n"
+
+async def scrape_page(request: ScrapeRequest, batched: bool = False, scheduler=None) -> ScrapeResponse:
+    """
+    The full /scrape pipeline. `batched` screens cache misses through the
+    shared Gemini batcher; a HostScheduler, if given, gates only the fetch.
+    """
+    if scheduler is not None:
+        async with scheduler.slot(request.url):
+            response, cached_page = await fetch_for_scrape(request.url)
+    else:
+        response, cached_page = await fetch_for_scrape(request.url)
+    parsed = await parse_scraped_page(request, response, cached_page)
+    analysis, chunks = await asyncio.gather(
+        analyze_scraped_page(
+            parsed["title"], parsed["markdown"], request.url, use_cache=not request.bypass_cache, batched=batched
+        ),
+        embed_scraped_chunks(request, parsed["chunks"]),
+    )
+    if request.embed:
+        await index_scraped_chunks(request.url, parsed["title"], chunks, analysis)
+    count_scrape("scraped")
+    
+    return ScrapeResponse(
+        url=request.url,
+        title=parsed["title"],
+        markdown=parsed["markdown"],  # Already limited to 20000 chars
+        chunks=chunks,
+        suggested_tags=analysis["suggested_tags"],
+        quality_score=analysis["quality_score"],
+        quality_reason=analysis["quality_reason"],
+        metadata={**scrape_metadata(parsed, response, cached_page), "screening": analysis["screening"]}
+    )
+
 @app.post("/scrape", response_model=ScrapeResponse)
 async def scrape_url(request: ScrapeRequest):
-    print(f"\n🕷️ Scraping: {request.url}")
-    
+    log.info(f"🕷️ Scraping: {request.url}", extra={"job": "scrape", "url": request.url})
+    with TRACES.trace("scrape", url=request.url):
+        try:
+            return await scrape_page(request)
+        except Exception as e:
+            count_scrape("failed")
+            raise scrape_error(e)
+
+@app.post("/scrape/stream")
+async def scrape_url_stream(request: ScrapeRequest, format: str = "ndjson"):
+    """
+    /scrape as a stream of events: "page" (title + metadata), "markdown", one
+    "chunk" per chunk, "embeddings" (if requested), then "analysis" (tags,
+    quality, screening) and "done" (with the chunk count).
+    Gemini runs while the content is sent, and freshly parsed pages are
+    chunked as the chunks go out, so the first arrives before the last is cut. Fetch errors are returned as HTTP
+    errors; later failures arrive as an "error" event. format=ndjson (default) or sse.
+    """
+    log.info(f"🕷️ Scraping (stream): {request.url}", extra={"job": "scrape", "url": request.url})
+    ndjson = format != "sse"
+    # Started here so the fetch is included; the response stream inherits it and finishes it
+    trace = TRACES.start("scrape", url=request.url, stream=True)
     try:
-        async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
-                "Accept-Language": "en-US,en;q=0.9",
-                "Accept-Encoding": "gzip, deflate, br",
-                "DNT": "1",
-                "Connection": "keep-alive",
-                "Upgrade-Insecure-Requests": "1",
-                "Sec-Fetch-Dest": "document",
-                "Sec-Fetch-Mode": "navigate",
-                "Sec-Fetch-Site": "none",
-                "Sec-Fetch-User": "?1",
-                "Cache-Control": "max-age=0",
-            }
-            response = await client.get(request.url, headers=headers)
-            response.raise_for_status()
-            
-            print(f"📄 Response: {response.status_code}, {len(response.text)} bytes")
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract title
-            title = "No Title"
-            if soup.title and soup.title.string:
-                title = soup.title.string.strip()
-            elif soup.find('h1'):
-                title = soup.find('h1').get_text(strip=True)
-            
-            # Convert to markdown
-            markdown = html_to_markdown(soup)
-            
-            print(f"✅ Scraped: {title[:50]}... ({len(markdown)} chars)")
-            
-            # Extract tags using Gemini AI
-            print("🤖 Extracting clinical tags with Gemini AI...")
-            suggested_tags = await extract_tags_with_gemini(markdown)
-            
-            # Chunk content for RAG
-            print("📦 Chunking content for RAG...")
-            chunks = chunk_content(markdown)
-            
-            # Score content quality
-            print("⭐ Scoring content quality...")
-            quality_score, quality_reason = await score_content_quality(markdown, request.url)
-            
-            return ScrapeResponse(
-                url=request.url,
-                title=title,
-                markdown=markdown[:20000],  # Limit size
-                chunks=chunks,
-                suggested_tags=suggested_tags,
-                quality_score=quality_score,
-                quality_reason=quality_reason,
-                metadata={
-                    "content_length": len(markdown),
-                    "status_code": response.status_code,
-                    "raw_html_size": len(response.text),
-                    "chunk_count": len(chunks),
-                    "ai_tagged": bool(GEMINI_API_KEY)
-                }
-            )
+        response, cached_page = await fetch_for_scrape(request.url)
+    except Exception as e:
+        count_scrape("failed")
+        TRACES.finish(trace, e)
+        raise scrape_error(e)
+    
+    async def events():
+        analysis_task = None
+        error = None
+        try:
+            parsed = None if request.bypass_cache else page_cache.derived(cached_page, "scrape")
+            if parsed:
+                log.info(f"♻️ Reusing parsed content: {parsed['title'][:50]}...")
+                full_markdown = None
+            else:
+                parsed = await parse_executor.run(parse_for_scrape_stream, response.content, response.charset_encoding)
+                full_markdown = parsed.pop("full_markdown")
+            analysis_task = asyncio.create_task(analyze_scraped_page(
+                parsed["title"], parsed["markdown"], request.url, use_cache=not request.bypass_cache
+            ))
+            yield encode_event({
+                "type": "page", "url": request.url, "title": parsed["title"],
+                "metadata": scrape_metadata(parsed, response, cached_page),
+            }, ndjson)
+            yield encode_event({"type": "markdown", "markdown": parsed["markdown"]}, ndjson)
+            if full_markdown is None:
+                for chunk in parsed["chunks"]:
+                    yield encode_event({"type": "chunk", "chunk": chunk}, ndjson)
+            else:
+                # Cut chunks one at a time off the loop and send each as soon as it exists
+                chunks, pending, chunk_seconds = [], iter_chunks(full_markdown), 0.0
+                while True:
+                    started = time.perf_counter()
+                    chunk = await asyncio.to_thread(next, pending, None)
+                    chunk_seconds += time.perf_counter() - started
+                    if chunk is None:
+                        break
+                    chunks.append(chunk)
+                    yield encode_event({"type": "chunk", "chunk": chunk}, ndjson)
+                observe_stage("chunk", chunk_seconds, len(full_markdown))
+                parsed["chunks"] = chunks
+                log.info(f"✅ Scraped: {parsed['title'][:50]}... ({parsed['content_length']} chars, {len(chunks)} chunks)")
+                await page_cache.set_derived(request.url, "scrape", parsed)
+            if request.embed:
+                embedded = await embeddings.embed_chunks(parsed["chunks"])
+                vectors = [chunk["embedding"] for chunk in embedded]
+                yield encode_event({"type": "embeddings", "model": embeddings.model, "vectors": vectors}, ndjson)
             
-    except httpx.HTTPStatusError as e:
-        print(f"❌ HTTP Error: {e}")
-        raise HTTPException(status_code=e.response.status_code, detail=str(e))
+            analysis = await analysis_task
+            yield encode_event({"type": "analysis", **analysis}, ndjson)
+            if request.embed:
+                await index_scraped_chunks(request.url, parsed["title"], embedded, analysis)
+            count_scrape("scraped")
+            yield encode_event({"type": "done", "url": request.url, "chunk_count": len(parsed["chunks"])}, ndjson)
+        except Exception as e:
+            count_scrape("failed")
+            error = e
+            http_error = scrape_error(e)
+            yield encode_event({
+                "type": "error", "status_code": http_error.status_code, "detail": http_error.detail,
+                "retry_after": (http_error.headers or {}).get("Retry-After"),
+            }, ndjson)
+        finally:
+            TRACES.finish(trace, error)
+            if analysis_task is not None and not analysis_task.done():
+                analysis_task.cancel()  # client went away mid-stream
+    
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson" if ndjson else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+class EmbedItem(BaseModel):
+    id: str
+    content: str
+    metadata: Dict = {}  # stored with the vector when indexed (filterable in /search)
+
+class EmbedRequest(BaseModel):
+    items: List[EmbedItem]
+    index: bool = False  # also add the vectors to the /search index, keyed by id
+
+@app.post("/embeddings")
+async def embed_items(request: EmbedRequest):
+    """
+    Bulk embedding for backfills: NDJSON {"id", "embedding"} lines, produced
+    in batched calls with cached vectors reused, then a "done" line.
+    """
+    group = embeddings.batch_size * 10
+    
+    async def events():
+        cached_before = embeddings.counters["cached"]
+        try:
+            for start in range(0, len(request.items), group):
+                items = request.items[start:start + group]
+                vectors = await embeddings.embed([item.content for item in items])
+                if request.index:
+                    await asyncio.to_thread(vector_index.add, [
+                        (item.id, vector, {"source": "import", **item.metadata, "id": item.id, "content": item.content[:1000]})
+                        for item, vector in zip(items, vectors)
+                    ])
+                for item, vector in zip(items, vectors):
+                    yield encode_event({"type": "embedding", "id": item.id, "embedding": vector}, ndjson=True)
+            yield encode_event({
+                "type": "done", "count": len(request.items), "model": embeddings.model,
+                "cached": embeddings.counters["cached"] - cached_before,
+            }, ndjson=True)
+        except Exception as e:
+            error = scrape_error(e)
+            yield encode_event({"type": "error", "status_code": error.status_code, "detail": error.detail}, ndjson=True)
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache"})
+
+class SearchRequest(BaseModel):
+    query: Optional[str] = None  # embedded with the configured backend
+    vector: Optional[List[float]] = None  # or a precomputed embedding
+    k: int = 10
+    filters: Dict = {}  # field -> value or list of values; "min_quality_score" -> int
+
+    @field_validator("filters")
+    @classmethod
+    def check_filters(cls, filters: Dict) -> Dict:
+        for name, accepted in filters.items():
+            if name == "min_quality_score":
+                if accepted is not None and (isinstance(accepted, bool) or not isinstance(accepted, int)):
+                    raise ValueError("min_quality_score must be an integer")
+                continue
+            values = accepted if isinstance(accepted, list) else [accepted]
+            if not all(value is None or isinstance(value, FILTER_VALUE_TYPES) for value in values):
+                raise ValueError(f"filter {name!r} must be a scalar or a list of scalars")
+        return filters
+
+    @model_validator(mode="after")
+    def check_query(self) -> "SearchRequest":
+        if self.vector is not None and not self.vector:
+            raise ValueError("vector must not be empty")
+        if self.vector is None and not self.query:
+            raise ValueError("provide a query or a vector")
+        return self
+
+@app.post("/search")
+async def search_chunks(request: SearchRequest):
+    """Nearest indexed chunks by cosine similarity, with optional metadata filters"""
+    try:
+        vector = request.vector if request.vector is not None else (await embeddings.embed([request.query]))[0]
+        started = time.perf_counter()
+        results = await asyncio.to_thread(vector_index.search, vector, max(1, min(request.k, 100)), request.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+        raise scrape_error(e)
+    return {
+        "results": results,
+        "model": embeddings.model,
+        "search_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+SCRAPE_BATCH_CONCURRENCY = int(os.getenv("SCRAPE_BATCH_CONCURRENCY", "16"))
+SCRAPE_BATCH_MAX_ITEMS = int(os.getenv("SCRAPE_BATCH_MAX_ITEMS", "1000"))
+
+class BatchScrapeRequest(BaseModel):
+    items: List[ScrapeRequest]
+    concurrency: int = SCRAPE_BATCH_CONCURRENCY
+
+@app.post("/scrape/batch")
+async def scrape_batch(batch: BatchScrapeRequest):
+    """
+    Scrape many URLs through a bounded pool of workers (per-host limits and
+    the shared Gemini batcher apply) and stream NDJSON as each finishes:
+    a "result" or "error" line per item (with its index), then "done".
+    """
+    if len(batch.items) > SCRAPE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {SCRAPE_BATCH_MAX_ITEMS} items per batch")
+    log.info(f"🕷️ Batch scrape: {len(batch.items)} URLs")
+    concurrency = max(1, min(batch.concurrency, SCRAPE_BATCH_CONCURRENCY, len(batch.items) or 1))
+    scheduler = HostScheduler(limiter=rate_limiter)
+    
+    async def events():
+        todo = asyncio.Queue()
+        for index, item in enumerate(batch.items):
+            todo.put_nowait((index, item))
+        done = asyncio.Queue()
+        
+        async def worker():
+            while not todo.empty():
+                index, item = todo.get_nowait()
+                try:
+                    with TRACES.trace("scrape", url=item.url, batch=True):
+                        result = await scrape_page(item, batched=True, scheduler=scheduler)
+                    done.put_nowait({"type": "result", "index": index, "url": item.url, "result": result.model_dump()})
+                except Exception as e:
+                    count_scrape("failed")
+                    error = scrape_error(e)
+                    done.put_nowait({
+                        "type": "error", "index": index, "url": item.url,
+                        "status_code": error.status_code, "detail": error.detail,
+                    })
+        
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        succeeded = failed = 0
+        try:
+            for _ in range(len(batch.items)):
+                event = await done.get()
+                if event["type"] == "result":
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield encode_event(event, ndjson=True)
+            yield encode_event({"type": "done", "succeeded": succeeded, "failed": failed}, ndjson=True)
+            log.info(f"✅ Batch scrape done: {succeeded} succeeded, {failed} failed")
+        finally:
+            for task in workers:
+                task.cancel()  # no-op once finished; stops work if the client disconnected
+    
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # ==================== AUTO-CRAWLER SYSTEM ====================
 
-import asyncio
 import re
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
-from collections import deque
 import threading
+import time
+from crawl_engine import CrawlEngine, HostScheduler
+from frontier import canonicalize_url, create_frontier, restore_frontier
+from link_scoring import get_link_scorer
+from rate_limiter import CRAWLER_USER_AGENT, DomainRateLimiter
+from sitemaps import SITEMAP_PRIORITY_WEIGHT, collect_sitemap_urls, well_known_sitemaps
+from near_dup import NEAR_DUP_GLOBAL_ITEMS, NearDuplicateDetector, SimHashIndex, screening_from_result
+from job_events import JOB_COUNTERS, TERMINAL_STATUSES, JobEventBroker, job_summary
+from coordination import COORDINATOR_POLL_SECONDS, RESULT_COUNTERS, LeasedFrontier, create_coordinator, worker_id
 
 # In-memory storage for crawl jobs (in production, use Redis or database)
 crawl_jobs: Dict[str, dict] = {}
 crawl_locks: Dict[str, threading.Event] = {}
+crawl_engines: Dict[str, CrawlEngine] = {}  # kept while a job is running or paused, for checkpoints/resume
+job_events = JobEventBroker()
+
+# Shared jobs/frontier so several processes or replicas crawl together (None = this process only)
+crawl_coordinator = create_coordinator()
+WORKER_ID = worker_id()
+joined_jobs: set = set()  # shared jobs this process is currently crawling
+# Shared jobs this process ran out of work on -> the run (resumed_at) it finished
+finished_jobs: Dict[str, Optional[str]] = {}
+
+# Fingerprints of pages screened by any job, for near_duplicates="global"
+shared_near_dups = SimHashIndex(max_items=NEAR_DUP_GLOBAL_ITEMS)
+
+# Shared across jobs so concurrent crawls of one site split its budget
+rate_limiter = DomainRateLimiter(http_clients)
 
 class CrawlRequest(BaseModel):
     seed_url: str
@@ -507,6 +1038,21 @@ class CrawlRequest(BaseModel):
     same_domain_only: bool = True
     include_patterns: List[str] = []
     exclude_patterns: List[str] = [r"\.pdf$", r"\.jpg$", r"\.png$", r"login", r"signup", r"cart"]
+    concurrency: int = 4  # async fetch workers for this job
+    per_host_delay: Optional[float] = None  # extra per-job floor; hosts are paced by robots.txt/rate limiter
+    dedup_mode: str = "auto"  # "exact", "bloom" (fixed memory, tiny false-positive rate) or "auto" by max_urls
+    near_duplicates: str = "job"  # "off", "job" or "global" (also match pages screened by other jobs)
+    sitemaps: bool = False  # also seed the frontier from the site's sitemaps (best priority/lastmod first)
+    strategy: str = "best_first"  # "best_first" (likely-clinical links first, see link_scoring.py) or "bfs"
+
+    @field_validator("seed_url")
+    @classmethod
+    def check_seed_url(cls, value: str) -> str:
+        """Reject seeds the frontier could not canonicalize (422 instead of a failed job)"""
+        parts = urlparse(canonicalize_url(value))  # ValueError on a malformed host/port
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError("seed_url must be an absolute http(s) URL")
+        return value.strip()
 
 class CrawlJobStatus(BaseModel):
     id: str
@@ -516,6 +1062,7 @@ class CrawlJobStatus(BaseModel):
     urls_found: int
     urls_scraped: int
     urls_failed: int
+    urls_duplicate: int
     urls_pending: int
     current_url: Optional[str]
     started_at: Optional[str]
@@ -523,41 +1070,6 @@ class CrawlJobStatus(BaseModel):
     scraped_urls: List[dict]
     error: Optional[str]
 
-def extract_links(html: str, base_url: str, same_domain: bool = True) -> List[str]:
-    """Extract all valid links from HTML content"""
-    soup = BeautifulSoup(html, "html.parser")
-    links = set()
-    base_domain = urlparse(base_url).netloc
-    
-    for a_tag in soup.find_all("a", href=True):
-        href = a_tag["href"]
-        
-        # Skip empty, javascript, mailto, tel links
-        if not href or href.startswith(("#", "javascript:", "mailto:", "tel:")):
-            continue
-        
-        # Convert relative URLs to absolute
-        full_url = urljoin(base_url, href)
-        parsed = urlparse(full_url)
-        
-        # Only HTTP/HTTPS
-        if parsed.scheme not in ("http", "https"):
-            continue
-        
-        # Same domain check
-        if same_domain and parsed.netloc != base_domain:
-            continue
-        
-        # Normalize URL (remove fragments, trailing slashes)
-        normalized = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
-        if parsed.query:
-            normalized += f"?{parsed.query}"
-        normalized = normalized.rstrip("/")
-        
-        links.add(normalized)
-    
-    return list(links)
-
 def should_crawl_url(url: str, exclude_patterns: List[str], include_patterns: List[str]) -> bool:
     """Check if URL should be crawled based on patterns"""
     # Check exclude patterns
@@ -574,127 +1086,435 @@ def should_crawl_url(url: str, exclude_patterns: List[str], include_patterns: Li
     
     return True
 
-async def crawl_worker(job_id: str):
+def add_result(job: dict, entry: dict) -> dict:
+    """Append a per-page result and push it to stream subscribers"""
+    job["scraped_urls"].append(entry)
+    job_events.result(job, len(job["scraped_urls"]) - 1, entry)
+    return entry
+
+def near_dup_detector(job: dict) -> Optional[NearDuplicateDetector]:
+    """Per-job near-duplicate index, re-seeded from any results the job already has"""
+    mode = job.get("near_duplicates", "job")
+    if mode == "off":
+        return None
+    detector = NearDuplicateDetector(shared=shared_near_dups if mode == "global" else None)
+    for entry in job["scraped_urls"]:
+        if entry.get("fingerprint") and not entry.get("duplicate_of"):
+            detector.add(int(entry["fingerprint"], 16), entry)
+    return detector
+
+async def restore_crawl_jobs():
+    """Load persisted jobs; ones interrupted by a restart come back paused and resumable"""
+    if crawl_coordinator is not None:
+        return  # shared jobs live in the coordinator; coordination_loop() rejoins them
+    for job in await job_store.load_jobs():
+        if job["status"] in ("pending", "running"):
+            job["status"] = "paused"
+            job["current_url"] = None
+        job.setdefault("urls_duplicate", 0)
+        crawl_jobs[job["id"]] = job
+        crawl_locks[job["id"]] = threading.Event()
+        if job.get("pause_reason") == "gemini_unavailable":
+            asyncio.create_task(resume_when_gemini_recovers(job["id"]))
+    if crawl_jobs:
+        log.info(f"💾 Restored {len(crawl_jobs)} crawl jobs")
+
+def start_resume(job_id: str):
+    """Restart a paused job's worker from its checkpoint"""
+    job = crawl_jobs[job_id]
+    job["error"] = None
+    job["pause_reason"] = None
+    job["status"] = "pending"
+    crawl_locks[job_id] = threading.Event()
+    asyncio.create_task(crawl_worker(job_id, resume=True))
+
+async def resume_when_gemini_recovers(job_id: str):
+    """Auto-resume a job paused by the Gemini circuit breaker once it may be retried"""
+    await gemini.wait_until_retryable()
+    if crawl_coordinator is not None:
+        job = await crawl_coordinator.get_job(job_id)
+        if job and job["status"] == "paused" and job.get("pause_reason") == "gemini_unavailable":
+            log.info(f"▶️ Gemini retryable again, resuming crawl job {job_id}")
+            await resume_shared_job(job_id)
+        return
+    job = crawl_jobs.get(job_id)
+    if job and job["status"] == "paused" and job.get("pause_reason") == "gemini_unavailable":
+        log.info(f"▶️ Gemini retryable again, resuming crawl job {job_id}")
+        start_resume(job_id)
+
+async def checkpoint_running_jobs():
+    """Final checkpoint on shutdown; in-flight pages are retried on resume"""
+    for job_id, engine in list(crawl_engines.items()):
+        job = crawl_jobs.get(job_id)
+        if job and job["status"] == "running":
+            crawl_locks[job_id].set()
+            if crawl_coordinator is None:
+                await job_store.checkpoint(job, engine)
+            # Shared jobs: our leases expire and other workers reclaim them
+
+def join_crawl_job(job: dict, resume: bool = True):
+    """Start crawling a shared job in this process alongside any other workers"""
+    joined_jobs.add(job["id"])
+    crawl_jobs[job["id"]] = {
+        **{k: v for k, v in job.items() if k not in ("result_count", "urls_leased")},
+        "urls_found": 0, "urls_scraped": 0, "urls_failed": 0, "urls_duplicate": 0, "urls_pending": 0,
+        "scraped_urls": [],  # this worker's results not yet sent to the coordinator
+    }
+    crawl_locks[job["id"]] = threading.Event()
+    asyncio.create_task(crawl_worker(job["id"], resume=resume))
+
+async def resume_shared_job(job_id: str):
+    await crawl_coordinator.update_job(job_id, {
+        "status": "running", "pause_reason": None, "error": None, "resumed_at": datetime.now().isoformat(),
+    })
+    job = await crawl_coordinator.get_job(job_id)
+    if job and job_id not in joined_jobs:
+        join_crawl_job(job)
+
+async def coordination_loop():
+    """Join running shared jobs, including ones started or resumed by other workers"""
+    while True:
+        try:
+            jobs = await crawl_coordinator.list_jobs()
+            running = {job["id"]: job for job in jobs if job["status"] == "running"}
+            for job_id in [job_id for job_id in finished_jobs if job_id not in running]:
+                del finished_jobs[job_id]
+            for job_id, job in running.items():
+                if job_id in joined_jobs:
+                    continue
+                if job_id in finished_jobs and finished_jobs[job_id] == job.get("resumed_at"):
+                    continue  # nothing left for us in this run; the workers still holding leases finish it
+                log.info(f"🤝 Joining shared crawl job {job_id}")
+                join_crawl_job(job)
+        except Exception as e:
+            log.warning(f"⚠️ Coordinator poll failed: {e}")
+        await asyncio.sleep(COORDINATOR_POLL_SECONDS)
+
+async def crawl_worker(job_id: str, resume: bool = False):
     """Background worker to process crawl job"""
     job = crawl_jobs.get(job_id)
     if not job:
         return
     
+    # Shared jobs lease their URLs from the coordinator instead of a local frontier
+    shared = crawl_coordinator is not None
+    stop_event = crawl_locks.get(job_id)
+    
+    # Resume from the last checkpoint (or the paused in-memory engine if the store is off)
+    frontier, pages_done = None, 0
+    if shared:
+        frontier = LeasedFrontier(crawl_coordinator, job_id, WORKER_ID, batch=job["concurrency"], stop_event=stop_event)
+    elif resume:
+        state = await job_store.load_frontier(job_id)
+        if state is None and job_id in crawl_engines:
+            state = {**crawl_engines[job_id].snapshot(), "pages_done": crawl_engines[job_id].pages_done}
+        if state is not None:
+            # A URL in flight at the checkpoint may already have its result saved
+            done = [entry["url"] for entry in job["scraped_urls"]]
+            frontier, pages_done = restore_frontier(state, skip=done), state["pages_done"]
+            log.info(f"⏯️ Resuming crawl job {job_id}: {len(frontier)} queued, {pages_done} done")
+    
     job["status"] = "running"
-    job["started_at"] = datetime.now().isoformat()
+    job["started_at"] = job["started_at"] or datetime.now().isoformat()
     
-    queue = deque([(job["seed_url"], 0)])  # (url, depth)
-    visited = set()
-    stop_event = crawl_locks.get(job_id)
+    client = http_clients.web
+    scheduler = HostScheduler(per_host_delay=job["per_host_delay"], limiter=rate_limiter)
+    near_dups = near_dup_detector(job)
+    scorer = get_link_scorer() if job.get("strategy") == "best_first" else None
     
-    async with httpx.AsyncClient(timeout=15.0, follow_redirects=True) as client:
-        while queue and len(visited) < job["max_urls"]:
-            # Check if stopped
-            if stop_event and stop_event.is_set():
-                job["status"] = "paused"
-                return
+    def count_page(host: str, outcome: str):
+        PAGES.inc(job=job_id, host=host, outcome=outcome)
+        annotate_trace(outcome=outcome)
+    
+    async def process_url(url: str, depth: int):
+        job["current_url"] = url
+        job["urls_pending"] = len(engine.frontier)
+        host = urlparse(url).netloc.lower()
+        context = {"job": job_id, "url": url, "host": host}
+        
+        try:
+            log.info(f"🔍 Crawling [{depth}]: {url}", extra={**context, "depth": depth})
             
-            url, depth = queue.popleft()
+            if not await rate_limiter.allowed(url):
+                log.info(f"🤖 Disallowed by robots.txt: {url}", extra=context)
+                count_page(host, "robots_blocked")
+                job["urls_failed"] += 1
+                add_result(job, {
+                    "url": url,
+                    "title": f"[ROBOTS] {url}",
+                    "depth": depth,
+                    "quality_score": 0,
+                    "robots_blocked": True,
+                    "error": "Disallowed by robots.txt",
+                    "scraped_at": datetime.now().isoformat()
+                })
+                return
             
-            if url in visited:
-                continue
+            # Per-host politeness only covers the fetch; screening overlaps with other fetches
+            async with scheduler.slot(url):
+                started = time.monotonic()
+                try:
+                    response, cached_page = await page_cache.fetch(client, url, timeout=15.0, headers={
+                        "User-Agent": CRAWLER_USER_AGENT
+                    })
+                except httpx.TransportError as e:
+                    # Timeouts and refused connections are overload signals too
+                    rate_limiter.record_error(url, time.monotonic() - started, e)
+                    raise
+                rate_limiter.record(
+                    url, response.status_code, time.monotonic() - started,
+                    retry_after=response.headers.get("retry-after")
+                )
+            response.raise_for_status()
             
-            visited.add(url)
-            job["current_url"] = url
-            job["urls_pending"] = len(queue)
+            # Only process HTML pages (other types are rejected before their body is read)
+            if response.extensions.get("body_skipped"):
+                count_page(host, "failed")
+                job["urls_failed"] += 1
+                return
             
-            # Rate limiting - 1 request per second
-            await asyncio.sleep(1.0)
+            # Extract and parse content (skipped when the page is unchanged since the last crawl)
+            links_kind = f"crawl:{job['same_domain_only']}"
+            parsed = page_cache.derived(cached_page, links_kind)
+            if parsed and "content_fingerprint" not in parsed:
+                parsed = None  # stored before main-content fingerprints; parse again
+            if parsed:
+                title, text_content, text_length = parsed["title"], parsed["text"], parsed["text_length"]
+            else:
+                # One parse (in the executor) serves title, screening text and link extraction
+                parsed = await parse_executor.run(
+                    parse_for_crawl, response.content, response.charset_encoding,
+                    url, job["same_domain_only"], depth < job["max_depth"]
+                )
+                title, text_content, text_length = parsed["title"], parsed["text"], parsed["text_length"]
+                await page_cache.set_derived(url, links_kind, parsed)
             
-            try:
-                print(f"🔍 Crawling [{depth}]: {url}")
-                
-                response = await client.get(url, headers={
-                    "User-Agent": "Cymbiose-KB-Crawler/1.0 (Clinical Knowledge Base Builder)"
-                })
-                response.raise_for_status()
-                
-                html = response.text
-                content_type = response.headers.get("content-type", "")
-                
-                # Only process HTML pages
-                if "text/html" not in content_type:
-                    job["urls_failed"] += 1
-                    continue
-                
-                # Extract and parse content
-                soup = BeautifulSoup(html, "html.parser")
-                title = soup.title.string if soup.title else url
-                text_content = soup.get_text()
-                text_length = len(text_content)
-                
-                # AI-powered content screening
-                screening_result = await screen_content_with_gemini(
+            # Near-duplicates (print views, paginated or syndicated copies) inherit the original's screening
+            fingerprint = parsed["content_fingerprint"]
+            original = near_dups.find(fingerprint) if near_dups else None
+            if original is not None:
+                log.info(f"👯 Near-duplicate of {original['url']}: {url}", extra=context)
+                screening_result = screening_from_result(original)
+                page_info = {"duplicate_of": original["url"]}
+            else:
+                # AI-powered content screening (combined mode also returns tags)
+                screen = analyze_page_batched if GEMINI_ANALYSIS_MODE == "combined" else screen_content_with_gemini
+                screening_result = await screen(
                     title=title[:200] if title else url,
                     content=text_content,
                     url=url
                 )
-                
-                # Skip rejected content
-                if not screening_result.get("approved", True):
-                    print(f"🚫 Rejected: {url} | Reason: {screening_result.get('reason', 'Unknown')}")
-                    job["urls_failed"] += 1
-                    job["scraped_urls"].append({
-                        "url": url,
-                        "title": f"[REJECTED] {title[:100] if title else url}",
-                        "depth": depth,
-                        "quality_score": 0,
-                        "content_length": text_length,
-                        "rejected": True,
-                        "rejection_reason": screening_result.get("reason", "Did not pass AI screening"),
-                        "flags": screening_result.get("flags", []),
-                        "scraped_at": datetime.now().isoformat()
-                    })
-                    continue
-                
-                quality = screening_result.get("quality_score", 3)
-                
-                # Add to scraped results with screening metadata
-                job["scraped_urls"].append({
+                page_info = {"fingerprint": f"{fingerprint:016x}"} if fingerprint is not None else {}
+            
+            # Skip rejected content
+            if not screening_result.get("approved", True):
+                log.info(f"🚫 Rejected: {url} | Reason: {screening_result.get('reason', 'Unknown')}", extra=context)
+                count_page(host, "rejected")
+                job["urls_duplicate" if original is not None else "urls_failed"] += 1
+                entry = add_result(job, {
                     "url": url,
-                    "title": title[:200] if title else url,
+                    "title": f"[REJECTED] {title[:100] if title else url}",
                     "depth": depth,
-                    "quality_score": quality,
-                    "cultural_diversity_score": screening_result.get("cultural_diversity_score", 3),
-                    "demographics_covered": screening_result.get("demographics_covered", []),
+                    "quality_score": 0,
                     "content_length": text_length,
-                    "ai_screening_reason": screening_result.get("reason", ""),
+                    "rejected": True,
+                    "rejection_reason": screening_result.get("reason", "Did not pass AI screening"),
                     "flags": screening_result.get("flags", []),
+                    **page_info,
                     "scraped_at": datetime.now().isoformat()
                 })
+                if near_dups and original is None:
+                    near_dups.add(fingerprint, entry)
+                return
+            
+            quality = screening_result.get("quality_score", 3)
+            
+            # Add to scraped results with screening metadata (duplicates are listed but not counted as scraped)
+            entry = add_result(job, {
+                "url": url,
+                "title": f"[DUPLICATE] {title[:100] if title else url}" if original is not None else (title[:200] if title else url),
+                "depth": depth,
+                "quality_score": quality,
+                "cultural_diversity_score": screening_result.get("cultural_diversity_score", 3),
+                "demographics_covered": screening_result.get("demographics_covered", []),
+                "content_length": text_length,
+                "ai_screening_reason": screening_result.get("reason", ""),
+                "flags": screening_result.get("flags", []),
+                "suggested_tags": screening_result.get("suggested_tags", {}),
+                **page_info,
+                "scraped_at": datetime.now().isoformat()
+            })
+            count_page(host, "duplicate" if original is not None else "scraped")
+            if original is not None:
+                job["urls_duplicate"] += 1
+            else:
                 job["urls_scraped"] += 1
+                if near_dups:
+                    near_dups.add(fingerprint, entry)
+            
+            # Discover new links if not at max depth
+            if depth < job["max_depth"]:
+                if parsed["links"] is None:
+                    parsed = {**parsed, **await parse_executor.run(
+                        parse_crawl_links, response.content, response.charset_encoding, url, job["same_domain_only"]
+                    )}
+                new_links = parsed["links"]
+                anchors = parsed.get("anchors") or [""] * len(new_links)  # cached before anchors were kept
                 
-                # Discover new links if not at max depth
-                if depth < job["max_depth"]:
-                    new_links = extract_links(html, url, job["same_domain_only"])
-                    
-                    for link in new_links:
-                        if link not in visited and should_crawl_url(link, job["exclude_patterns"], job["include_patterns"]):
-                            queue.append((link, depth + 1))
-                            job["urls_found"] += 1
-                
-            except Exception as e:
-                print(f"❌ Failed to crawl {url}: {e}")
-                job["urls_failed"] += 1
-                job["scraped_urls"].append({
-                    "url": url,
-                    "title": f"Failed: {str(e)[:100]}",
-                    "depth": depth,
-                    "quality_score": 0,
-                    "error": str(e)[:200],
-                    "scraped_at": datetime.now().isoformat()
-                })
+                # The frontier canonicalizes and dedups, so urls_found counts unique URLs
+                for link, anchor in zip(new_links, anchors):
+                    if not should_crawl_url(link, job["exclude_patterns"], job["include_patterns"]):
+                        continue
+                    score = scorer.score(link, depth + 1, anchor, quality) if scorer else 0.0
+                    if engine.enqueue(link, depth + 1, score):
+                        job["urls_found"] += 1
+            
+        except GeminiUnavailable as e:
+            # Never let pages through unscreened: put the page back and pause until Gemini recovers
+            engine.requeue(url, depth)
+            if not stop_event.is_set():
+                log.info(f"⏸️ Pausing crawl job {job_id}: {e}", extra=context)
+                job["error"] = f"Paused: {e}"
+                job["pause_reason"] = "gemini_unavailable"
+                stop_event.set()
+        except Exception as e:
+            log.error(f"❌ Failed to crawl {url}: {e}", extra=context)
+            count_page(host, "failed")
+            ERRORS.inc(stage="crawl", host=host)
+            job["urls_failed"] += 1
+            add_result(job, {
+                "url": url,
+                "title": f"Failed: {str(e)[:100]}",
+                "depth": depth,
+                "quality_score": 0,
+                "error": str(e)[:200],
+                "scraped_at": datetime.now().isoformat()
+            })
+    
+    async def process_page(url: str, depth: int):
+        with TRACES.trace("crawl", job=job_id, url=url, depth=depth):
+            await process_url(url, depth)
+    
+    async def process_leased(url: str, depth: int):
+        try:
+            await process_page(url, depth)
+        finally:
+            frontier.complete(url)  # no-op if the page was handed back
     
+    synced = {name: job[name] for name in RESULT_COUNTERS}
+    
+    async def sync_shared():
+        """Send this worker's new results, counter changes, links and acks to the coordinator"""
+        entries = job["scraped_urls"][:]
+        del job["scraped_urls"][:len(entries)]
+        delta = {name: job[name] - synced[name] for name in RESULT_COUNTERS}
+        synced.update({name: job[name] for name in RESULT_COUNTERS})
+        if entries or any(delta.values()):
+            await crawl_coordinator.add_results(job_id, entries, delta)
+        await frontier.flush()  # after the results, so an acked page always has its result
+    
+    async def page_done():
+        job["urls_pending"] = len(engine.frontier)
+        job_events.progress(job)
+        if shared:
+            await sync_shared()
+        elif job_id in crawl_jobs and job_store.due(job_id, engine.pages_done):
+            await job_store.checkpoint(job, engine)
+    
+    engine = CrawlEngine(
+        process_leased if shared else process_page,
+        frontier=frontier if frontier is not None else create_frontier(
+            job.get("strategy", "bfs"), capacity=job["max_urls"], dedup_mode=job["dedup_mode"], expected_urls=job["max_urls"]
+        ),
+        concurrency=job["concurrency"],
+        max_urls=job["max_urls"],
+        stop_event=stop_event,
+        on_page_done=page_done,
+        pages_done=pages_done,
+    )
+    if frontier is None:
+        engine.enqueue(job["seed_url"], 0)
+    if job.get("sitemaps") and not resume:
+        await seed_from_sitemaps(job, engine, scheduler)
+    crawl_engines[job_id] = engine
+    job_events.status(job)
+    if shared:
+        frontier.start()
+        completed = await engine.run()
+        await sync_shared()
+        await frontier.close()
+        await finish_shared_job(job, completed)
+        return
+    await job_store.checkpoint(job, engine)
+    
+    if not await engine.run():
+        if job_id in crawl_jobs:  # not deleted while stopping
+            job["status"] = "paused"
+            job["current_url"] = None
+            job_events.status(job)
+            await job_store.checkpoint(job, engine)
+            log.info(f"⏸️ Crawl job {job_id} paused after {engine.pages_done} pages")
+            if job.get("pause_reason") == "gemini_unavailable":
+                asyncio.create_task(resume_when_gemini_recovers(job_id))
+        return
+
     job["status"] = "completed"
     job["completed_at"] = datetime.now().isoformat()
     job["current_url"] = None
     job["urls_pending"] = 0
-    print(f"✅ Crawl job {job_id} completed: {job['urls_scraped']} URLs scraped")
+    crawl_engines.pop(job_id, None)
+    job_events.status(job)
+    await job_store.checkpoint(job, completed=True)
+    log.info(f"✅ Crawl job {job_id} completed: {job['urls_scraped']} URLs scraped")
+
+async def seed_from_sitemaps(job: dict, engine: CrawlEngine, scheduler: HostScheduler):
+    """Queue the seed site's sitemap URLs right behind the seed page"""
+    seed_url = job["seed_url"]
+    seed_host = urlparse(canonicalize_url(seed_url)).netloc
+    
+    def accept(url: str) -> bool:
+        if job["same_domain_only"] and urlparse(url).netloc != seed_host:
+            return False
+        return should_crawl_url(url, job["exclude_patterns"], job["include_patterns"])
+    
+    try:
+        sitemaps = await rate_limiter.sitemaps(seed_url) or well_known_sitemaps(seed_url)
+        urls = await collect_sitemap_urls(
+            http_clients.web, sitemaps, job["max_urls"], accept,
+            headers={"User-Agent": CRAWLER_USER_AGENT},
+            slot=scheduler.slot,
+        )
+    except Exception as e:
+        log.warning(f"⚠️ Sitemap discovery failed for {seed_url}: {e}")
+        return
+    
+    # One hop from the seed, so max_depth still bounds link-following from them.
+    # Best-first keeps the sitemap's own <priority> as part of the score; equal
+    # scores stay in the priority/lastmod order they are queued in.
+    scorer = get_link_scorer() if job.get("strategy") == "best_first" else None
+    added = 0
+    for url, priority in urls:
+        score = scorer.score(url, 1) + SITEMAP_PRIORITY_WEIGHT * priority if scorer else 0.0
+        added += engine.enqueue(url, 1, score)
+    job["urls_found"] += added
+    log.info(f"🗺️ Seeded {added} URLs from sitemaps for crawl job {job['id']}")
+
+async def finish_shared_job(job: dict, completed: bool):
+    """This worker is done with a shared job; the last one out marks it completed"""
+    job_id = job["id"]
+    joined_jobs.discard(job_id)
+    crawl_engines.pop(job_id, None)
+    crawl_jobs.pop(job_id, None)
+    crawl_locks.pop(job_id, None)
+    if completed:
+        finished_jobs[job_id] = job.get("resumed_at")
+        if await crawl_coordinator.finish(job_id):
+            log.info(f"✅ Shared crawl job {job_id} completed")
+    elif job.get("pause_reason") == "gemini_unavailable":
+        await crawl_coordinator.update_job(job_id, {
+            "status": "paused", "pause_reason": "gemini_unavailable", "error": job["error"], "current_url": None,
+        })
+        asyncio.create_task(resume_when_gemini_recovers(job_id))
 
 @app.post("/crawl/start")
 async def start_crawl(request: CrawlRequest):
@@ -702,7 +1522,7 @@ async def start_crawl(request: CrawlRequest):
     import uuid
     job_id = str(uuid.uuid4())[:8]
     
-    crawl_jobs[job_id] = {
+    job = {
         "id": job_id,
         "seed_url": str(request.seed_url),
         "status": "pending",
@@ -711,17 +1531,33 @@ async def start_crawl(request: CrawlRequest):
         "same_domain_only": request.same_domain_only,
         "include_patterns": request.include_patterns,
         "exclude_patterns": request.exclude_patterns,
+        "concurrency": max(1, min(request.concurrency, 32)),
+        "per_host_delay": max(0.0, request.per_host_delay or 0.0),
+        "dedup_mode": request.dedup_mode if request.dedup_mode in ("exact", "bloom") else "auto",
+        "near_duplicates": request.near_duplicates if request.near_duplicates in ("off", "global") else "job",
+        "sitemaps": request.sitemaps,
+        "strategy": "bfs" if request.strategy == "bfs" else "best_first",
         "urls_found": 1,
         "urls_scraped": 0,
         "urls_failed": 0,
+        "urls_duplicate": 0,
         "urls_pending": 1,
         "current_url": None,
         "started_at": None,
         "completed_at": None,
         "scraped_urls": [],
-        "error": None
+        "error": None,
+        "pause_reason": None
     }
     
+    if crawl_coordinator is not None:
+        # Other workers join through coordination_loop(); this one starts right away
+        job.update(status="running", started_at=datetime.now().isoformat())
+        await crawl_coordinator.create_job(job)
+        join_crawl_job(job, resume=False)  # only the starting worker reads the sitemaps
+        return {"job_id": job_id, "status": "started"}
+    
+    crawl_jobs[job_id] = job
     crawl_locks[job_id] = threading.Event()
     
     # Start background task
@@ -730,23 +1566,146 @@ async def start_crawl(request: CrawlRequest):
     return {"job_id": job_id, "status": "started"}
 
 @app.get("/crawl/jobs")
-async def list_crawl_jobs():
-    """List all crawl jobs"""
+async def list_crawl_jobs(summary: bool = False):
+    """List all crawl jobs (summary=true omits scraped_urls)"""
+    if crawl_coordinator is not None:
+        return await crawl_coordinator.list_jobs(with_results=not summary)
+    if summary:
+        return [job_summary(job) for job in crawl_jobs.values()]
     return list(crawl_jobs.values())
 
 @app.get("/crawl/jobs/{job_id}")
-async def get_crawl_job(job_id: str):
+async def get_crawl_job(job_id: str, summary: bool = False):
     """Get status of a specific crawl job"""
+    if crawl_coordinator is not None:
+        job = await crawl_coordinator.get_job(job_id, with_results=not summary)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+    job = crawl_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_summary(job) if summary else job
+
+@app.get("/crawl/jobs/{job_id}/results")
+async def get_crawl_job_results(job_id: str, after: int = -1, limit: int = 100):
+    """Page through a job's results; pass the returned next_after to continue"""
+    limit = max(1, min(limit, 1000))
+    if crawl_coordinator is not None:
+        job = await crawl_coordinator.get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        results, total = await crawl_coordinator.results(job_id, after, limit)
+        return {
+            "job_id": job_id,
+            "results": results,
+            "next_after": results[-1]["seq"] if results else after,
+            "has_more": bool(results) and results[-1]["seq"] + 1 < total,
+            "status": job["status"],
+        }
+    
+    job = crawl_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    start = max(after + 1, 0)
+    page = job["scraped_urls"][start:start + limit]
+    return {
+        "job_id": job_id,
+        "results": [{"seq": start + i, **entry} for i, entry in enumerate(page)],
+        "next_after": start + len(page) - 1 if page else after,
+        "has_more": start + len(page) < len(job["scraped_urls"]),
+        "status": job["status"],
+    }
+
+@app.get("/crawl/jobs/{job_id}/events")
+async def stream_crawl_job(job_id: str, request: Request, after: int = -1, format: str = "sse"):
+    """
+    Stream results after `after`, then live results, counter deltas and status
+    changes until the job stops. format=sse (default) or ndjson.
+    """
+    ndjson = format == "ndjson"
+    
+    def encode(event: dict) -> str:
+        return encode_event(event, ndjson)
+    
+    if crawl_coordinator is not None:
+        if not await crawl_coordinator.get_job(job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+        return StreamingResponse(
+            shared_job_events(job_id, request, after, encode),
+            media_type="application/x-ndjson" if ndjson else "text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    
     job = crawl_jobs.get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    return job
+    
+    async def events():
+        # Subscribe before the replay so nothing published in between is lost
+        queue = job_events.subscribe(job_id)
+        try:
+            replayed = len(job["scraped_urls"])
+            for seq in range(max(after + 1, 0), replayed):
+                yield encode({"type": "result", "seq": seq, "result": job["scraped_urls"][seq]})
+            yield encode({"type": "status", "status": job["status"], "counters": {name: job[name] for name in JOB_COUNTERS}})
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    yield "\n" if ndjson else ": keep-alive\n\n"
+                    continue
+                if event["type"] == "result" and event["seq"] < replayed:
+                    continue
+                yield encode(event)
+                if event["type"] == "lagged" or (event["type"] == "status" and event["status"] in TERMINAL_STATUSES):
+                    return
+        finally:
+            job_events.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson" if ndjson else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def shared_job_events(job_id: str, request: Request, after: int, encode):
+    """Event stream for a shared job, polled from the coordinator (workers may be in other processes)"""
+    last_counters = None
+    while not await request.is_disconnected():
+        results, _ = await crawl_coordinator.results(job_id, after, 500)
+        for entry in results:
+            after = entry.pop("seq")
+            yield encode({"type": "result", "seq": after, "result": entry})
+        job = await crawl_coordinator.get_job(job_id)
+        if job is None:
+            return
+        counters = {name: job[name] for name in JOB_COUNTERS}
+        if counters != last_counters:
+            if last_counters is None:
+                yield encode({"type": "status", "status": job["status"], "counters": counters})
+            else:
+                delta = {name: value - last_counters[name] for name, value in counters.items() if value != last_counters[name]}
+                yield encode({"type": "progress", "delta": delta, "counters": counters, "current_url": None})
+            last_counters = counters
+        if job["status"] in TERMINAL_STATUSES and len(results) < 500:
+            yield encode({"type": "status", "status": job["status"]})
+            return
+        if len(results) < 500:
+            await asyncio.sleep(COORDINATOR_POLL_SECONDS)
 
 @app.post("/crawl/jobs/{job_id}/stop")
 async def stop_crawl_job(job_id: str):
     """Stop a running crawl job"""
-    job = crawl_jobs.get(job_id)
-    if not job:
+    if crawl_coordinator is not None:
+        # Every worker sees the status change and stops leasing this job
+        if not await crawl_coordinator.update_job(job_id, {"status": "paused", "current_url": None}):
+            raise HTTPException(status_code=404, detail="Job not found")
+    elif job_id not in crawl_jobs:
         raise HTTPException(status_code=404, detail="Job not found")
     
     stop_event = crawl_locks.get(job_id)
@@ -755,9 +1714,33 @@ async def stop_crawl_job(job_id: str):
     
     return {"status": "stopping", "job_id": job_id}
 
+@app.post("/crawl/jobs/{job_id}/resume")
+async def resume_crawl_job(job_id: str):
+    """Resume a paused crawl job from its last checkpoint"""
+    job = await crawl_coordinator.get_job(job_id) if crawl_coordinator is not None else crawl_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "paused":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, only paused jobs can be resumed")
+    
+    if crawl_coordinator is not None:
+        await resume_shared_job(job_id)
+    else:
+        start_resume(job_id)
+    
+    return {"job_id": job_id, "status": "resumed"}
+
 @app.delete("/crawl/jobs/{job_id}")
 async def delete_crawl_job(job_id: str):
     """Delete a crawl job"""
+    if crawl_coordinator is not None and await crawl_coordinator.get_job(job_id):
+        await crawl_coordinator.delete_job(job_id)  # workers stop once their leases are gone
+        stop_event = crawl_locks.get(job_id)
+        if stop_event:
+            stop_event.set()
+        REGISTRY.remove(job=job_id)
+        return {"status": "deleted", "job_id": job_id}
+    
     if job_id in crawl_jobs:
         # Stop if running
         stop_event = crawl_locks.get(job_id)
@@ -767,34 +1750,108 @@ async def delete_crawl_job(job_id: str):
         del crawl_jobs[job_id]
         if job_id in crawl_locks:
             del crawl_locks[job_id]
+        crawl_engines.pop(job_id, None)
+        job_events.forget(job_id)
+        REGISTRY.remove(job=job_id)
+        await job_store.delete(job_id)
         
         return {"status": "deleted", "job_id": job_id}
     
     raise HTTPException(status_code=404, detail="Job not found")
 
+@app.get("/crawl/hosts")
+async def crawl_host_stats():
+    """Per-host pacing chosen by the rate limiter"""
+    return rate_limiter.stats()
+
 @app.get("/crawl/discover-links")
 async def discover_links(url: str, same_domain: bool = True):
     """Discover all links from a single URL (preview)"""
     try:
-        async with httpx.AsyncClient(timeout=15.0, follow_redirects=True) as client:
-            response = await client.get(url, headers={
-                "User-Agent": "Cymbiose-KB-Crawler/1.0"
-            })
-            response.raise_for_status()
-            
-            links = extract_links(response.text, url, same_domain)
-            
-            return {
-                "source_url": url,
-                "links_found": len(links),
-                "links": links[:100]  # Limit to first 100
-            }
+        client = http_clients.web
+        response = await stream_fetch(client, url, timeout=15.0, metrics_host="", headers={
+            "User-Agent": "Cymbiose-KB-Crawler/1.0"
+        })
+        response.raise_for_status()
+        
+        links = await parse_executor.run(parse_links, response.content, response.charset_encoding, url, same_domain)
+        
+        return {
+            "source_url": url,
+            "links_found": len(links),
+            "links": links[:100]  # Limit to first 100
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# ==================== DEBUG ENDPOINTS (profiling, request traces) ====================
+
+import hmac
+from fastapi import Depends, Header
+from fastapi.responses import PlainTextResponse
+from profiling import PROFILE_INTERVAL, ProfilerBusy, collapsed, profiler, top_functions
+
+# Debug endpoints don't exist unless this is set; requests then need it in X-Admin-Token
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+class TracingConfig(BaseModel):
+    enabled: bool
+
+@app.get("/debug/profile", dependencies=[Depends(require_admin)])
+async def capture_profile(seconds: float = 10.0, interval: float = PROFILE_INTERVAL, format: str = "collapsed", idle: bool = False):
+    """
+    Sample the whole process for `seconds` (capped by PROFILE_MAX_SECONDS).
+    format=collapsed (default) returns folded stacks for flamegraph.pl or
+    speedscope; format=json adds the hottest functions. Idle threads are
+    left out unless idle=true.
+    """
+    try:
+        profile = await asyncio.to_thread(profiler.capture, seconds, interval, idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    stacks = profile.pop("stacks")
+    if format != "json":
+        return PlainTextResponse(collapsed(stacks))
+    return {
+        **profile,
+        "samples": sum(stacks.values()),
+        "top": top_functions(stacks),
+        "stacks": [{"stack": stack, "count": count} for stack, count in stacks.most_common()],
+    }
+
+@app.get("/debug/traces", dependencies=[Depends(require_admin)])
+async def list_traces(limit: int = 50, kind: Optional[str] = None, url: Optional[str] = None, min_ms: float = 0):
+    """Recent /scrape and crawl page traces, newest first; min_ms keeps only slow ones"""
+    return {**TRACES.stats(), "traces": TRACES.recent(max(1, min(limit, 500)), kind=kind, url=url, min_ms=min_ms)}
+
+@app.get("/debug/traces/{trace_id}", dependencies=[Depends(require_admin)])
+async def get_trace(trace_id: str):
+    trace = TRACES.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+@app.put("/debug/tracing", dependencies=[Depends(require_admin)])
+async def set_tracing(config: TracingConfig):
+    """Turn request tracing on or off without a restart"""
+    TRACES.enabled = config.enabled
+    log.info(f"🧵 Request tracing {'enabled' if config.enabled else 'disabled'}")
+    return TRACES.stats()
+
+@app.delete("/debug/traces", dependencies=[Depends(require_admin)])
+async def clear_traces():
+    TRACES.clear()
+    return TRACES.stats()
+
 if __name__ == "__main__":
     import uvicorn
-    print("🚀 Starting Cymbiose KB Crawler on http://localhost:8001")
-    print(f"🔑 Gemini API: {'Configured' if GEMINI_API_KEY else 'Not configured'}")
-    print("🕷️ Auto-Crawler: Enabled")
+    log.info("🚀 Starting Cymbiose KB Crawler on http://localhost:8001")
+    log.info(f"🔑 Gemini API: {'Configured' if GEMINI_API_KEY else 'Not configured'}")
+    log.info("🕷️ Auto-Crawler: Enabled")
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,222 @@
+"""
+Pipeline metrics in Prometheus text format
+Counters, gauges and histograms with labels, kept in-process (no client
+library needed) and rendered by GET /metrics. Components that already
+keep their own counters (caches, Gemini client, pools) are exported via
+collectors that read their stats() at scrape time, so they cost nothing
+on the hot path.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from tracing import record_span
+
+# Seconds: 1 ms .. 60 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Bytes: 256 B .. 16 MiB in powers of four
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(9))
+
+# (labels, value) pairs yielded by collectors
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def remove(self, **labels):
+        """Drop every series whose labels match (e.g. job=<id> once a job is deleted)"""
+        positions = [(self.labels.index(name), str(value)) for name, value in labels.items() if name in self.labels]
+        if not positions:
+            return
+        with self._lock:
+            for key in [key for key in self._values if all(key[i] == value for i, value in positions)]:
+                del self._values[key]
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)  # per-bucket counts, then sum and count
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._values.items()]
+        for key, series in items:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, series[-1]
+            yield f"{self.name}_sum", labels, series[-2]
+            yield f"{self.name}_count", labels, series[-1]
+
+
+class MetricsRegistry:
+    """Named metrics plus collectors; render() produces the Prometheus exposition text"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        """`collector()` yields (name, kind, help, [(labels, value), ...]) when /metrics is scraped"""
+        self._collectors.append(collector)
+
+    def remove(self, **labels):
+        """Drop matching series from every metric"""
+        for metric in self._metrics.values():
+            metric.remove(**labels)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:  # a broken collector must not break the scrape
+                families = [("crawler_collector_errors", "gauge", f"Collector failed: {type(e).__name__}", [({}, 1)])]
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "crawler_stage_duration_seconds", "Latency of each pipeline stage", ["stage"]
+)
+STAGE_BYTES = REGISTRY.histogram(
+    "crawler_stage_bytes", "Input size handled by each pipeline stage", ["stage"], buckets=SIZE_BUCKETS
+)
+PAGES = REGISTRY.counter(
+    "crawler_pages_total", "Pages processed, by outcome (scraped, rejected, duplicate, failed, robots_blocked)",
+    ["job", "host", "outcome"],
+)
+ERRORS = REGISTRY.counter("crawler_errors_total", "Errors by pipeline stage and host", ["stage", "host"])
+LLM_TOKENS = REGISTRY.counter("crawler_llm_tokens_total", "Gemini tokens reported by the API", ["kind"])
+IN_FLIGHT = REGISTRY.gauge("crawler_in_flight", "Operations currently in progress", ["kind"])
+
+
+def observe_stage(stage: str, seconds: float, size: Optional[int] = None, ended: Optional[float] = None):
+    """Record one run of `stage`; also a span of the current trace, if any (`ended` is its perf_counter end)"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if size is not None:
+        STAGE_BYTES.observe(size, stage=stage)
+    record_span(stage, seconds, size, ended)
+
+
+@contextmanager
+def stage_timer(stage: str, size: Optional[int] = None):
+    """Time a block as one observation of `stage`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started, size)
+
+
+def counters_family(name: str, help: str, label: str, counters: Dict[str, float], kind: str = "counter"):
+    """One collector family from a component's counters dict (numeric values only)"""
+    return name, kind, help, [
+        ({label: key}, value) for key, value in counters.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    ]
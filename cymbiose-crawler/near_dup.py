@@ -0,0 +1,145 @@
+"""
+Near-duplicate page detection
+64-bit SimHash fingerprints over word shingles of a page's text, and a
+banded index that finds any stored fingerprint within a few bits. Print
+views, paginated copies and syndicated articles land within that distance.
+"""
+import hashlib
+import os
+import re
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+NEAR_DUP_DISTANCE = int(os.getenv("NEAR_DUP_DISTANCE", "3"))
+NEAR_DUP_GLOBAL_ITEMS = int(os.getenv("NEAR_DUP_GLOBAL_ITEMS", "100000"))
+
+# Pages with fewer shingles than this are too short to fingerprint reliably
+MIN_SHINGLES = 40
+SHINGLE_WORDS = 3
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def simhash(text: str, shingle_words: int = SHINGLE_WORDS) -> Optional[int]:
+    """64-bit SimHash of the text's distinct word shingles, or None for short text"""
+    words = _WORD.findall(text.lower())
+    shingles = {" ".join(words[i:i + shingle_words]) for i in range(max(0, len(words) - shingle_words + 1))}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+
+    votes = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            votes[bit] += 1 if h >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, vote in enumerate(votes):
+        if vote > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """
+    Fingerprint -> value lookup within `max_distance` bits.
+    The 64 bits are split into max_distance + 1 bands; by pigeonhole any match
+    shares at least one band exactly, so only same-band candidates are compared.
+    `max_items` (optional) evicts the oldest fingerprints first.
+    """
+
+    def __init__(self, max_distance: int = NEAR_DUP_DISTANCE, max_items: Optional[int] = None):
+        self.max_distance = max_distance
+        self.max_items = max_items
+        bands = max_distance + 1
+        width = 64 // bands
+        self._bands: List[Tuple[int, int]] = [
+            (i * width, (64 - i * width) if i == bands - 1 else width) for i in range(bands)
+        ]
+        self._buckets: Dict[Tuple[int, int], List[int]] = {}
+        self._values: Dict[int, Any] = {}
+        self._order = deque()
+
+    def _keys(self, fingerprint: int):
+        for i, (shift, width) in enumerate(self._bands):
+            yield i, (fingerprint >> shift) & ((1 << width) - 1)
+
+    def find(self, fingerprint: int) -> Optional[Any]:
+        """Value of the closest stored fingerprint within max_distance, or None"""
+        if fingerprint in self._values:
+            return self._values[fingerprint]
+        best, best_distance = None, self.max_distance + 1
+        for key in self._keys(fingerprint):
+            for candidate in self._buckets.get(key, ()):
+                distance = hamming(candidate, fingerprint)
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+        return self._values[best] if best is not None else None
+
+    def add(self, fingerprint: int, value: Any):
+        if fingerprint in self._values:
+            return
+        self._values[fingerprint] = value
+        for key in self._keys(fingerprint):
+            self._buckets.setdefault(key, []).append(fingerprint)
+        self._order.append(fingerprint)
+        if self.max_items is not None and len(self._order) > self.max_items:
+            self._remove(self._order.popleft())
+
+    def _remove(self, fingerprint: int):
+        self._values.pop(fingerprint, None)
+        for key in self._keys(fingerprint):
+            bucket = self._buckets.get(key)
+            if bucket:
+                bucket.remove(fingerprint)
+                if not bucket:
+                    del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class NearDuplicateDetector:
+    """A job's own index, optionally backed by an index shared across jobs"""
+
+    def __init__(self, shared: Optional[SimHashIndex] = None):
+        self.local = SimHashIndex()
+        self.shared = shared
+
+    def find(self, fingerprint: Optional[int]) -> Optional[Any]:
+        if fingerprint is None:
+            return None
+        match = self.local.find(fingerprint)
+        if match is None and self.shared is not None:
+            match = self.shared.find(fingerprint)
+        return match
+
+    def add(self, fingerprint: Optional[int], value: Any):
+        if fingerprint is None:
+            return
+        self.local.add(fingerprint, value)
+        if self.shared is not None:
+            self.shared.add(fingerprint, value)
+
+
+def screening_from_result(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild a screening result from a crawl result entry, for a duplicate to inherit"""
+    if entry.get("rejected"):
+        return {
+            "approved": False,
+            "reason": entry.get("rejection_reason", ""),
+            "flags": entry.get("flags", []),
+        }
+    return {
+        "approved": True,
+        "reason": entry.get("ai_screening_reason", ""),
+        "flags": entry.get("flags", []),
+        "quality_score": entry.get("quality_score", 3),
+        "cultural_diversity_score": entry.get("cultural_diversity_score", 3),
+        "demographics_covered": entry.get("demographics_covered", []),
+        "suggested_tags": entry.get("suggested_tags", {}),
+    }
@@ -0,0 +1,161 @@
+"""
+HTTP conditional-request page cache
+Stores fetched HTML with its headers and validators (ETag / Last-Modified).
+Refetches send If-None-Match / If-Modified-Since; on 304 the stored body and
+any derived results (markdown, chunks, tags, screening) are reused as-is.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from fetcher import stream_fetch
+from log import get_logger
+
+log = get_logger(__name__)
+
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", "cache/page_cache.sqlite3")  # "" disables the cache
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", str(90 * 24 * 3600)))
+
+
+class PageCache:
+    """SQLite-backed store of page bodies, validators and derived results"""
+
+    def __init__(self, path: str = PAGE_CACHE_PATH, ttl: float = PAGE_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.counters = {"conditional_requests": 0, "not_modified": 0, "stored": 0, "derived_hits": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, headers TEXT NOT NULL, "
+                "body BLOB NOT NULL, derived TEXT NOT NULL DEFAULT '{}', fetched_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT etag, last_modified, headers, body, derived, fetched_at FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None or time.time() - row[5] > self.ttl:
+            return None
+        return {
+            "url": url,
+            "etag": row[0],
+            "last_modified": row[1],
+            "headers": json.loads(row[2]),
+            "body": zlib.decompress(row[3]),
+            "derived": json.loads(row[4]),
+        }
+
+    def _store(self, url: str, etag: Optional[str], last_modified: Optional[str], headers: Dict[str, str], body: bytes):
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, headers, body, derived, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, '{}', ?)",
+                (url, etag, last_modified, json.dumps(headers), zlib.compress(body), time.time()),
+            )
+            db.commit()
+
+    def _touch(self, url: str):
+        with self._db_lock:
+            db = self._connect()
+            db.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            db.commit()
+
+    def _set_derived(self, url: str, kind: str, value: Any):
+        with self._db_lock:
+            db = self._connect()
+            row = db.execute("SELECT derived FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return
+            derived = json.loads(row[0])
+            derived[kind] = value
+            db.execute("UPDATE pages SET derived = ? WHERE url = ?", (json.dumps(derived), url))
+            db.commit()
+
+    async def fetch(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 30.0,
+        **fetch_options,
+    ) -> Tuple[httpx.Response, Optional[Dict[str, Any]]]:
+        """
+        Streaming GET (see fetcher.stream_fetch) with validators from the stored copy.
+        Returns (response, page): on 304 `page` is the stored entry and `response`
+        is rebuilt from it as a 200, so callers can treat both paths alike.
+        """
+        if not self.path:
+            return await stream_fetch(client, url, headers=headers, timeout=timeout, **fetch_options), None
+
+        page = await asyncio.to_thread(self._lookup, url)
+        request_headers = dict(headers or {})
+        if page:
+            if page["etag"]:
+                request_headers["If-None-Match"] = page["etag"]
+            if page["last_modified"]:
+                request_headers["If-Modified-Since"] = page["last_modified"]
+            # A conditional request must not be short-circuited by intermediaries
+            request_headers.pop("Cache-Control", None)
+            self.counters["conditional_requests"] += 1
+
+        response = await stream_fetch(client, url, headers=request_headers, timeout=timeout, **fetch_options)
+
+        if response.status_code == 304 and page:
+            self.counters["not_modified"] += 1
+            await asyncio.to_thread(self._touch, url)
+            log.info(f"♻️ Not modified: {url}")
+            cached = httpx.Response(200, headers=page["headers"], content=page["body"], request=response.request)
+            return cached, page
+
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if response.status_code == 200 and not response.extensions.get("body_skipped") and (etag or last_modified):
+            stored_headers = dict(response.headers.items())
+            await asyncio.to_thread(self._store, url, etag, last_modified, stored_headers, response.content)
+            self.counters["stored"] += 1
+        return response, None
+
+    def derived(self, page: Optional[Dict[str, Any]], kind: str) -> Optional[Any]:
+        """Derived result of `kind` saved alongside an unchanged page"""
+        if not page:
+            return None
+        value = page["derived"].get(kind)
+        if value is not None:
+            self.counters["derived_hits"] += 1
+        return value
+
+    async def set_derived(self, url: str, kind: str, value: Any):
+        """Attach a derived result to the stored copy of `url` (no-op if not stored)"""
+        if self.path:
+            await asyncio.to_thread(self._set_derived, url, kind, value)
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "enabled": bool(self.path)}
@@ -0,0 +1,114 @@
+"""
+On-demand sampling profiler
+Samples every thread's Python stack from a helper thread for a bounded
+number of seconds and folds the samples into collapsed stacks
+("thread;outer;...;inner count"), the input format of flamegraph.pl,
+speedscope and inferno. Nothing runs between captures. Parse workers in
+the process pool are separate processes and are not sampled.
+"""
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+from log import get_logger
+
+log = get_logger(__name__)
+
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # 200 samples/s
+
+_STDLIB = sysconfig.get_paths()["stdlib"]
+# Threads parked in one of these stdlib calls are waiting, not working
+IDLE_FUNCTIONS = {"select", "poll", "wait", "get", "_worker", "sleep", "accept", "_wait_for_tstate_lock"}
+
+
+class ProfilerBusy(Exception):
+    """Another capture is already running"""
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+
+def _is_idle(frame) -> bool:
+    return frame.f_code.co_name in IDLE_FUNCTIONS and frame.f_code.co_filename.startswith(_STDLIB)
+
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {"captures": 0, "samples": 0}
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def capture(self, seconds: float, interval: float = PROFILE_INTERVAL, include_idle: bool = False) -> Dict[str, Any]:
+        """
+        Sample for `seconds` (blocking; run it in a thread). Returns the
+        folded stack counts plus the number of sampling rounds taken.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already being captured")
+        try:
+            seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+            interval = max(interval, 0.001)
+            log.info(f"🔬 Profiling for {seconds:.1f}s every {interval * 1000:.1f}ms")
+            me = threading.get_ident()
+            stacks: Counter = Counter()
+            rounds = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me or (not include_idle and _is_idle(frame)):
+                        continue
+                    stacks[f"{names.get(ident, ident)};{_fold(frame)}"] += 1
+                rounds += 1
+                time.sleep(interval)
+            self.counters["captures"] += 1
+            self.counters["samples"] += rounds
+            return {"seconds": seconds, "interval": interval, "rounds": rounds, "stacks": stacks}
+        finally:
+            self._lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "busy": self.busy}
+
+
+def collapsed(stacks: Counter) -> str:
+    """Brendan Gregg's folded format, one "stack count" line per stack"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_functions(stacks: Counter, limit: int = 30) -> List[Dict[str, Any]]:
+    """Frames by self samples (innermost) and total samples (anywhere on the stack)"""
+    own: Counter = Counter()
+    total: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")[1:]  # drop the thread name
+        if not frames:
+            continue
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return [
+        {"frame": frame, "self": own[frame], "total": total[frame]}
+        for frame, _ in sorted(total.items(), key=lambda item: (own[item[0]], item[1]), reverse=True)[:limit]
+    ]
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,212 @@
+"""
+Per-domain rate limiting for the crawler
+Caches robots.txt per host (Crawl-delay, Request-rate, Disallow) and paces
+requests with an adaptive token bucket shared by every crawl job
+"""
+import asyncio
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+from log import get_logger
+
+log = get_logger(__name__)
+
+# Sent with every crawl request, robots.txt included; robots rules match its product token
+CRAWLER_USER_AGENT = "Cymbiose-KB-Crawler/1.0 (Clinical Knowledge Base Builder)"
+ROBOTS_TTL = float(os.getenv("ROBOTS_TTL", "3600"))
+ROBOTS_ERROR_TTL = 300.0
+
+# Default pace for hosts that don't publish a Crawl-delay
+DEFAULT_HOST_RATE = float(os.getenv("DEFAULT_HOST_RATE", "2.0"))  # requests/second
+MIN_HOST_RATE = 1.0 / 60
+MAX_HOST_RATE = float(os.getenv("MAX_HOST_RATE", "8.0"))
+SLOW_RESPONSE_SECONDS = float(os.getenv("SLOW_RESPONSE_SECONDS", "3.0"))
+
+
+class TokenBucket:
+    """Async token bucket; `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """Take `amount` tokens (capped at capacity), waiting for them if needed"""
+        amount = min(amount, self.capacity)
+        # Holding the lock while sleeping keeps waiters in FIFO order
+        async with self._lock:
+            pause = self.blocked_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            self._refill()
+            if self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def debit(self, amount: float):
+        """Correct an estimate after the fact; a negative balance delays later acquires"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class _HostPolicy:
+    def __init__(self):
+        self.robots: Optional[RobotFileParser] = None
+        self.robots_expires = 0.0
+        self.robots_lock = asyncio.Lock()
+        self.ceiling = min(DEFAULT_HOST_RATE, MAX_HOST_RATE)
+        self.bucket = TokenBucket(self.ceiling, capacity=max(1.0, self.ceiling))
+        self.latency = 0.0  # EWMA of response time
+        self.throttled = 0
+        self.requests = 0
+
+
+class DomainRateLimiter:
+    """
+    Shared per-host politeness:
+    - robots.txt is fetched once per host and cached for ROBOTS_TTL
+    - Crawl-delay / Request-rate cap the host's request rate
+    - 429/503, timeouts and connection errors halve the rate (honoring
+      Retry-After); slow responses shrink it, healthy responses let it
+      recover towards the ceiling
+    """
+
+    def __init__(self, clients, user_agent: str = CRAWLER_USER_AGENT):
+        self.clients = clients
+        self.user_agent = user_agent
+        self._hosts: Dict[str, _HostPolicy] = {}
+
+    def _policy(self, url: str) -> _HostPolicy:
+        host = urlparse(url).netloc.lower()
+        policy = self._hosts.get(host)
+        if policy is None:
+            policy = self._hosts[host] = _HostPolicy()
+        return policy
+
+    async def _load_robots(self, url: str, policy: _HostPolicy):
+        async with policy.robots_lock:
+            if policy.robots is not None and time.monotonic() < policy.robots_expires:
+                return
+
+            parsed = urlparse(url)
+            robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+            parser = RobotFileParser(robots_url)
+            ttl = ROBOTS_TTL
+            try:
+                # Some hosts serve different rules (or a 403) to unknown agents
+                response = await self.clients.web.get(robots_url, timeout=10.0, headers={"User-Agent": self.user_agent})
+                if response.status_code in (401, 403):
+                    parser.disallow_all = True
+                elif response.status_code >= 400:
+                    parser.allow_all = True
+                else:
+                    parser.parse(response.text.splitlines())
+            except Exception as e:
+                log.warning(f"⚠️ robots.txt unavailable for {parsed.netloc}: {e}")
+                parser.allow_all = True
+                ttl = ROBOTS_ERROR_TTL
+
+            policy.robots = parser
+            policy.robots_expires = time.monotonic() + ttl
+            self._apply_robots_rate(policy, parser)
+
+    def _apply_robots_rate(self, policy: _HostPolicy, parser: RobotFileParser):
+        ceiling = min(DEFAULT_HOST_RATE, MAX_HOST_RATE)
+        delay = parser.crawl_delay(self.user_agent)
+        if delay:
+            ceiling = min(ceiling, 1.0 / float(delay))
+        request_rate = parser.request_rate(self.user_agent)
+        if request_rate and request_rate.seconds:
+            ceiling = min(ceiling, request_rate.requests / request_rate.seconds)
+        policy.ceiling = max(MIN_HOST_RATE, ceiling)
+        policy.bucket.rate = min(policy.bucket.rate, policy.ceiling)
+        policy.bucket.capacity = max(1.0, policy.ceiling)
+
+    async def allowed(self, url: str) -> bool:
+        """Whether robots.txt permits fetching this URL"""
+        policy = self._policy(url)
+        await self._load_robots(url, policy)
+        return policy.robots.can_fetch(self.user_agent, url)
+
+    async def sitemaps(self, url: str) -> List[str]:
+        """Sitemap URLs listed in the host's robots.txt"""
+        policy = self._policy(url)
+        await self._load_robots(url, policy)
+        return policy.robots.site_maps() or []
+
+    async def acquire(self, url: str):
+        """Wait for the host's next request token"""
+        policy = self._policy(url)
+        await self._load_robots(url, policy)
+        policy.requests += 1
+        await policy.bucket.acquire()
+
+    def record(self, url: str, status_code: int, latency: float, retry_after: Optional[str] = None):
+        """Adapt the host's rate to the outcome of a request"""
+        policy = self._policy(url)
+        bucket = policy.bucket
+        policy.latency = latency if policy.latency == 0 else 0.8 * policy.latency + 0.2 * latency
+
+        if status_code in (429, 503):
+            self._throttle(url, policy, str(status_code), retry_after)
+        elif policy.latency > SLOW_RESPONSE_SECONDS:
+            bucket.rate = max(MIN_HOST_RATE, bucket.rate * 0.8)
+        elif status_code < 400:
+            # Additive recovery towards the robots/default ceiling
+            bucket.rate = min(policy.ceiling, bucket.rate + policy.ceiling * 0.1)
+
+    def record_error(self, url: str, latency: float, error: Exception):
+        """A timeout or connection failure: back off as if the host had answered 503"""
+        policy = self._policy(url)
+        policy.latency = latency if policy.latency == 0 else 0.8 * policy.latency + 0.2 * latency
+        self._throttle(url, policy, type(error).__name__)
+
+    def _throttle(self, url: str, policy: _HostPolicy, reason: str, retry_after: Optional[str] = None):
+        bucket = policy.bucket
+        policy.throttled += 1
+        bucket.rate = max(MIN_HOST_RATE, bucket.rate / 2)
+        pause = parse_retry_after(retry_after) or 1.0 / bucket.rate
+        bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + pause)
+        log.warning(f"🐢 {urlparse(url).netloc} throttled ({reason}), rate now {bucket.rate:.2f}/s")
+
+    def stats(self) -> Dict[str, dict]:
+        """Current pacing per host"""
+        return {
+            host: {
+                "rate": round(policy.bucket.rate, 3),
+                "ceiling": round(policy.ceiling, 3),
+                "latency_ewma": round(policy.latency, 3),
+                "requests": policy.requests,
+                "throttled": policy.throttled,
+                "robots_cached": policy.robots is not None,
+            }
+            for host, policy in self._hosts.items()
+        }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header (delta-seconds or HTTP-date) as seconds from now"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
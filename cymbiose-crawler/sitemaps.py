@@ -0,0 +1,181 @@
+"""
+Sitemap discovery for crawl seeding
+Finds a site's sitemaps (robots.txt Sitemap: lines, else well-known paths)
+and stream-parses sitemaps and sitemap indexes, gzipped or not, as the
+body arrives. Only the best `limit` page URLs by priority and lastmod are
+kept, so memory stays bounded on sites with millions of URLs.
+"""
+import heapq
+import os
+import zlib
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+import httpx
+
+from frontier import canonicalize_url
+from log import get_logger
+
+log = get_logger(__name__)
+
+SITEMAP_MAX_FILES = int(os.getenv("SITEMAP_MAX_FILES", "50"))  # sitemap files fetched per crawl, indexes included
+SITEMAP_MAX_BYTES = int(os.getenv("SITEMAP_MAX_BYTES", str(50 * 1024 * 1024)))  # per file, uncompressed (the protocol's limit)
+SITEMAP_PATHS = ("/sitemap.xml", "/sitemap_index.xml", "/sitemap-index.xml")
+# Best-first crawls add this times a URL's <priority> (0-1) to its link score
+SITEMAP_PRIORITY_WEIGHT = float(os.getenv("SITEMAP_PRIORITY_WEIGHT", "1.0"))
+
+DEFAULT_PRIORITY = 0.5  # per the sitemap protocol
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def well_known_sitemaps(seed_url: str) -> List[str]:
+    parts = urlsplit(seed_url)
+    return [f"{parts.scheme}://{parts.netloc}{path}" for path in SITEMAP_PATHS]
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _lastmod_key(value: Optional[str]) -> float:
+    """W3C datetime (or plain date) as a timestamp; 0 when missing or malformed"""
+    if not value:
+        return 0.0
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return 0.0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _priority(value: Optional[str]) -> float:
+    try:
+        return min(1.0, max(0.0, float(value))) if value else DEFAULT_PRIORITY
+    except ValueError:
+        return DEFAULT_PRIORITY
+
+
+async def iter_sitemap(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 30.0,
+    max_bytes: int = SITEMAP_MAX_BYTES,
+) -> AsyncIterator[Tuple[str, str, Optional[str], Optional[str]]]:
+    """
+    (kind, loc, lastmod, priority) for each <url> ("url") or <sitemap>
+    ("sitemap") entry, parsed incrementally. Gzipped files are inflated on
+    the fly; a missing, corrupt or malformed file just ends the iteration.
+    """
+    parser = XMLPullParser(events=("start", "end"))
+    root = None
+    fields: Dict[str, str] = {}
+    async with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+        if response.status_code != 200:
+            return
+        gunzip = None
+        size = 0
+        async for chunk in response.aiter_bytes():
+            if gunzip is None:
+                # .xml.gz files are served as-is (httpx only decodes Content-Encoding)
+                gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk.startswith(GZIP_MAGIC) else False
+            if gunzip:
+                try:
+                    chunk = gunzip.decompress(chunk, max_bytes - size + 1)
+                except zlib.error as e:
+                    log.warning(f"⚠️ Corrupt gzipped sitemap {url}: {e}")
+                    return
+            size += len(chunk)
+            truncated = size > max_bytes
+            if truncated:
+                # Keep the entries that fit; the cut-off one never completes
+                chunk = chunk[:len(chunk) - (size - max_bytes)]
+                log.info(f"✂️ Truncated sitemap {url} at {max_bytes} bytes")
+            try:
+                parser.feed(chunk)
+                for event, element in parser.read_events():
+                    if event == "start":
+                        root = element if root is None else root
+                        continue
+                    name = _local_name(element.tag)
+                    if name in ("loc", "lastmod", "priority"):
+                        fields[name] = (element.text or "").strip()
+                    elif name in ("url", "sitemap"):
+                        if fields.get("loc"):
+                            yield name, fields["loc"], fields.get("lastmod"), fields.get("priority")
+                        fields = {}
+                        root.clear()  # drop finished entries; the tree never grows
+            except ParseError as e:
+                log.warning(f"⚠️ Malformed sitemap {url}: {e}")
+                return
+            if truncated:
+                return
+
+
+async def collect_sitemap_urls(
+    client: httpx.AsyncClient,
+    sitemaps: List[str],
+    limit: int,
+    accept: Callable[[str], bool],
+    headers: Optional[Dict[str, str]] = None,
+    slot: Optional[Callable] = None,
+    max_files: int = SITEMAP_MAX_FILES,
+) -> List[Tuple[str, float]]:
+    """
+    (url, priority) for the `limit` best accepted page URLs across `sitemaps`
+    and the sitemap indexes they reference, highest priority then newest
+    lastmod first.
+    Child sitemaps are read newest first until `max_files` have been
+    fetched. `slot(url)` (e.g. HostScheduler.slot) paces each fetch.
+    """
+    if limit <= 0:
+        return []
+    best: List[Tuple[float, float, int, str]] = []  # min-heap of the current top `limit`
+    kept: Dict[str, None] = {}
+    pending = deque(dict.fromkeys(sitemaps))
+    visited = set()
+    order = 0
+
+    while pending and len(visited) < max_files:
+        sitemap_url = pending.popleft()
+        if sitemap_url in visited:
+            continue
+        visited.add(sitemap_url)
+        children = []
+        try:
+            async with slot(sitemap_url) if slot else nullcontext():
+                async for kind, loc, lastmod, priority in iter_sitemap(client, sitemap_url, headers=headers):
+                    if kind == "sitemap":
+                        children.append((_lastmod_key(lastmod), loc))
+                        continue
+                    try:
+                        url = canonicalize_url(loc)
+                    except ValueError:
+                        continue
+                    if url in kept or urlsplit(url).scheme not in ("http", "https") or not accept(url):
+                        continue
+                    # Earlier entries win ties, so files without priority/lastmod keep their own order
+                    order += 1
+                    entry = (_priority(priority), _lastmod_key(lastmod), -order, url)
+                    if len(best) < limit:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        kept.pop(heapq.heapreplace(best, entry)[3], None)
+                    else:
+                        continue
+                    kept[url] = None
+        except httpx.HTTPError as e:
+            log.warning(f"⚠️ Sitemap unavailable {sitemap_url}: {e}")
+        except (zlib.error, EOFError, ParseError, UnicodeDecodeError) as e:
+            # One bad file must not cost the other files; what it yielded so far is kept
+            log.warning(f"⚠️ Unreadable sitemap {sitemap_url}: {e}")
+        children.sort(reverse=True)
+        pending.extend(loc for _, loc in children)
+
+    return [(url, priority) for priority, _, _, url in sorted(best, reverse=True)]
@@ -0,0 +1,44 @@
+"""Chunk size limits hold by the counter's own count, including for text without spaces"""
+import pytest
+
+from chunking import get_token_counter, iter_chunks
+
+MAX_TOKENS = 500
+
+
+@pytest.mark.parametrize("text", [
+    "中文测试" * 300,
+    "日本語のテキスト、" * 500 + " plain words here. " * 100,
+    "|" + "-" * 5000 + "|",
+    "=-*" * 3000,
+    "ÀÉÎ" * 2000,
+    "a" * 10000,
+], ids=["cjk", "cjk-mixed", "table-rule", "symbols", "accented", "long-word"])
+def test_bpe_chunks_stay_within_max_tokens(text):
+    counter = get_token_counter("bpe")
+    chunks = list(iter_chunks(text, MAX_TOKENS, counter=counter))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["token_estimate"] <= MAX_TOKENS
+        assert counter.count(chunk["content"]) <= MAX_TOKENS
+
+
+def test_bpe_split_keeps_all_text():
+    counter = get_token_counter("bpe")
+    text = "中文测试" * 300
+    assert "".join(counter.split(text, MAX_TOKENS)) == text
+
+
+@pytest.mark.parametrize("text", [
+    "abcdefg\n" * 500,
+    "abc\n" * 2000,
+    "Short sentence here. " * 400,
+    "a" * 10000,
+], ids=["short-lines", "tiny-lines", "sentences", "long-word"])
+def test_heuristic_chunks_stay_within_max_tokens(text):
+    counter = get_token_counter("heuristic")
+    chunks = list(iter_chunks(text, 100, counter=counter))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["token_estimate"] == counter.count(chunk["content"])
+        assert chunk["token_estimate"] <= 100
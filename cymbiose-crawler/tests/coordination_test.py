@@ -0,0 +1,79 @@
+"""SQLite coordinator: shared frontier ordering, leases and their expiry"""
+import pytest
+
+from coordination import SQLiteCoordinator
+
+
+@pytest.fixture
+def coordinator(tmp_path):
+    coordinator = SQLiteCoordinator(str(tmp_path / "coordinator.sqlite3"))
+    yield coordinator
+    coordinator.close()
+
+
+def _job(job_id: str = "job", max_urls: int = 100):
+    return {"id": job_id, "seed_url": "http://example.com/", "status": "running", "max_urls": max_urls}
+
+
+def test_lease_is_best_first_and_fifo_among_ties(coordinator):
+    coordinator._create_job(_job())
+    coordinator._push("job", [
+        ("http://example.com/low", 1, -1.0),
+        ("http://example.com/tie-a", 1, 0.0),
+        ("http://example.com/high", 1, 2.0),
+        ("http://example.com/tie-b", 1, 0.0),
+    ])
+    leased = [url for url, _ in coordinator._lease("job", "w1", 10, 60)]
+    assert leased == [
+        "http://example.com/high",
+        "http://example.com",  # the seed, score 0, pushed first
+        "http://example.com/tie-a",
+        "http://example.com/tie-b",
+        "http://example.com/low",
+    ]
+
+
+def test_released_urls_are_leased_before_higher_scores(coordinator):
+    coordinator._create_job(_job())
+    coordinator._lease("job", "w1", 1, 60)  # the seed
+    coordinator._push("job", [("http://example.com/high", 1, 5.0)])
+    coordinator._release("job", "w1", [("http://example.com", 0)])
+    assert coordinator._lease("job", "w2", 1, 60) == [("http://example.com", 0)]
+
+
+def test_expired_leases_are_reclaimed(coordinator):
+    coordinator._create_job(_job())
+    assert coordinator._lease("job", "crashed", 1, -1) == [("http://example.com", 0)]  # already expired
+    assert coordinator._lease("job", "w2", 1, 60) == [("http://example.com", 0)]
+    # The crashed worker's late ack no longer matches its lease
+    coordinator._complete("job", "crashed", [("http://example.com", 0)])
+    assert coordinator._frontier_counts("job")["leased"] == 1
+    coordinator._complete("job", "w2", [("http://example.com", 0)])
+    assert coordinator._frontier_counts("job")["leased"] == 0
+
+
+def test_heartbeat_keeps_leases_alive(coordinator):
+    coordinator._create_job(_job())
+    coordinator._lease("job", "w1", 1, -1)
+    assert coordinator._heartbeat("job", "w1", [("http://example.com", 0)], 60) == 1
+    assert coordinator._lease("job", "w2", 1, 60) == []
+
+
+def test_lease_respects_budget_and_finish(coordinator):
+    coordinator._create_job(_job(max_urls=2))
+    coordinator._push("job", [(f"http://example.com/{i}", 1, 0.0) for i in range(5)])
+    leased = coordinator._lease("job", "w1", 10, 60)
+    assert len(leased) == 2
+    assert coordinator._lease("job", "w2", 10, 60) == []
+    assert not coordinator._finish("job")  # leases still out
+    coordinator._complete("job", "w1", leased)
+    assert coordinator._finish("job")
+    assert coordinator._get_job("job", False)["status"] == "completed"
+    assert coordinator._lease("job", "w1", 10, 60) == []
+
+
+def test_push_dedups_and_counts(coordinator):
+    coordinator._create_job(_job())
+    assert coordinator._push("job", [("http://example.com/a", 1, 0.0), ("http://example.com", 1, 0.0)]) == 1
+    assert coordinator._get_job("job", False)["urls_found"] == 2
+    assert coordinator._push("missing", [("http://example.com/a", 1, 0.0)]) == 0
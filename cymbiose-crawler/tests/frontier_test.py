@@ -0,0 +1,98 @@
+"""URL canonicalization and enqueue-time dedup"""
+import pytest
+
+from frontier import BloomFilter, CrawlFrontier, SeenSet, canonicalize_url, create_frontier, restore_frontier
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTP://Example.COM:80/a/", "http://example.com/a"),
+    ("https://example.com:443", "https://example.com"),
+    ("https://example.com:8443/x#frag", "https://example.com:8443/x"),
+    ("http://example.com./x", "http://example.com/x"),
+    ("http://[::1]:8080/a", "http://[::1]:8080/a"),
+    ("http://[2001:DB8::1]/", "http://[2001:db8::1]"),
+    ("http://user:pw@example.com/x", "http://user:pw@example.com/x"),
+    ("http://example.com/x?b=2&a=1", "http://example.com/x?a=1&b=2"),
+    ("http://example.com/x?utm_source=mail&id=3&fbclid=abc&UTM_Medium=x", "http://example.com/x?id=3"),
+    ("http://example.com/x?utm_source=mail", "http://example.com/x"),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+@pytest.mark.parametrize("query", ["foo", "q=a%20b", "q=a+b", "path=/x/y", "k=%2Fx", "a=&b=1"])
+def test_canonicalize_keeps_query_encoding(query):
+    assert canonicalize_url(f"http://example.com/s?{query}") == f"http://example.com/s?{query}"
+
+
+def test_canonicalize_is_idempotent():
+    url = "HTTP://Example.com:80/a/b/?z=1&utm_campaign=x&a=%2F&flag#top"
+    once = canonicalize_url(url)
+    assert canonicalize_url(once) == once
+
+
+def test_canonicalize_keep_trailing_slash():
+    assert canonicalize_url("http://example.com/a/", trailing_slash="keep") == "http://example.com/a/"
+
+
+@pytest.mark.parametrize("url", ["http://example.com:abc/", "http://[::1/"])
+def test_canonicalize_rejects_malformed_netloc(url):
+    with pytest.raises(ValueError):
+        canonicalize_url(url)
+
+
+@pytest.mark.parametrize("seen_cls", [SeenSet, lambda: BloomFilter(1000)], ids=["exact", "bloom"])
+def test_seen_set_round_trip(seen_cls):
+    seen = seen_cls()
+    urls = [f"http://example.com/{i}" for i in range(200)]
+    assert all(seen.add(url) for url in urls)
+    assert not any(seen.add(url) for url in urls)
+    assert len(seen) == 200
+    restored = type(seen).from_bytes(seen.to_bytes())
+    assert all(url in restored for url in urls)
+    assert "http://example.com/other" not in restored
+
+
+def test_frontier_dedups_canonical_forms():
+    frontier = CrawlFrontier()
+    assert frontier.push("http://Example.com/a/?utm_source=x", 0)
+    assert not frontier.push("http://example.com/a", 1)
+    assert not frontier.push("http://example.com:bad/", 1)
+    assert "HTTP://example.com/a/" in frontier
+    assert frontier.pop() == ("http://example.com/a", 0)
+    assert frontier.pop() is None
+
+
+def test_frontier_capacity_records_overflow_as_seen():
+    frontier = CrawlFrontier(capacity=2)
+    for i in range(5):
+        frontier.push(f"http://example.com/{i}", 0)
+    assert len(frontier) == 2
+    assert frontier.dropped == 3
+    assert "http://example.com/4" in frontier
+
+
+def test_frontier_snapshot_puts_in_flight_first():
+    frontier = CrawlFrontier()
+    frontier.push("http://example.com/a", 0)
+    frontier.push("http://example.com/b", 1)
+    frontier.pop()
+    restored = restore_frontier(frontier.snapshot(in_flight=[("http://example.com/a", 0)]))
+    assert [restored.pop(), restored.pop(), restored.pop()] == [
+        ("http://example.com/a", 0), ("http://example.com/b", 1), None,
+    ]
+    assert not restored.push("http://example.com/b", 2)
+
+
+def test_restore_skips_urls_that_already_have_results():
+    frontier = create_frontier("best_first")
+    for url in ("http://example.com/done", "http://example.com/busy"):
+        frontier.push(url, 1, 2.0)
+        frontier.pop()
+    frontier.push("http://example.com/queued", 1, 1.0)
+    state = frontier.snapshot(in_flight=[("http://example.com/done", 1), ("http://example.com/busy", 1)])
+    restored = restore_frontier(state, skip=["http://example.com/done"])
+    assert [restored.pop(), restored.pop(), restored.pop()] == [
+        ("http://example.com/busy", 1), ("http://example.com/queued", 1), None,
+    ]
+    assert "http://example.com/done" in restored  # still seen, so links to it aren't re-queued
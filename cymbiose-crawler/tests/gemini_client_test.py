@@ -0,0 +1,84 @@
+"""Gemini circuit breaker state changes"""
+import types
+
+import pytest
+
+import gemini_client
+from gemini_client import CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(gemini_client, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=30)
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.trips == 1
+    assert breaker.retry_in() == 30
+    clock.now += 10
+    assert breaker.retry_in() == 20
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    assert breaker.state == "closed"
+    assert breaker.retry_in() == 0.0
+
+
+def test_trip_opens_at_once(clock):
+    breaker = CircuitBreaker(threshold=5, cooldown=30)
+    breaker.failure(trip=True)
+    assert breaker.state == "open"
+    assert breaker.trips == 1
+
+
+def test_half_open_lets_one_probe_through_and_success_closes(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.failure()
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+    breaker.success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0 and breaker.cooldown == 30
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_with_doubled_cooldown(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open"
+    assert breaker.cooldown == 60
+    assert breaker.trips == 1  # still the same outage
+    clock.now += 59
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.cooldown == 30
+
+
+def test_cooldown_backoff_is_capped(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=400)
+    breaker.failure()
+    for _ in range(3):
+        clock.now += breaker.cooldown
+        assert breaker.allow()
+        breaker.failure()
+    assert breaker.cooldown == 600.0
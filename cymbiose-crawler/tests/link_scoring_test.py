@@ -0,0 +1,79 @@
+"""Best-first frontier ordering and link scorers"""
+from frontier import REQUEUE_SCORE, PriorityFrontier, create_frontier, restore_frontier
+from link_scoring import BreadthFirstScorer, ClinicalLinkScorer, get_link_scorer
+
+
+def _drain(frontier):
+    items = []
+    while (item := frontier.pop()) is not None:
+        items.append(item[0].rsplit("/", 1)[-1])
+    return items
+
+
+def test_priority_frontier_pops_highest_score_first():
+    frontier = PriorityFrontier()
+    for name, score in (("low", -1.0), ("high", 2.0), ("mid", 0.5)):
+        frontier.push(f"http://example.com/{name}", 1, score)
+    assert _drain(frontier) == ["high", "mid", "low"]
+
+
+def test_priority_frontier_is_fifo_among_equal_scores():
+    frontier = PriorityFrontier()
+    for name in ("a", "b", "c"):
+        frontier.push(f"http://example.com/{name}", 1, 1.0)
+    assert _drain(frontier) == ["a", "b", "c"]
+
+
+def test_priority_frontier_requeue_goes_first():
+    frontier = PriorityFrontier()
+    frontier.push("http://example.com/best", 1, 5.0)
+    frontier.requeue("http://example.com/retry", 2)
+    assert frontier.pop() == ("http://example.com/retry", 2)
+
+
+def test_priority_frontier_trims_to_the_best_capacity():
+    frontier = PriorityFrontier(capacity=3)
+    for i in range(6):
+        frontier.push(f"http://example.com/{i}", 1, float(i))
+    assert len(frontier) == 3
+    assert frontier.dropped == 3
+    assert _drain(frontier) == ["5", "4", "3"]
+    assert not frontier.push("http://example.com/0", 1, 10.0)  # trimmed URLs stay seen
+
+
+def test_priority_frontier_snapshot_keeps_order_and_in_flight():
+    frontier = create_frontier("best_first")
+    frontier.push("http://example.com/low", 1, 0.0)
+    frontier.push("http://example.com/high", 1, 3.0)
+    state = frontier.snapshot(in_flight=[("http://example.com/busy", 1)])
+    assert state["queue"][0] == ["http://example.com/busy", 1, REQUEUE_SCORE]
+    restored = restore_frontier(state)
+    assert isinstance(restored, PriorityFrontier)
+    assert _drain(restored) == ["busy", "high", "low"]
+
+
+def test_clinical_scorer_prefers_clinical_links():
+    scorer = ClinicalLinkScorer()
+    clinical = scorer.score("http://example.com/conditions/anxiety-treatment", 1, "CBT for anxiety")
+    neutral = scorer.score("http://example.com/page", 1, "Read more")
+    off_topic = scorer.score("http://example.com/careers/jobs", 1, "Donate now")
+    assert clinical > neutral > off_topic
+
+
+def test_clinical_scorer_weighs_parent_quality_and_depth():
+    scorer = ClinicalLinkScorer()
+    url = "http://example.com/page"
+    assert scorer.score(url, 1, parent_quality=5) > scorer.score(url, 1) > scorer.score(url, 1, parent_quality=1)
+    assert scorer.score(url, 1) > scorer.score(url, 3)
+
+
+def test_clinical_scorer_caps_repeated_terms():
+    scorer = ClinicalLinkScorer()
+    anchor = "therapy counselling psychology mental clinic treatment"
+    assert scorer.score("http://example.com/x", 0, anchor) == scorer.score("http://example.com/x", 0, "therapy counselling psychology")
+
+
+def test_breadth_first_scorer_and_lookup():
+    assert BreadthFirstScorer().score("http://example.com/x", 2) < BreadthFirstScorer().score("http://example.com/y", 1)
+    assert get_link_scorer("bfs").name == "bfs"
+    assert get_link_scorer("no-such-scorer").name == "clinical"
@@ -0,0 +1,85 @@
+"""SimHash fingerprints, the banded index and crawl-page fingerprinting"""
+import random
+
+from executor import parse_for_crawl
+from near_dup import NEAR_DUP_DISTANCE, NearDuplicateDetector, SimHashIndex, hamming, simhash
+
+WORDS = (
+    "anxiety depression therapy cognitive behavioral patient clinician session trauma "
+    "grief adolescent family support sleep mood panic exposure assessment outcome relapse "
+    "medication dose review screening risk suicide safety plan school peer stress coping"
+).split()
+
+
+def _article(seed: int, words: int = 300) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _page(body: str, template: str) -> bytes:
+    paragraphs = "".join(f"<p>{sentence}.</p>" for sentence in body.split(". "))
+    return (
+        f"<html><head><title>Page</title></head><body>"
+        f"<header><p>{template}</p></header><nav><p>{template}</p></nav>"
+        f"<main>{paragraphs}</main>"
+        f"<footer><p>{template}</p></footer></body></html>"
+    ).encode()
+
+
+def test_simhash_distance():
+    text = _article(1)
+    edited = text.replace("anxiety", "worry", 1)
+    assert simhash(text) == simhash(text)
+    assert hamming(simhash(text), simhash(edited)) <= NEAR_DUP_DISTANCE
+    assert hamming(simhash(text), simhash(_article(2))) > NEAR_DUP_DISTANCE
+
+
+def test_simhash_skips_short_text():
+    assert simhash("too short to fingerprint") is None
+
+
+def test_index_finds_within_distance():
+    index = SimHashIndex(max_distance=3)
+    base = simhash(_article(1))
+    index.add(base, "original")
+    assert index.find(base) == "original"
+    assert index.find(base ^ 0b111) == "original"  # three bits off
+    assert index.find(base ^ 0b1111) is None
+    assert index.find(simhash(_article(2))) is None
+
+
+def test_index_evicts_oldest():
+    index = SimHashIndex(max_items=2)
+    first, second, third = (simhash(_article(seed)) for seed in (1, 2, 3))
+    for value, fingerprint in enumerate((first, second, third)):
+        index.add(fingerprint, value)
+    assert len(index) == 2
+    assert index.find(first) is None
+    assert index.find(third) == 2
+
+
+def test_detector_falls_back_to_shared_index():
+    shared = SimHashIndex()
+    fingerprint = simhash(_article(1))
+    NearDuplicateDetector(shared).add(fingerprint, "other job")
+    assert NearDuplicateDetector(shared).find(fingerprint) == "other job"
+    assert NearDuplicateDetector().find(fingerprint) is None
+    assert NearDuplicateDetector().find(None) is None
+
+
+def _fingerprint(html: bytes) -> int:
+    return parse_for_crawl(html, "utf-8", "http://example.com/", True, False)["content_fingerprint"]
+
+
+def test_shared_template_is_not_a_duplicate():
+    template = _article(99, words=4000)  # boilerplate far longer than either body
+    a = _fingerprint(_page(_article(1, 80), template))
+    b = _fingerprint(_page(_article(2, 80), template))
+    assert hamming(a, b) > NEAR_DUP_DISTANCE
+
+
+def test_same_body_under_different_templates_is_a_duplicate():
+    body = _article(1, 200)
+    a = _fingerprint(_page(body, _article(98, 800)))
+    b = _fingerprint(_page(body, _article(99, 800)))
+    assert hamming(a, b) <= NEAR_DUP_DISTANCE
@@ -0,0 +1,98 @@
+"""Sitemap and sitemap-index parsing for crawl seeding"""
+import asyncio
+import gzip
+
+import httpx
+
+from sitemaps import collect_sitemap_urls, well_known_sitemaps
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+
+def _urlset(*entries) -> bytes:
+    body = ""
+    for loc, lastmod, priority in entries:
+        body += f"<url><loc>{loc}</loc>"
+        body += f"<lastmod>{lastmod}</lastmod>" if lastmod else ""
+        body += f"<priority>{priority}</priority>" if priority else ""
+        body += "</url>"
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset {NS}>{body}</urlset>'.encode()
+
+
+def _index(*children) -> bytes:
+    body = "".join(f"<sitemap><loc>{loc}</loc><lastmod>{lastmod}</lastmod></sitemap>" for loc, lastmod in children)
+    return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex {NS}>{body}</sitemapindex>'.encode()
+
+
+def _collect(files, sitemaps, limit=100, accept=lambda url: True):
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = files.get(str(request.url))
+        return httpx.Response(200, content=body) if body is not None else httpx.Response(404)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await collect_sitemap_urls(client, sitemaps, limit, accept)
+
+    return asyncio.run(run())
+
+
+def test_urls_come_back_by_priority_then_lastmod():
+    files = {"http://example.com/sitemap.xml": _urlset(
+        ("http://example.com/old", "2020-01-01", "0.5"),
+        ("http://example.com/top", "2019-01-01", "0.9"),
+        ("http://example.com/new", "2024-05-01T10:00:00+00:00", "0.5"),
+        ("http://example.com/plain", None, None),
+    )}
+    assert _collect(files, ["http://example.com/sitemap.xml"]) == [
+        ("http://example.com/top", 0.9),
+        ("http://example.com/new", 0.5),
+        ("http://example.com/old", 0.5),
+        ("http://example.com/plain", 0.5),
+    ]
+
+
+def test_limit_and_accept_filter():
+    files = {"http://example.com/sitemap.xml": _urlset(
+        *((f"http://example.com/{i}", None, f"0.{i}") for i in range(1, 8)),
+        ("http://example.com/private/9", None, "0.9"),
+    )}
+    urls = _collect(files, ["http://example.com/sitemap.xml"], limit=3, accept=lambda url: "private" not in url)
+    assert [url for url, _ in urls] == ["http://example.com/7", "http://example.com/6", "http://example.com/5"]
+
+
+def test_gzipped_index_and_children():
+    files = {
+        "http://example.com/sitemap_index.xml.gz": gzip.compress(_index(
+            ("http://example.com/a.xml.gz", "2023-01-01"),
+            ("http://example.com/b.xml", "2024-01-01"),
+        )),
+        "http://example.com/a.xml.gz": gzip.compress(_urlset(("http://example.com/from-a", None, "0.8"))),
+        "http://example.com/b.xml": _urlset(("http://example.com/from-b", None, "0.3")),
+    }
+    assert _collect(files, ["http://example.com/sitemap_index.xml.gz"]) == [
+        ("http://example.com/from-a", 0.8),
+        ("http://example.com/from-b", 0.3),
+    ]
+
+
+def test_corrupt_and_malformed_children_are_skipped():
+    files = {
+        "http://example.com/index.xml": _index(
+            ("http://example.com/corrupt.xml.gz", "2024-03-01"),
+            ("http://example.com/broken.xml", "2024-02-01"),
+            ("http://example.com/missing.xml", "2024-01-15"),
+            ("http://example.com/good.xml", "2024-01-01"),
+        ),
+        "http://example.com/corrupt.xml.gz": b"\x1f\x8b" + b"not really gzip" * 10,
+        "http://example.com/broken.xml": _urlset(("http://example.com/broken", None, "0.6"))[:-20] + b"<<<",
+        "http://example.com/good.xml": _urlset(("http://example.com/good", None, "0.4")),
+    }
+    assert _collect(files, ["http://example.com/index.xml"]) == [("http://example.com/good", 0.4)]
+
+
+def test_well_known_sitemaps():
+    assert well_known_sitemaps("https://example.com/some/page?x=1") == [
+        "https://example.com/sitemap.xml",
+        "https://example.com/sitemap_index.xml",
+        "https://example.com/sitemap-index.xml",
+    ]
@@ -0,0 +1,80 @@
+"""Vector index: add, flat and IVF search, metadata filters"""
+import numpy as np
+import pytest
+
+from vector_index import VectorIndex
+
+
+def _items(count: int, dim: int = 8, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [
+        (
+            f"chunk-{i}",
+            rng.normal(size=dim).tolist(),
+            {"url": f"http://example.com/{i}", "domain": "a.com" if i % 2 else "b.com",
+             "tags": ["anxiety"] if i % 3 == 0 else ["sleep"], "quality_score": i % 5 + 1},
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def index(tmp_path):
+    return VectorIndex(str(tmp_path / "index"))
+
+
+def test_add_dedups_on_key_and_survives_reload(index):
+    items = _items(10)
+    assert index.add(items) == 10
+    assert index.add(items[:3] + [items[0]]) == 0
+    assert "chunk-4" in index
+    reloaded = VectorIndex(index.path)
+    assert reloaded.search(items[4][1], k=1)[0]["url"] == "http://example.com/4"
+
+
+def test_search_ranks_by_cosine(index):
+    index.add(_items(20))
+    query = np.asarray(_items(20)[7][1]) * 3  # scale doesn't matter
+    results = index.search(query.tolist(), k=3)
+    assert results[0]["url"] == "http://example.com/7"
+    assert results[0]["score"] == pytest.approx(1.0, abs=1e-4)
+    assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+
+
+def test_search_on_empty_index(index):
+    assert index.search([1.0, 0.0], k=5) == []
+
+
+def test_filters(index):
+    items = _items(30)
+    index.add(items)
+    query = items[0][1]
+    assert {r["domain"] for r in index.search(query, k=30, filters={"domain": "a.com"})} == {"a.com"}
+    assert len(index.search(query, k=30, filters={"domain": ["a.com", "b.com"]})) == 30
+    assert all("anxiety" in r["tags"] for r in index.search(query, k=30, filters={"tags": "anxiety"}))
+    assert all(r["quality_score"] >= 4 for r in index.search(query, k=30, filters={"min_quality_score": 4}))
+    combined = index.search(query, k=30, filters={"domain": "b.com", "tags": "anxiety"})
+    assert combined and all(r["domain"] == "b.com" and "anxiety" in r["tags"] for r in combined)
+    assert index.search(query, k=30, filters={"domain": "missing.com"}) == []
+
+
+def test_rejects_bad_queries(index):
+    index.add(_items(5))
+    with pytest.raises(ValueError):
+        index.search([1.0, 2.0], k=1)  # wrong dimension
+    with pytest.raises(ValueError):
+        index.search(_items(1)[0][1], k=1, filters={"domain": {"nested": "dict"}})
+
+
+def test_ivf_scans_flat_until_clustered(tmp_path):
+    index = VectorIndex(str(tmp_path / "index"), mode="ivf", ivf_lists=4, ivf_probe=4, ivf_min_items=50)
+    items = _items(40)
+    index.add(items)
+    assert index.stats()["mode"] == "flat"
+    index.add(_items(60, seed=1)[40:])
+    index._trainer.shutdown(wait=True)
+    assert index.stats()["mode"] == "ivf"
+    assert index.stats()["ivf_trainings"] == 1
+    # Probing every list is exact
+    assert index.search(items[11][1], k=1)[0]["url"] == "http://example.com/11"
+    assert {r["domain"] for r in index.search(items[11][1], k=10, filters={"domain": "a.com"})} == {"a.com"}
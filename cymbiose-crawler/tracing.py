@@ -0,0 +1,175 @@
+"""
+Per-request traces
+While tracing is on, each /scrape call and crawled page gets a trace whose
+spans are the pipeline stages it went through (fetch, parse, markdown,
+chunk, llm, embed, ...), fed by the same hooks as the stage metrics.
+Finished traces are kept in a ring buffer. When off, a stage costs one
+ContextVar lookup.
+"""
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+
+class Trace:
+    def __init__(self, kind: str, attrs: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.attrs = attrs
+        self.started_at = datetime.now(timezone.utc)
+        self.error: Optional[str] = None
+        self.duration: Optional[float] = None
+        self.spans: List[tuple] = []  # (name, start offset, seconds, size)
+        self._t0 = time.perf_counter()
+
+    @property
+    def finished(self) -> bool:
+        return self.duration is not None
+
+    def add(self, name: str, seconds: float, size: Optional[int] = None, ended: Optional[float] = None):
+        ended = time.perf_counter() if ended is None else ended
+        self.spans.append((name, ended - seconds - self._t0, seconds, size))
+
+    def finish(self, error: Optional[BaseException] = None):
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"[:300]
+        self.duration = time.perf_counter() - self._t0
+
+    def to_dict(self) -> Dict[str, Any]:
+        spans = sorted(self.spans, key=lambda span: span[1])
+        stages: Dict[str, float] = {}
+        for name, _, seconds, _ in spans:
+            stages[name] = stages.get(name, 0.0) + seconds
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            **self.attrs,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "duration_ms": round(self.duration * 1000, 2) if self.finished else None,
+            "error": self.error,
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in stages.items()},
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": round(start * 1000, 2),
+                    "duration_ms": round(seconds * 1000, 2),
+                    **({"bytes": size} if size is not None else {}),
+                }
+                for name, start, seconds, size in spans
+            ],
+        }
+
+
+class TraceBuffer:
+    """The last `size` finished traces, newest first"""
+
+    def __init__(self, size: int = TRACE_BUFFER_SIZE, enabled: bool = TRACING_ENABLED):
+        self.enabled = enabled
+        self._traces: deque = deque(maxlen=max(1, size))
+        self.counters = {"started": 0, "finished": 0, "errors": 0}
+
+    def start(self, kind: str, **attrs) -> Optional[Trace]:
+        """
+        Begin a trace for the current task (and tasks it creates from now on);
+        None while tracing is off. Pair with finish().
+        """
+        if not self.enabled:
+            return None
+        trace = Trace(kind, attrs)
+        _current.set(trace)
+        self.counters["started"] += 1
+        return trace
+
+    def finish(self, trace: Optional[Trace], error: Optional[BaseException] = None):
+        if trace is None or trace.finished:
+            return
+        trace.finish(error)
+        self.counters["finished"] += 1
+        if trace.error:
+            self.counters["errors"] += 1
+        self._traces.append(trace)
+
+    @contextmanager
+    def trace(self, kind: str, **attrs):
+        """Trace a block; the previous trace (if any) is current again afterwards"""
+        if not self.enabled:
+            yield None
+            return
+        token = _current.set(None)
+        trace = self.start(kind, **attrs)
+        try:
+            yield trace
+        except BaseException as e:
+            self.finish(trace, e)
+            raise
+        finally:
+            self.finish(trace)
+            _current.reset(token)
+
+    def recent(self, limit: int = 50, kind: Optional[str] = None, url: Optional[str] = None, min_ms: float = 0) -> List[Dict]:
+        found = []
+        for trace in reversed(self._traces):
+            if kind and trace.kind != kind:
+                continue
+            if url and url not in str(trace.attrs.get("url", "")):
+                continue
+            if trace.duration * 1000 < min_ms:
+                continue
+            found.append(trace.to_dict())
+            if len(found) >= limit:
+                break
+        return found
+
+    def get(self, trace_id: str) -> Optional[Dict]:
+        for trace in self._traces:
+            if trace.id == trace_id:
+                return trace.to_dict()
+        return None
+
+    def clear(self):
+        self._traces.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "enabled": self.enabled, "buffered": len(self._traces), "buffer_size": self._traces.maxlen}
+
+
+TRACES = TraceBuffer()
+
+
+def record_span(name: str, seconds: float, size: Optional[int] = None, ended: Optional[float] = None):
+    """Add a span to the current trace, if there is one"""
+    trace = _current.get()
+    if trace is not None and not trace.finished:
+        trace.add(name, seconds, size, ended)
+
+
+def annotate_trace(**attrs):
+    """Attach fields (e.g. outcome) to the current trace, if there is one"""
+    trace = _current.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+@contextmanager
+def span(name: str, size: Optional[int] = None):
+    """Time a block as a span of the current trace (no metrics)"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if not trace.finished:
+            trace.add(name, time.perf_counter() - started, size)
@@ -0,0 +1,314 @@
+"""
+Local vector index over chunk embeddings
+Vectors live in an append-only float32 file that is memory-mapped for
+search (cosine similarity, exact). "ivf" mode clusters the vectors with
+k-means and only scans the lists closest to the query once the index is
+large; clustering runs on a background thread and searches scan
+everything until it is done. Metadata filters use in-memory posting lists.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from log import get_logger
+
+log = get_logger(__name__)
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "cache/vector_index")
+VECTOR_INDEX_MODE = os.getenv("VECTOR_INDEX_MODE", "flat").lower()  # "flat" (exact) or "ivf" (approximate)
+VECTOR_IVF_LISTS = int(os.getenv("VECTOR_IVF_LISTS", "0"))  # 0 = about sqrt(n)
+VECTOR_IVF_PROBE = int(os.getenv("VECTOR_IVF_PROBE", "8"))
+VECTOR_IVF_MIN_ITEMS = int(os.getenv("VECTOR_IVF_MIN_ITEMS", "20000"))  # below this, ivf mode still scans everything
+
+# Metadata values indexed for filtering (scalars, or lists of scalars)
+_FILTERABLE = (str, int, bool)
+# Values a search filter may ask for (floats match equal ints)
+FILTER_VALUE_TYPES = (str, int, float, bool)
+KMEANS_SAMPLE = 50000
+KMEANS_ITERATIONS = 12
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def _kmeans(data: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids (rows are unit vectors)"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        for c in range(lists):
+            members = data[assign == c]
+            # Re-seed empty clusters with a random point
+            centroids[c] = members.sum(axis=0) if len(members) else data[rng.integers(len(data))]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, lists: List[List[int]], start: int, end: int):
+    """Append rows start..end to the list of their nearest centroid"""
+    for offset in range(start, end, 65536):
+        block = np.asarray(vectors[offset:min(end, offset + 65536)])
+        for row, centroid in enumerate(np.argmax(block @ centroids.T, axis=1), start=offset):
+            lists[centroid].append(row)
+
+
+class VectorIndex:
+    """
+    Append-only cosine-similarity index. Items are keyed (re-adding a key is a
+    no-op) and carry a metadata dict; every file write happens under one lock,
+    so call it from worker threads (asyncio.to_thread) like the SQLite stores.
+    """
+
+    def __init__(
+        self,
+        path: str = VECTOR_INDEX_DIR,
+        mode: str = VECTOR_INDEX_MODE,
+        ivf_lists: int = VECTOR_IVF_LISTS,
+        ivf_probe: int = VECTOR_IVF_PROBE,
+        ivf_min_items: int = VECTOR_IVF_MIN_ITEMS,
+    ):
+        self.path = path
+        self.mode = mode
+        self.ivf_lists = ivf_lists
+        self.ivf_probe = max(1, ivf_probe)
+        self.ivf_min_items = ivf_min_items
+        self.dim: Optional[int] = None
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._keys: Dict[str, int] = {}
+        self._metadata: List[Dict[str, Any]] = []
+        self._postings: Dict[Tuple[str, Any], List[int]] = {}
+        self._quality = np.zeros(0, dtype=np.int8)
+        self._matrix: Optional[np.memmap] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._trained_at = 0
+        self._training = False
+        self._trainer: Optional[ThreadPoolExecutor] = None
+        self.counters = {"searches": 0, "adds": 0, "ivf_trainings": 0}
+
+    # ---- storage (call with the lock held) ----
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self._file("meta.jsonl")):
+            return
+        with open(self._file("meta.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self._index_metadata(record["key"], record["metadata"])
+        with open(self._file("index.json"), encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        # Drop vectors written without their metadata line (interrupted add)
+        expected = len(self._metadata) * self.dim * 4
+        if os.path.getsize(self._file("vectors.f32")) > expected:
+            os.truncate(self._file("vectors.f32"), expected)
+        log.info(f"🧭 Vector index loaded: {len(self._metadata)} vectors")
+        self._maybe_train()
+
+    def _index_metadata(self, key: str, metadata: Dict[str, Any]):
+        row = len(self._metadata)
+        self._keys[key] = row
+        self._metadata.append(metadata)
+        for name, value in metadata.items():
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, _FILTERABLE):
+                    self._postings.setdefault((name, item), []).append(row)
+
+    def _vectors(self) -> np.ndarray:
+        """Memory-mapped vectors, re-mapped after the file grows"""
+        rows = len(self._metadata)
+        if self._matrix is None or len(self._matrix) != rows:
+            self._matrix = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._matrix
+
+    def _quality_scores(self) -> np.ndarray:
+        if len(self._quality) != len(self._metadata):
+            self._quality = np.array(
+                [m.get("quality_score", 0) or 0 for m in self._metadata], dtype=np.int8
+            )
+        return self._quality
+
+    # ---- IVF ----
+
+    def _ivf_active(self) -> bool:
+        return self.mode == "ivf" and len(self._metadata) >= self.ivf_min_items
+
+    def _ivf_ready(self) -> bool:
+        return self._ivf_active() and self._centroids is not None
+
+    def _maybe_train(self):
+        """
+        Start (re)clustering when first large enough and whenever the index
+        has doubled since (lock held). The lists in use stay until it is done.
+        """
+        rows = len(self._metadata)
+        if self._training or not self._ivf_active():
+            return
+        if self._centroids is not None and rows < 2 * self._trained_at:
+            return
+        if self._trainer is None:
+            self._trainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ivf")
+        self._training = True
+        self._trainer.submit(self._train, self._vectors(), rows)
+
+    def _train(self, vectors: np.ndarray, rows: int):
+        """Cluster the first `rows` vectors without the lock, then swap the lists in"""
+        started = time.monotonic()
+        try:
+            sample = vectors if rows <= KMEANS_SAMPLE else vectors[np.sort(np.random.default_rng(0).choice(rows, KMEANS_SAMPLE, replace=False))]
+            lists = self.ivf_lists or max(1, int(np.sqrt(rows)))
+            centroids = _kmeans(np.asarray(sample), min(lists, len(sample)))
+            assigned: List[List[int]] = [[] for _ in range(len(centroids))]
+            _assign(vectors, centroids, assigned, 0, rows)
+            with self._lock:
+                # Rows added while clustering
+                _assign(self._vectors(), centroids, assigned, rows, len(self._metadata))
+                self._centroids, self._lists, self._trained_at = centroids, assigned, rows
+                self.counters["ivf_trainings"] += 1
+            log.info(f"🧭 Vector index clustered {rows} vectors into {len(centroids)} lists in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            log.error(f"❌ Vector index clustering failed: {e}")
+        finally:
+            with self._lock:
+                self._training = False
+
+    # ---- public API ----
+
+    def add(self, items: List[Tuple[str, List[float], Dict[str, Any]]]) -> int:
+        """Add (key, vector, metadata) items; returns how many were new"""
+        with self._lock:
+            self._load()
+            fresh, seen = [], set()
+            for key, vector, metadata in items:
+                if key not in self._keys and key not in seen:
+                    seen.add(key)
+                    fresh.append((key, vector, metadata))
+            if not fresh:
+                return 0
+
+            vectors = _normalize(np.asarray([vector for _, vector, _ in fresh], dtype=np.float32))
+            os.makedirs(self.path, exist_ok=True)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self._file("index.json"), "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match the index ({self.dim})")
+
+            start = len(self._metadata)
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._file("meta.jsonl"), "a", encoding="utf-8") as f:
+                for key, _, metadata in fresh:
+                    f.write(json.dumps({"key": key, "metadata": metadata}) + "\n")
+                    self._index_metadata(key, metadata)
+
+            if self._centroids is not None:
+                _assign(self._vectors(), self._centroids, self._lists, start, len(self._metadata))
+            self.counters["adds"] += len(fresh)
+            self._maybe_train()
+            return len(fresh)
+
+    def search(self, vector: List[float], k: int = 10, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Top-k items by cosine similarity. `filters` maps a metadata field to a
+        value or a list of accepted values (list fields match on any element);
+        "min_quality_score" is a lower bound on quality_score.
+        """
+        with self._lock:
+            self._load()
+            self.counters["searches"] += 1
+            rows = len(self._metadata)
+            if not rows:
+                return []
+            query = _normalize(np.asarray([vector], dtype=np.float32))[0]
+            if len(query) != self.dim:
+                raise ValueError(f"Query dimension {len(query)} does not match the index ({self.dim})")
+
+            # Snapshot what the scan needs; the vector file and metadata are append-only,
+            # so scoring runs outside the lock and adds/IVF swaps don't wait on it
+            allowed = self._filter_mask(filters or {}, rows)
+            vectors = self._vectors()
+            metadata = self._metadata
+            ivf = self._ivf_ready()
+            if ivf:
+                nearest = np.argsort(self._centroids @ query)[::-1][:self.ivf_probe]
+                candidates = np.fromiter(
+                    (row for c in nearest for row in self._lists[c]), dtype=np.int64
+                )
+
+        if ivf:
+            if allowed is not None:
+                candidates = candidates[allowed[candidates]]
+            candidates.sort()
+            scores = np.asarray(vectors[candidates]) @ query if len(candidates) else np.zeros(0, np.float32)
+        else:
+            candidates = np.flatnonzero(allowed) if allowed is not None else None
+            if candidates is not None and len(candidates) < rows // 4:
+                scores = np.asarray(vectors[candidates]) @ query
+            else:
+                scores = np.asarray(vectors) @ query
+                if candidates is not None:
+                    scores = np.where(allowed, scores, -np.inf)
+                candidates = None
+
+        k = max(0, min(k, len(scores)))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for position in top:
+            if not np.isfinite(scores[position]):
+                break
+            row = int(candidates[position]) if candidates is not None else int(position)
+            results.append({"score": round(float(scores[position]), 5), **metadata[row]})
+        return results
+
+    def _filter_mask(self, filters: Dict[str, Any], rows: int) -> Optional[np.ndarray]:
+        mask = None
+        for name, accepted in filters.items():
+            if accepted is None:
+                continue
+            if name == "min_quality_score":
+                field = self._quality_scores() >= int(accepted)
+            else:
+                field = np.zeros(rows, dtype=bool)
+                for value in accepted if isinstance(accepted, list) else [accepted]:
+                    if not isinstance(value, FILTER_VALUE_TYPES):
+                        raise ValueError(f"Filter {name!r} values must be scalars or lists of scalars")
+                    posting = self._postings.get((name, value))
+                    if posting:
+                        field[posting] = True
+            mask = field if mask is None else mask & field
+        return mask
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            self._load()
+            return key in self._keys
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "vectors": len(self._metadata),
+            "dim": self.dim,
+            "mode": "ivf" if self._ivf_ready() else "flat",
+            "ivf_lists": len(self._lists),
+            "ivf_training": self._training,
+        }